@@ -36,6 +36,8 @@ IMAGE_VFLIP = True           # Default= False True Flips image Vertically
 IMAGE_HFLIP = True           # Default= False True Flips image Horizontally
 IMAGE_GRAYSCALE = False      # Default= False True=Save image as grayscale False=Color
 IMAGE_PREVIEW = False        # Default= False True=Preview image on connected RPI Monitor or Display
+IMAGE_CAMERA_SESSION_ON = True # Default= True Keep still camera open between images and only change settings that differ.
+                             # Skips AWB and night settle sleeps when settings are unchanged. False= Open camera per image
 IMAGE_PIX_AVE_TIMER_SEC = 15 # Default= 15 Interval seconds for checking pixAverage Readings (reduces cpu usage)
 IMAGE_NO_NIGHT_SHOTS = False # Default= False True=No Night Images (Motion or Timelapse)
 IMAGE_NO_DAY_SHOTS = False   # Default= False True=No Day Images (Motion or Timelapse)
@@ -45,6 +47,33 @@ STREAM_WIDTH = 320           # Default= 320  Width of motion tracking stream det
 STREAM_HEIGHT = 240          # Default= 240  Height of motion tracking stream detection area
 STREAM_FPS = 20              # Default= 20 fps PiVideoStream setting.  Single core RPI suggest 15 fps
 STREAM_STOP_SEC = 0.7        # Default= 0.7 Allow time to stop video stream thread to release camera
+STREAM_RING_SIZE = 4         # Default= 4 Number of preallocated stream frame slots (minimum 4, 5 if MOTION_WORKER_ON)
+STREAM_FORMAT = "bgr"        # Default= "bgr" Stream capture format. "yuv" uses luma Y plane directly for motion tracking (less cpu and memory)
+STREAM_STILL_SPLITTER_ON = False # Default= False True= Camera runs at IMAGE size with a resized motion stream so day images
+                             # are taken from a splitter port without stopping motion tracking.
+                             # Note STREAM_FPS must be supported at IMAGE size eg 15 fps max at full sensor resolution
+STREAM_SOURCE = "picamera"   # Default= "picamera" Motion stream frame source. "opencv"= USB webcam/V4L2 device
+                             # "replay"= video file or directory of jpg/png images. opencv and replay
+                             # save stream frames resized to IMAGE size as stills (no video recording)
+STREAM_SOURCE_PATH = ""      # Default= "" opencv device number or path eg "0" or "/dev/video0". replay file or directory path
+STREAM_VECTOR_PATH = ""      # Default= "" replay motion vector file for MOTION_DETECTOR = "vectors" eg from
+                             # raspivid -o footage.h264 -x footage.vec   ""= STREAM_SOURCE_PATH with .vec extension
+STREAM_REPLAY_REALTIME_ON = True # Default= True Replay at recorded fps.  False= Replay as fast as frames are processed
+STREAM_CAMERA_NUM = 0        # Default= 0 picamera camera_num.  Compute Module Use 1 for second CSI camera port
+STREAM_STATS_SEC = 300       # Default= 300 seconds between logging stream capture fps, processed fps, dropped frames
+                             # and capture to motion decision latency.  Also saved to data/pi-timolo-stats.json  0=Off
+STREAM_IDLE_SEC = 0          # Default= 0 seconds without any motion before only STREAM_IDLE_FPS frames are processed
+                             # to save cpu and power eg solar/battery. Full rate resumes on first motion. 0=Off
+STREAM_IDLE_FPS = 2          # Default= 2 frames per second processed while idle
+
+# Multiple Camera Settings
+# ------------------------
+CAMERAS = []                 # Default= [] Run one camera per settings in this file.  For multiple cameras list one dict
+                             # per camera with only the settings that differ. Each camera runs its own motion pipeline
+                             # process. CAMERA_NAME (default cam1, cam2 Etc) sets the image name prefix, a media sub
+                             # folder and image counter files unless these are also in the dict. Eg
+                             # CAMERAS = [{"CAMERA_NAME": "front", "STREAM_CAMERA_NUM": 0},
+                             #            {"CAMERA_NAME": "usb", "STREAM_SOURCE": "opencv", "STREAM_SOURCE_PATH": "0"}]
 
 # Note see STREAM_FPS variable below to set motion video stream framerate for stream size above
 
@@ -93,6 +122,102 @@ MOTION_TRACK_INFO_ON = True    # Default= True False= Hide detailed track progre
 MOTION_TRACK_TIMEOUT_SEC = 0.3 # Default= 0.3 seconds Resets Track if no movement tracked
 MOTION_TRACK_TRIG_LEN = 50     # Default= 75 px Length of motion track to Trigger motionFound
 MOTION_TRACK_MIN_AREA = 100    # Default= 100 sq px  Minimum Area required to start tracking
+MOTION_DETECTOR = "diff"       # Default= "diff" Difference of consecutive stream frames with THRESHOLD_SENSITIVITY
+                               # "background" Running average background model. Detects slow moving objects and
+                               # uses learned pixel noise instead of a fixed threshold
+                               # "vectors" Use picamera h264 encoder motion vectors. Very low cpu use
+MOTION_BLOB_METHOD = "contours"    # Default= "contours" Loop over findContours results. MIN_AREA is the contour area
+                                   # and the blob bounding box center is tracked
+                                   # "components" Get all motion blobs in one opencv connected components call. Faster
+                                   # with many small noise blobs. MIN_AREA is the blob pixel count which is larger than
+                                   # the contour area of the same blob so smaller blobs pass. Raise MIN_AREA to match.
+                                   # The blob centroid is tracked so track lengths differ slightly from "contours"
+MOTION_AUTO_THRESHOLD_ON = False  # Default= False True= "diff" detector sets threshold and blur from the image
+                                  # noise instead of fixed THRESHOLD_SENSITIVITY. For night noise
+MOTION_AUTO_THRESHOLD_K = 6.0     # Default= 6.0 Threshold is this many noise std deviations above the median
+MOTION_AUTO_THRESHOLD_RANGE = (12, 60)  # Default= (12, 60) Min and max auto threshold
+MOTION_AUTO_BLUR_RANGE = (8, 12)  # Default= (8, 12) Blur size grows from min to max as the noise rises
+MOTION_AUTO_SAMPLE_STEP = 8       # Default= 8 Measure noise on every 8th pixel of every 8th row
+MOTION_AUTO_SAMPLE_FRAMES = 15    # Default= 15 Measure noise every 15th frame and keep the threshold in between
+MOTION_LIGHT_CHECK_ON = False  # Default= False True= Ignore global lighting changes eg clouds, headlights, lights on
+                               # and re-base the motion reference frame instead of detecting one huge motion blob
+MOTION_LIGHT_MEAN_DIFF = 8     # Default= 8 Stream luma mean change that may be a lighting change
+MOTION_LIGHT_HIST_CORREL = 0.8 # Default= 0.8 Min histogram correlation after brightness correction for a global change
+MOTION_LIGHT_SAMPLE_STEP = 8   # Default= 8 Measure lighting on every 8th pixel of every 8th row
+MOTION_DENOISE_DAY_FRAMES = 0  # Default= 0 Temporal median of this many stream frames before "diff" or "background"
+                               # detection in day mode. Removes rain, snow and sensor speckles. 0 or 1= Off
+MOTION_DENOISE_NIGHT_FRAMES = 0  # Default= 0 Same for night mode. eg 3 or 5 for noisy night images. Day or night
+                                 # is the stream luma average vs NIGHT_TWILIGHT_THRESHOLD checked every 60 seconds
+                                 # Motion is found about half this many frames later. Cost see --bench
+MOTION_ROI_INCLUDE = []        # Default= [] Only detect motion inside these polygons. [] = whole stream image
+                               # List of polygons, each a list of (x, y) points in stream image px
+                               # eg [[(0, 60), (320, 60), (320, 240), (0, 240)]]  Pixels outside are never processed
+MOTION_ROI_EXCLUDE = []        # Default= [] Ignore motion inside these polygons eg trees or a busy road
+                               # eg [[(250, 0), (320, 0), (320, 80)]]
+MOTION_HEATMAP_ON = False      # Default= False True= Accumulate a per pixel motion activity heatmap. Saved to
+                               # data/pi-timolo-heatmap.npy and .png with a suggested -nuisance.png mask
+MOTION_HEATMAP_DECAY_SEC = 600 # Default= 600 seconds of motion activity remembered by the heatmap
+MOTION_HEATMAP_SAVE_SEC = 300  # Default= 300 seconds between heatmap saves and nuisance mask updates
+MOTION_HEATMAP_NUISANCE = 0.25 # Default= 0.25 Pixels moving in more than this fraction of frames eg trees
+                               # or flags are nuisance. They stay nuisance until below half this fraction
+MOTION_HEATMAP_MASK_ON = False # Default= False True= Ignore motion in nuisance pixels while they stay active
+MOTION_WORKER_ON = False       # Default= False True= Run motion detection in a separate process fed through shared
+                               # memory so image saving does not stall it. Requires python3.8+
+                               # Test with  ./pi-timolo.py --bench footage_file_or_image_dir
+MOTION_TRACKER = "single"      # Default= "single" Track largest motion blob only. Two objects moving at once can
+                               # exceed the max track length and be ignored
+                               # "multi" Track every blob with its own id using motion_tracker.py
+MOTION_TRACK_MATCH_DIST = 0    # Default= 0 multi tracker max px a blob moves between frames. 0= MOTION_TRACK_TRIG_LEN
+MOTION_TRACK_MAX_OBJECTS = 32  # Default= 32 multi tracker max number of objects tracked at once
+MOTION_TRACK_KALMAN_ON = False # Default= False True= multi tracker smooths each track with a constant velocity
+                               # Kalman filter so jittery blob centers do not trigger MOTION_TRACK_TRIG_LEN
+MOTION_TRACK_KALMAN_MEASURE_STD = 8.0    # Default= 8.0 px expected jitter of motion blob centers
+MOTION_TRACK_KALMAN_ACCEL_STD = 100.0    # Default= 100.0 px/s2 how quickly tracked objects change speed
+MOTION_TRIGGER_LINE = []       # Default= [] Off. multi tracker triggers when a track crosses this line
+                               # instead of on track length. eg [(160, 0), (160, 240)] stream px
+MOTION_TRIGGER_LINE_FROM = None  # Default= None Either direction. (x, y) stream px point on the side of
+                                 # MOTION_TRIGGER_LINE tracks must come from eg (0, 120) for left to right
+MOTION_TRIGGER_LINE_GAP = 10   # Default= 10 px a track must move past MOTION_TRIGGER_LINE before the crossing
+                               # counts so an object stopped on the line is not counted over and over
+MOTION_TRIGGER_DIRECTION = None  # Default= None Off. Only trigger tracks moving in this direction degrees
+                                 # 0=right 90=down 180=left 270=up. Turns on the Kalman filter
+MOTION_TRIGGER_DIRECTION_TOL = 45  # Default= 45 degrees either side of MOTION_TRIGGER_DIRECTION allowed
+MOTION_TRIGGER_SPEED_MIN = 0   # Default= 0 Off. Only trigger tracks faster than this px/s. Turns on Kalman filter
+MOTION_COUNT_ON = False        # Default= False True= Record each MOTION_TRIGGER_LINE crossing with time, track id,
+                               # direction, speed and box in per day files instead of taking motion images
+                               # Report per day and hour with  ./pi-timolo.py --counts YYYY-MM
+                               # MOTION_DETECTOR = "background" finds whole objects so each is counted once
+MOTION_COUNT_DIR = "media/counts"  # Default= "media/counts" Folder for per day crossing count files
+MOTION_COUNT_CAPTURE_ON = False  # Default= False True= Also take a motion image for each triggering crossing
+MOTION_SPEED_ON = False        # Default= False True= multi tracker times each object across MOTION_SPEED_WINDOW and
+                               # saves only a stream quick pic with the speed drawn on it. Objects must move
+                               # left or right across the image. MOTION_WORKER_ON = True keeps full stream fps
+MOTION_SPEED_WINDOW = (80, 240)  # Default= (80, 240) stream px x range the speed is measured over
+MOTION_SPEED_PX_PER_M = 20.0   # Default= 20.0 Calibration stream px per metre at the distance objects pass
+                               # eg a 4.5 m long car measured 90 px long in a stream image is 20.0
+MOTION_SPEED_UNITS = "kph"     # Default= "kph" Speed units "kph", "mph" or "mps"
+MOTION_SPEED_MIN = 0           # Default= 0 Only save images of objects at or above this speed in MOTION_SPEED_UNITS
+MOTION_VECTOR_MAGNITUDE = 10   # Default= 10 Minimum macroblock motion vector length for "vectors" detector
+MOTION_VECTOR_SAD_MAX = 0      # Default= 0 Ignore vectors with SAD block match error above this (unreliable). 0= Off
+MOTION_VECTOR_MIN_CELLS = 4    # Default= 4 Minimum connected moving 16x16 macroblocks for a motion region
+MOTION_BG_ALPHA = 0.02         # Default= 0.02 background learning rate per frame. Lower keeps stopped objects longer
+MOTION_BG_SIGMA = 4.0          # Default= 4.0 Pixel is motion if more than this many std deviations from background
+MOTION_BG_MIN_STD = 3.0        # Default= 3.0 Minimum pixel std deviation so very low noise areas do not trigger
+MOTION_TUNE_GRID = {           # Parameter sets tried by  ./pi-timolo.py --tune footage_file_or_image_dir
+    "MOTION_TRACK_TRIG_LEN": [50, 75, 100],   # Every combination of the listed values is replayed.
+    "MOTION_TRACK_MIN_AREA": [100, 200],      # Valid keys are MOTION_TRACK_TRIG_LEN, MOTION_TRACK_MIN_AREA,
+    "THRESHOLD_SENSITIVITY": [20, 30],        # MOTION_TRACK_TIMEOUT_SEC, BLUR_SIZE, THRESHOLD_SENSITIVITY
+}                                             # MOTION_DETECTOR, MOTION_BLOB_METHOD, MOTION_BG_ALPHA,
+                                              # MOTION_BG_SIGMA, MOTION_BG_MIN_STD, MOTION_VECTOR_MAGNITUDE,
+                                              # MOTION_VECTOR_SAD_MAX, MOTION_VECTOR_MIN_CELLS, MOTION_TRACKER,
+                                              # MOTION_TRACK_MATCH_DIST, MOTION_TRACK_KALMAN_ON,
+                                              # MOTION_TRACK_KALMAN_MEASURE_STD,
+                                              # MOTION_TRACK_KALMAN_ACCEL_STD, MOTION_TRIGGER_DIRECTION,
+                                              # MOTION_TRIGGER_SPEED_MIN, MOTION_AUTO_THRESHOLD_ON,
+                                              # MOTION_AUTO_THRESHOLD_K, MOTION_LIGHT_CHECK_ON,
+                                              # MOTION_LIGHT_MEAN_DIFF, MOTION_LIGHT_HIST_CORREL,
+                                              # MOTION_DENOISE_DAY_FRAMES, MOTION_DENOISE_NIGHT_FRAMES
+MOTION_TUNE_WORKERS = 0        # Default= 0 Number of --tune worker processes. 0= One per cpu core
 
 # Motion Settings
 # ---------------
@@ -133,6 +258,10 @@ MOTION_VIDEO_WIDTH = 640     # Default= 640 Width of video in pixels
 MOTION_VIDEO_HEIGHT = 480    # Default= 480 Height of video in pixels
 MOTION_VIDEO_FPS = 15        # Default= 15 If resolution reduced to 640x480 then slow motion is possible at 90 fps
 MOTION_VIDEO_TIMER_SEC = 10  # Default= 10 secs Duration of single Video clip to take after Motion Detected
+MOTION_VIDEO_PRETRIGGER_SEC = 0  # Default= 0 Off or secs of video kept in memory and saved ahead of each motion video clip.
+                             # Recorded at STREAM_FPS without stopping the stream. Use with STREAM_STILL_SPLITTER_ON=True
+                             # so the camera runs at full image size rather than stream size.
+MOTION_VIDEO_BITRATE = 17000000  # Default= 17000000 h264 bitrate. Sets size of pre trigger memory buffer
 # ---------------------------------------------------------------------------
 
 # Settings for Pan Tilt Hardware
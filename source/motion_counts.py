@@ -0,0 +1,140 @@
+"""
+Line crossing count store module imported by pi-timolo.py
+when MOTION_COUNT_ON = True in config.py
+
+Each MOTION_TRIGGER_LINE crossing found by the multi tracker is
+appended as one fixed size binary record to a per day file
+named <name>-YYYYMMDD.cnt in MOTION_COUNT_DIR. No image is needed
+per crossing. Files are only ever appended so a power cut can at
+most lose a partial last record, which is ignored when read and
+cut off before the next append so later records stay aligned.
+Queries read whole day files with numpy and aggregate with
+bincount so a month of hourly counts takes milliseconds.
+For more information see pi-timolo github Wiki
+"""
+from __future__ import print_function
+import datetime
+import logging
+import os
+import time
+import numpy as np
+
+# One record per line crossing. 27 bytes packed, little endian
+COUNT_DTYPE = np.dtype(
+    [
+        ("time", "<f8"),  # epoch seconds
+        ("track", "<u4"),  # multi tracker track id
+        ("direction", "u1"),  # 1= crossed from side A to B  2= B to A
+        ("heading", "<u2"),  # degrees 0=right 90=down 180=left 270=up
+        ("speed", "<f4"),  # px/s
+        ("x", "<u2"),  # stream image blob box
+        ("y", "<u2"),
+        ("w", "<u2"),
+        ("h", "<u2"),
+    ]
+)
+COUNT_EXT = ".cnt"
+
+
+# ------------------------------------------------------------------------------
+def dayRange(firstDay, lastDay):
+    """Return list of datetime.date from firstDay to lastDay inclusive"""
+    return [
+        firstDay + datetime.timedelta(days=i)
+        for i in range((lastDay - firstDay).days + 1)
+    ]
+
+
+# ------------------------------------------------------------------------------
+class CountStore:
+    """
+    Append only store of line crossing records in per day files.
+    append() takes the multi tracker crossings list. load() returns
+    the records of one day and hourlyCounts() the crossings per
+    hour and direction for a range of days.
+    """
+
+    def __init__(self, countDir, name, verbose=True):
+        self.countDir = countDir
+        self.name = name
+        self.verbose = verbose
+        self.total = 0  # records appended since start
+        if not os.path.isdir(countDir):
+            logging.info("Create Count Folder %s", countDir)
+            os.makedirs(countDir)
+
+    def dayPath(self, day):
+        """Return the count file path for datetime.date day"""
+        return os.path.join(
+            self.countDir, "%s-%s%s" % (self.name, day.strftime("%Y%m%d"), COUNT_EXT)
+        )
+
+    def append(self, crossings):
+        """
+        Append (timestamp, trackId, direction, speed, heading, (x, y, w, h))
+        crossings to the file of the day each happened. A partial last
+        record is cut off first. Returns the number of records written
+        """
+        if not crossings:
+            return 0
+        records = np.zeros(len(crossings), dtype=COUNT_DTYPE)
+        for i, crossing in enumerate(crossings):
+            stamp, trackId, direction, speed, heading, box = crossing
+            records[i] = (stamp, trackId, direction, int(heading) % 360, speed) + box
+        days = [datetime.date.fromtimestamp(stamp) for stamp in records["time"]]
+        for day in sorted(set(days)):
+            dayRecords = records[[d == day for d in days]]
+            with open(self.dayPath(day), "ab") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                partial = size % COUNT_DTYPE.itemsize
+                if partial:
+                    # drop a partial last record left by a power cut
+                    logging.warning(
+                        "Truncate %i byte Partial Record in %s", partial, f.name
+                    )
+                    f.truncate(size - partial)
+                f.write(dayRecords.tobytes())
+        self.total += len(records)
+        if self.verbose:
+            for record in records:
+                logging.info(
+                    "Count %i Track %i Direction %s speed=%i px/s heading=%i deg",
+                    self.total - len(records) + 1,
+                    record["track"],
+                    "A-B" if record["direction"] == 1 else "B-A",
+                    record["speed"],
+                    record["heading"],
+                )
+        return len(records)
+
+    def load(self, day):
+        """Return the records array of datetime.date day. Empty if none"""
+        path = self.dayPath(day)
+        if not os.path.isfile(path):
+            return np.zeros(0, dtype=COUNT_DTYPE)
+        # ignore a partial last record left by a power cut
+        count = os.path.getsize(path) // COUNT_DTYPE.itemsize
+        return np.fromfile(path, dtype=COUNT_DTYPE, count=count)
+
+    def hourlyCounts(self, firstDay, lastDay):
+        """
+        Return int64 array shaped (days, 24, 2) of crossings per local
+        hour of each day firstDay to lastDay inclusive. Last axis is
+        direction A-B, B-A
+        """
+        days = dayRange(firstDay, lastDay)
+        bins = []
+        for i, day in enumerate(days):
+            records = self.load(day)
+            if not len(records):
+                continue
+            midnight = time.mktime(day.timetuple())
+            # clip keeps daylight saving change days to 24 hours
+            hours = ((records["time"] - midnight) // 3600).astype(np.int64)
+            np.clip(hours, 0, 23, out=hours)
+            bins.append((i * 24 + hours) * 2 + (records["direction"] == 2))
+        if not bins:
+            return np.zeros((len(days), 24, 2), dtype=np.int64)
+        counts = np.bincount(np.concatenate(bins), minlength=len(days) * 48)
+        return counts.reshape(len(days), 24, 2)
@@ -0,0 +1,513 @@
+"""
+Multi object motion tracker module imported by pi-timolo.py
+when MOTION_TRACKER = "multi" in config.py
+
+Motion blob centers found in each stream frame are matched to
+existing tracks by distance so every moving object keeps its own
+track id and trajectory. Motion is triggered when any one track
+has moved the trigger length. Two objects moving at the same time
+are tracked separately rather than being joined into one long
+track that exceeds MOTION_TRACK_TRIG_LEN_MAX and is discarded.
+All track state is kept in preallocated numpy arrays.
+
+With kalmanOn each track position is smoothed by a constant velocity
+Kalman filter run over all active tracks at once so jittery blob
+centers do not trip the trigger length. The filter velocity allows
+triggers for crossing a line, moving in a direction and moving
+faster than a speed.
+
+With speedWindow each track is timed across a window of stream
+image x positions and its speed is fitted to the trajectory
+positions and frame timestamps inside the window.
+For more information see pi-timolo github Wiki
+"""
+from __future__ import print_function
+import logging
+import math
+import numpy as np
+
+
+# ------------------------------------------------------------------------------
+def lineSide(line, points):
+    """
+    Return the signed side of line ((x1, y1), (x2, y2)) for an array of
+    x, y points. Positive on one side, negative on the other, 0 on it
+    """
+    (x1, y1), (x2, y2) = line
+    return (x2 - x1) * (points[..., 1] - y1) - (y2 - y1) * (points[..., 0] - x1)
+
+
+# ------------------------------------------------------------------------------
+def lineCrossing(line, fromPos, toPos):
+    """
+    Return the lineSide() sign (1.0 or -1.0) fromPos is on if the move
+    fromPos to toPos crosses the line segment, otherwise 0.0. A point
+    exactly on the line counts as on the positive side so a track
+    stepping onto the line and off again is not missed
+    """
+    ends = np.array((fromPos, toPos), dtype=np.float64)
+    sideFrom, sideTo = lineSide(line, ends)
+    if (sideFrom >= 0) == (sideTo >= 0):
+        return 0.0  # both on the same side
+    # line end points must also be on opposite sides of the move
+    linePts = np.array(line, dtype=np.float64)
+    side1, side2 = lineSide(ends, linePts)
+    if side1 * side2 > 0:
+        return 0.0
+    return 1.0 if sideFrom >= 0 else -1.0
+
+
+# ------------------------------------------------------------------------------
+class MultiTracker:
+    """
+    Track up to maxTracks objects at once. updateBlobs() is called with
+    the blobs array (rows of x, y, w, h, area, cx, cy) found in each stream
+    frame and the frame timestamp and returns True when a track
+    length triggers a motion event.
+    Same interface as the pi-timolo.py TrackState single tracker.
+    A line ((x1, y1), (x2, y2)) triggers once for each track that
+    crosses it, from the side of lineFrom (x, y) only if set, instead
+    of on track length. direction (degrees 0=right 90=down) within directionTol
+    and speedMin px/s then filter which tracks may trigger.
+    A crossing only counts once the track is lineGap px past the line
+    so a track jittering on the line is not counted. Each track is
+    listed in crossings once per direction, after the updateBlobs()
+    call it crossed in, if it passes the filters.
+    A speedWindow (x1, x2) triggers once for each track that crosses
+    it, instead of on line or track length, and the measured speed
+    is listed in speeds.
+    """
+
+    def __init__(
+        self,
+        trigLen,
+        trigLenMin,
+        timeout,
+        matchDist,
+        maxTracks=32,
+        historyLen=64,
+        verbose=True,
+        infoOn=False,
+        prefix="",
+        kalmanOn=False,
+        measureStd=8.0,
+        accelStd=100.0,
+        line=None,
+        lineFrom=None,
+        lineGap=0.0,
+        direction=None,
+        directionTol=45.0,
+        speedMin=0.0,
+        speedWindow=None,
+    ):
+        self.trigLen = trigLen
+        self.trigLenMin = trigLenMin
+        self.timeout = timeout
+        self.matchDist = matchDist  # max px a blob can move between frames
+        self.maxTracks = int(maxTracks)
+        self.historyLen = int(historyLen)
+        self.verbose = verbose  # False suppresses logging eg for --tune
+        self.infoOn = infoOn  # log track progress and timeouts
+        self.prefix = prefix
+        self.nextId = 1
+        # Per track slot state
+        self.active = np.zeros(self.maxTracks, dtype=np.bool_)
+        self.trackIds = np.zeros(self.maxTracks, dtype=np.int64)
+        self.startPos = np.zeros((self.maxTracks, 2), dtype=np.float32)
+        self.lastPos = np.zeros((self.maxTracks, 2), dtype=np.float32)
+        self.trackLens = np.zeros(self.maxTracks, dtype=np.float32)
+        self.progressTime = np.zeros(self.maxTracks, dtype=np.float64)
+        # trajectory ring of the last historyLen positions for each track
+        self.history = np.zeros((self.maxTracks, self.historyLen, 2), dtype=np.float32)
+        self.historyCount = np.zeros(self.maxTracks, dtype=np.int64)
+        self.historyTime = np.zeros((self.maxTracks, self.historyLen), dtype=np.float64)
+        # Work buffers for matching up to maxTracks blobs per frame
+        self.centers = np.zeros((self.maxTracks, 2), dtype=np.float32)
+        self.dist = np.zeros((self.maxTracks, self.maxTracks), dtype=np.float32)
+        self.delta = np.zeros((self.maxTracks, self.maxTracks, 2), dtype=np.float32)
+        self.slotMatched = np.zeros(self.maxTracks, dtype=np.bool_)
+        self.blobMatched = np.zeros(self.maxTracks, dtype=np.bool_)
+        # Constant velocity Kalman filter state x, y, vx, vy per track
+        self.kalmanOn = kalmanOn
+        self.measureVar = float(measureStd) ** 2
+        self.accelVar = float(accelStd) ** 2
+        self.state = np.zeros((self.maxTracks, 4), dtype=np.float64)
+        self.cov = np.zeros((self.maxTracks, 4, 4), dtype=np.float64)
+        self.lastTime = None
+        self.settleCount = 5  # filter updates before the track start is fixed
+        # Trigger rules
+        self.line = None
+        self.lineFrom = 0.0  # lineSide() sign triggering tracks come from. 0= either
+        self.sideA = 1.0  # crossings from this lineSide() sign are direction 1
+        self.lineGap = float(lineGap)  # px past the line a crossing needs
+        self.lineLen = 1.0
+        # lineSide() sign each track crossed from. 0= none waiting for lineGap
+        self.linePending = np.zeros(self.maxTracks, dtype=np.float64)
+        # directions each track was counted in. bit 1= A to B  bit 2= B to A
+        self.lineCounted = np.zeros(self.maxTracks, dtype=np.uint8)
+        self.lineDone = np.zeros(self.maxTracks, dtype=np.bool_)  # track triggered
+        if line:
+            self.line = tuple(tuple(float(v) for v in point) for point in line)
+            (x1, y1), (x2, y2) = self.line
+            self.lineLen = math.hypot(x2 - x1, y2 - y1) or 1.0
+            if lineFrom is not None:
+                self.lineFrom = float(
+                    np.sign(lineSide(self.line, np.array(lineFrom, dtype=np.float64)))
+                )
+                self.sideA = self.lineFrom
+            else:
+                # side A is the side of the stream image top left corner
+                self.sideA = float(np.sign(lineSide(self.line, np.zeros(2)))) or 1.0
+        self.direction = direction
+        self.directionTol = directionTol
+        self.speedMin = speedMin
+        self.speedWindow = None
+        if speedWindow:
+            self.speedWindow = (float(min(speedWindow)), float(max(speedWindow)))
+        self.speedDone = np.zeros(self.maxTracks, dtype=np.bool_)
+        self.prevPos = np.zeros(2, dtype=np.float64)
+        self.startTrack = False  # True while any track is active
+        self.trackLen = 0.0  # longest current track length
+        # (trackId, startPos, endPos, trackLen, speed px/s, heading degrees)
+        # of the last triggered track
+        self.lastTrigger = None
+        # (timestamp, trackId, direction 1=side A to B 2=B to A, speed px/s,
+        # heading degrees, (x, y, w, h) blob box) of each line crossing
+        # in the last updateBlobs() call
+        self.crossings = []
+        # (timestamp, trackId, speed px/s +=moving right, (x, y, w, h) blob box)
+        # of each speedWindow measurement in the last updateBlobs() call
+        self.speeds = []
+
+    def reset(self, timestamp=None):
+        """Abandon all tracks in progress"""
+        self.active[:] = False
+        self.trackLens[:] = 0.0
+        self.startTrack = False
+        self.trackLen = 0.0
+        self.lastTime = None
+
+    def kalmanPredict(self, dt):
+        """Move the filter state of all active tracks on dt seconds"""
+        slots = np.flatnonzero(self.active)
+        if not len(slots) or dt <= 0:
+            return
+        trans = np.eye(4)
+        trans[0, 2] = trans[1, 3] = dt
+        # white noise acceleration process noise for each axis
+        noise = np.zeros((4, 4))
+        noise[0, 0] = noise[1, 1] = dt ** 4 / 4.0
+        noise[0, 2] = noise[2, 0] = noise[1, 3] = noise[3, 1] = dt ** 3 / 2.0
+        noise[2, 2] = noise[3, 3] = dt ** 2
+        noise *= self.accelVar
+        self.state[slots] = np.matmul(self.state[slots], trans.T)
+        self.cov[slots] = np.matmul(np.matmul(trans, self.cov[slots]), trans.T) + noise
+        self.lastPos[slots] = self.state[slots, :2]
+
+    def kalmanCorrect(self, slots, centers):
+        """Correct the filter state of track slots with measured centers"""
+        cov = self.cov[slots]
+        # position only measurement so S = P[:2, :2] + R
+        innovCov = cov[:, :2, :2] + np.eye(2) * self.measureVar
+        gain = np.matmul(cov[:, :, :2], np.linalg.inv(innovCov))
+        innov = centers - self.state[slots, :2]
+        self.state[slots] += np.einsum("nij,nj->ni", gain, innov)
+        self.cov[slots] = cov - np.matmul(gain, cov[:, :2, :])
+
+    def kalmanStart(self, slot, center):
+        """Start the filter of a new track at center with unknown velocity"""
+        self.state[slot, :2] = center
+        self.state[slot, 2:] = 0.0
+        self.cov[slot] = 0.0
+        self.cov[slot, 0, 0] = self.cov[slot, 1, 1] = self.measureVar
+        # any speed up to matchDist px per 1/10 sec is possible
+        velocityVar = (self.matchDist * 10.0) ** 2
+        self.cov[slot, 2, 2] = self.cov[slot, 3, 3] = velocityVar
+
+    def velocity(self, slot):
+        """Return (speed px/s, heading degrees 0=right 90=down) of track slot"""
+        vx, vy = self.state[slot, 2:]
+        return math.hypot(vx, vy), math.degrees(math.atan2(vy, vx)) % 360.0
+
+    def passesFilters(self, slot):
+        """Return True if track slot speed and direction may trigger"""
+        if not self.kalmanOn:
+            return True
+        speed, heading = self.velocity(slot)
+        if speed < self.speedMin:
+            return False
+        if self.direction is not None:
+            diff = abs((heading - self.direction + 180.0) % 360.0 - 180.0)
+            if diff > self.directionTol:
+                return False
+        return True
+
+    def timeRemaining(self, timestamp):
+        """Return seconds until the next active track times out or None"""
+        if not self.startTrack:
+            return None
+        return self.timeout - (timestamp - self.progressTime[self.active].min())
+
+    def trajectory(self, trackId):
+        """Return array of the recent x, y positions of trackId or None"""
+        slots = np.flatnonzero(self.active & (self.trackIds == trackId))
+        if not len(slots):
+            return None
+        slot = slots[0]
+        count = min(self.historyCount[slot], self.historyLen)
+        end = self.historyCount[slot] % self.historyLen
+        return np.roll(self.history[slot], -end, axis=0)[self.historyLen - count:]
+
+    def addPosition(self, slot, center, timestamp):
+        """Append center seen at timestamp to the trajectory of track slot"""
+        index = self.historyCount[slot] % self.historyLen
+        self.history[slot, index] = center
+        self.historyTime[slot, index] = timestamp
+        self.historyCount[slot] += 1
+        self.lastPos[slot] = center
+
+    def windowSpeed(self, slot, center):
+        """
+        Return the x speed px/s of track slot if the move from prevPos
+        to center just left speedWindow otherwise None. Speed is the
+        least squares slope of the trajectory x positions inside the
+        window against their timestamps. None if the track was already
+        measured or the points inside span less than half the window
+        """
+        x1, x2 = self.speedWindow
+        if self.speedDone[slot] or not x1 <= self.prevPos[0] <= x2:
+            return None
+        if x1 <= center[0] <= x2:
+            return None  # still inside
+        count = min(self.historyCount[slot], self.historyLen)
+        xs = self.history[slot, :count, 0]
+        inside = (xs >= x1) & (xs <= x2)
+        xs = xs[inside]
+        if len(xs) < 3 or xs.max() - xs.min() < (x2 - x1) / 2.0:
+            return None
+        self.speedDone[slot] = True
+        times = self.historyTime[slot, :count][inside]
+        times = times - times.min()
+        if not times.max():
+            return None
+        return float(np.polyfit(times, xs, 1)[0])
+
+    def lineConfirm(self, slot, center):
+        """
+        Return the lineSide() sign track slot crossed the line from once
+        the move prevPos to center has taken it lineGap px past the line,
+        otherwise 0.0. A crossing is dropped if the track moves back
+        across before getting clear of the line
+        """
+        fromSide = lineCrossing(self.line, self.prevPos, center)
+        if fromSide:
+            if fromSide == -self.linePending[slot]:
+                self.linePending[slot] = 0.0  # back on the side it came from
+                return 0.0
+            self.linePending[slot] = fromSide
+        fromSide = self.linePending[slot]
+        if not fromSide:
+            return 0.0
+        past = -fromSide * float(lineSide(self.line, center)) / self.lineLen
+        if past < self.lineGap:
+            return 0.0
+        self.linePending[slot] = 0.0
+        return fromSide
+
+    def matchBlobs(self, count):
+        """
+        Greedy nearest first assignment of the first count centers to
+        active tracks using a distance matrix. Sets slotMatched and
+        blobMatched and returns a list of (slot, blob) pairs
+        """
+        self.slotMatched[:] = False
+        self.blobMatched[:count] = False
+        slots = np.flatnonzero(self.active)
+        pairs = []
+        if not len(slots) or not count:
+            return pairs
+        numSlots = len(slots)
+        delta = self.delta[:numSlots, :count]
+        dist = self.dist[:numSlots, :count]
+        np.subtract(
+            self.lastPos[slots][:, np.newaxis, :],
+            self.centers[np.newaxis, :count, :],
+            out=delta,
+        )
+        np.hypot(delta[..., 0], delta[..., 1], out=dist)
+        for flat in np.argsort(dist, axis=None):
+            row, blob = divmod(int(flat), count)
+            if dist[row, blob] > self.matchDist:
+                break  # remaining pairs are further apart
+            slot = slots[row]
+            if self.slotMatched[slot] or self.blobMatched[blob]:
+                continue
+            self.slotMatched[slot] = True
+            self.blobMatched[blob] = True
+            pairs.append((slot, blob))
+            if len(pairs) == min(numSlots, count):
+                break
+        return pairs
+
+    def updateBlobs(self, blobs, timestamp):
+        """
+        Match blobs seen at timestamp to tracks, start new tracks for
+        unmatched blobs and drop tracks that timed out.
+        Return True if any track triggered motion.
+        """
+        motionFound = False
+        del self.crossings[:]
+        del self.speeds[:]
+        count = min(len(blobs), self.maxTracks)
+        if len(blobs) > count:
+            # more blobs than track slots so keep the largest
+            blobs = blobs[np.argsort(blobs[:, 4])[::-1][:count]]
+        # blob track points. bounding box center or components centroid
+        self.centers[:count, :] = blobs[:count, 5:7]
+        if self.kalmanOn:
+            # match blobs to where each track is predicted to be now
+            if self.lastTime is not None:
+                self.kalmanPredict(timestamp - self.lastTime)
+            self.lastTime = timestamp
+        pairs = self.matchBlobs(count)
+        if self.kalmanOn and pairs:
+            slots = np.array([pair[0] for pair in pairs])
+            blobIds = np.array([pair[1] for pair in pairs])
+            self.kalmanCorrect(slots, self.centers[blobIds])
+        for slot, blob in pairs:
+            self.prevPos[:] = self.history[
+                slot, (self.historyCount[slot] - 1) % self.historyLen
+            ]
+            if self.kalmanOn:
+                center = self.state[slot, :2].astype(np.float32)
+            else:
+                center = self.centers[blob]
+            self.addPosition(slot, center, timestamp)
+            if self.kalmanOn and self.historyCount[slot] <= self.settleCount:
+                # measure from the filtered position once it has settled
+                # rather than from the first noisy blob center
+                self.startPos[slot] = center
+            startPos = self.startPos[slot]
+            trackLen = float(np.hypot(*(center - startPos)))
+            self.trackLens[slot] = trackLen
+            # wait until track well started
+            if trackLen > self.trigLenMin:
+                # Reset tracking timer object moved
+                self.progressTime[slot] = timestamp
+                if self.verbose and self.infoOn:
+                    logging.info(
+                        "Track %i Progress From(%i,%i) To(%i,%i) trackLen=%i/%i px",
+                        self.trackIds[slot],
+                        startPos[0],
+                        startPos[1],
+                        center[0],
+                        center[1],
+                        trackLen,
+                        self.trigLen,
+                    )
+            if self.speedWindow is not None:
+                pxSpeed = self.windowSpeed(slot, center)
+                triggered = pxSpeed is not None
+                if triggered and self.passesFilters(slot):
+                    self.speeds.append(
+                        (
+                            timestamp,
+                            int(self.trackIds[slot]),
+                            pxSpeed,
+                            tuple(int(v) for v in blobs[blob, :4]),
+                        )
+                    )
+                reason = "Speed Window %i px/s" % abs(pxSpeed or 0)
+            elif self.line is not None:
+                crossSide = self.lineConfirm(slot, center)
+                direction = 1 if crossSide == self.sideA else 2
+                if (
+                    crossSide
+                    and not self.lineCounted[slot] & direction
+                    and self.passesFilters(slot)
+                ):
+                    self.lineCounted[slot] |= direction
+                    speed, heading = self.velocity(slot)
+                    self.crossings.append(
+                        (
+                            timestamp,
+                            int(self.trackIds[slot]),
+                            direction,
+                            speed,
+                            heading,
+                            tuple(int(v) for v in blobs[blob, :4]),
+                        )
+                    )
+                triggered = (
+                    crossSide != 0
+                    and not self.lineDone[slot]
+                    and (not self.lineFrom or crossSide == self.lineFrom)
+                    and self.passesFilters(slot)
+                )
+                if triggered:
+                    self.lineDone[slot] = True  # trigger once per track
+                reason = "Line Crossed"
+            else:
+                triggered = trackLen >= self.trigLen
+                reason = "trackLen=%i/%i px" % (trackLen, self.trigLen)
+            if triggered and self.passesFilters(slot):
+                motionFound = True
+                speed, heading = self.velocity(slot)
+                self.lastTrigger = (
+                    int(self.trackIds[slot]),
+                    (int(startPos[0]), int(startPos[1])),
+                    (int(center[0]), int(center[1])),
+                    trackLen,
+                    speed,
+                    heading,
+                )
+                if self.verbose:
+                    if self.kalmanOn:
+                        reason += " speed=%i px/s heading=%i deg" % (speed, heading)
+                    logging.info(
+                        "%sMotion Triggered Track %i Start(%i,%i)  End(%i,%i) %s",
+                        self.prefix,
+                        self.trackIds[slot],
+                        startPos[0],
+                        startPos[1],
+                        center[0],
+                        center[1],
+                        reason,
+                    )
+                    print("")
+            if triggered and self.line is None and self.speedWindow is None:
+                # Track keeps its id and measures again from here
+                self.startPos[slot] = center
+                self.trackLens[slot] = 0.0
+        # Start new tracks for unmatched blobs while there are free slots
+        freeSlots = np.flatnonzero(~self.active)
+        newBlobs = np.flatnonzero(~self.blobMatched[:count])
+        for slot, blob in zip(freeSlots, newBlobs):
+            self.active[slot] = True
+            self.trackIds[slot] = self.nextId
+            self.nextId += 1
+            self.startPos[slot] = self.centers[blob]
+            self.trackLens[slot] = 0.0
+            self.progressTime[slot] = timestamp
+            self.historyCount[slot] = 0
+            self.speedDone[slot] = False
+            self.linePending[slot] = 0.0
+            self.lineCounted[slot] = 0
+            self.lineDone[slot] = False
+            self.addPosition(slot, self.centers[blob], timestamp)
+            if self.kalmanOn:
+                self.kalmanStart(slot, self.centers[blob])
+        # Track timed out
+        expired = self.active & (timestamp - self.progressTime > self.timeout)
+        if expired.any():
+            if self.verbose and self.infoOn:
+                for slot in np.flatnonzero(expired):
+                    logging.info(
+                        "Track %i Timer %.2f sec Exceeded. Drop Track",
+                        self.trackIds[slot],
+                        self.timeout,
+                    )
+            self.active &= ~expired
+        self.startTrack = bool(self.active.any())
+        self.trackLen = float(self.trackLens[self.active].max()) if self.startTrack else 0.0
+        return motionFound
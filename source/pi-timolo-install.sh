@@ -36,7 +36,7 @@ INFO  : $progName $ver  written by Claude Pageau
 if $is_upgrade ; then
   timoloFiles=("menubox.sh" "pi-timolo.py" "pi-timolo.sh" "image-stitching" "config.cfg" \
   "webserver.py" "webserver2.py" "webserver3.py" "webserver.sh" "pantilthat.py" \
-  "convid.sh" "makevideo.sh" "mvleavelast.sh" "remote-run.sh" "install-py3exiv2.sh")
+  "convid.sh" "makevideo.sh" "mvleavelast.sh" "remote-run.sh" "install-py3exiv2.sh" "motion_tracker.py" "motion_counts.py")
 
   if [ ! -f config.cfg ]; then
     mv plugins plugins.bak
@@ -47,7 +47,7 @@ if $is_upgrade ; then
 else   # New Install
   timoloFiles=("config.py" "menubox.sh" "pi-timolo.py" "pi-timolo.sh" "image-stitching" "config.cfg" \
   "webserver.py" "webserver2.py" "webserver3.py" "webserver.sh" "watch-app.sh" "shutdown.py" "pantilthat.py" \
-  "convid.sh" "makevideo.sh" "video.conf" "mvleavelast.sh" "remote-run.sh" "install-py3exiv2.sh")
+  "convid.sh" "makevideo.sh" "video.conf" "mvleavelast.sh" "remote-run.sh" "install-py3exiv2.sh" "motion_tracker.py" "motion_counts.py")
 fi
 
 for fname in "${timoloFiles[@]}" ; do
@@ -218,6 +218,7 @@ sudo apt-get install -yq gpac   # required for MP4Box video converter
 sudo apt-get install -yq fonts-freefont-ttf # Required for Jessie Lite Only
 sudo apt-get install -yq python-opencv
 sudo apt-get install -yq python3-opencv  # Raspbian Buster Installs opencv 3.2 (won't change existing)
+sudo apt-get install -yq python3-numpy  # frame ring and motion buffers. Installed with python3-opencv on most images
 sudo apt-get install -yq python-pip
 sudo apt-get install -yq python3-dateutil
 sudo apt-get install -yq python-dateutil
@@ -28,7 +28,13 @@ print(HORIZ_LINE)
 print("Loading Wait ....")
 
 # import python library modules
+import argparse
+import bisect
 import datetime
+import io
+import itertools
+import json
+import multiprocessing
 import logging
 import sys
 import subprocess
@@ -36,9 +42,21 @@ import shutil
 import glob
 import time
 import math
-from threading import Thread
+import atexit
+from threading import Thread, Condition
 from fractions import Fraction
 import numpy as np
+
+# shared memory frame ring for MOTION_WORKER_ON needs python 3.8+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+# --bench allocation check of the motion detection loop
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
 from PIL import Image
 from PIL import ImageFont
 from PIL import ImageDraw
@@ -105,6 +123,7 @@ default_settings = {
     "IMAGE_HFLIP": True,
     "IMAGE_GRAYSCALE": False,
     "IMAGE_PREVIEW": False,
+    "IMAGE_CAMERA_SESSION_ON": True,
     "IMAGE_PIX_AVE_TIMER_SEC": 15,
     "IMAGE_NO_NIGHT_SHOTS": False,
     "IMAGE_NO_DAY_SHOTS": False,
@@ -113,6 +132,19 @@ default_settings = {
     "STREAM_HEIGHT": 240,
     "STREAM_FPS": 20,
     "STREAM_STOP_SEC": 0.7,
+    "STREAM_RING_SIZE": 4,
+    "STREAM_FORMAT": "bgr",
+    "STREAM_STILL_SPLITTER_ON": False,
+    "STREAM_SOURCE": "picamera",
+    "STREAM_SOURCE_PATH": "",
+    "STREAM_VECTOR_PATH": "",
+    "STREAM_REPLAY_REALTIME_ON": True,
+    "STREAM_CAMERA_NUM": 0,
+    "STREAM_STATS_SEC": 300,
+    "STREAM_IDLE_SEC": 0,
+    "STREAM_IDLE_FPS": 2,
+    "MOTION_WORKER_ON": False,
+    "CAMERAS": [],
     "SHOW_DATE_ON_IMAGE": True,
     "SHOW_TEXT_FONT_SIZE": 18,
     "SHOW_TEXT_BOTTOM": True,
@@ -148,6 +180,55 @@ default_settings = {
     "MOTION_TRACK_TIMEOUT_SEC": 0.3,
     "MOTION_TRACK_TRIG_LEN": 75,
     "MOTION_TRACK_MIN_AREA": 100,
+    "MOTION_DETECTOR": "diff",
+    "MOTION_BLOB_METHOD": "contours",
+    "MOTION_AUTO_THRESHOLD_ON": False,
+    "MOTION_AUTO_THRESHOLD_K": 6.0,
+    "MOTION_AUTO_THRESHOLD_RANGE": (12, 60),
+    "MOTION_AUTO_BLUR_RANGE": (8, 12),
+    "MOTION_AUTO_SAMPLE_STEP": 8,
+    "MOTION_AUTO_SAMPLE_FRAMES": 15,
+    "MOTION_LIGHT_CHECK_ON": False,
+    "MOTION_LIGHT_MEAN_DIFF": 8,
+    "MOTION_LIGHT_HIST_CORREL": 0.8,
+    "MOTION_LIGHT_SAMPLE_STEP": 8,
+    "MOTION_DENOISE_DAY_FRAMES": 0,
+    "MOTION_DENOISE_NIGHT_FRAMES": 0,
+    "MOTION_ROI_INCLUDE": [],
+    "MOTION_ROI_EXCLUDE": [],
+    "MOTION_HEATMAP_ON": False,
+    "MOTION_HEATMAP_DECAY_SEC": 600,
+    "MOTION_HEATMAP_SAVE_SEC": 300,
+    "MOTION_HEATMAP_NUISANCE": 0.25,
+    "MOTION_HEATMAP_MASK_ON": False,
+    "MOTION_TRACKER": "single",
+    "MOTION_TRACK_MATCH_DIST": 0,
+    "MOTION_TRACK_MAX_OBJECTS": 32,
+    "MOTION_TRACK_KALMAN_ON": False,
+    "MOTION_TRACK_KALMAN_MEASURE_STD": 8.0,
+    "MOTION_TRACK_KALMAN_ACCEL_STD": 100.0,
+    "MOTION_TRIGGER_LINE": [],
+    "MOTION_TRIGGER_LINE_FROM": None,
+    "MOTION_TRIGGER_LINE_GAP": 10,
+    "MOTION_TRIGGER_DIRECTION": None,
+    "MOTION_TRIGGER_DIRECTION_TOL": 45,
+    "MOTION_TRIGGER_SPEED_MIN": 0,
+    "MOTION_COUNT_ON": False,
+    "MOTION_COUNT_DIR": "media/counts",
+    "MOTION_COUNT_CAPTURE_ON": False,
+    "MOTION_SPEED_ON": False,
+    "MOTION_SPEED_WINDOW": (80, 240),
+    "MOTION_SPEED_PX_PER_M": 20.0,
+    "MOTION_SPEED_UNITS": "kph",
+    "MOTION_SPEED_MIN": 0,
+    "MOTION_VECTOR_MAGNITUDE": 10,
+    "MOTION_VECTOR_SAD_MAX": 0,
+    "MOTION_VECTOR_MIN_CELLS": 4,
+    "MOTION_BG_ALPHA": 0.02,
+    "MOTION_BG_SIGMA": 4.0,
+    "MOTION_BG_MIN_STD": 3.0,
+    "MOTION_TUNE_GRID": {},
+    "MOTION_TUNE_WORKERS": 0,
     "MOTION_TRACK_QUICK_PIC_BIGGER": 3.0,
     "MOTION_DIR": "media/motion",
     "MOTION_PREFIX": "mo-",
@@ -157,6 +238,8 @@ default_settings = {
     "MOTION_VIDEO_WIDTH": 640,
     "MOTION_VIDEO_HEIGHT": 480,
     "MOTION_VIDEO_TIMER_SEC": 10,
+    "MOTION_VIDEO_PRETRIGGER_SEC": 0,
+    "MOTION_VIDEO_BITRATE": 17000000,
     "MOTION_TRACK_MINI_TL_ON": False,
     "MOTION_TRACK_MINI_TL_SEQ_SEC": 20,
     "MOTION_TRACK_MINI_TL_TIMER_SEC": 4,
@@ -394,47 +477,110 @@ except ImportError:
         logging.error("sudo apt-get install python-opencv")
     logging.error("Exiting %s Due to Error", PROG_NAME)
     sys.exit(1)
+# Multi object tracker module used when MOTION_TRACKER = "multi"
 try:
-    from picamera import PiCamera
+    import motion_tracker
 except ImportError:
-    logging.error("Problem importing picamera module")
-    logging.error("Try command below to import module")
-    if sys.version_info > (2, 9):
-        logging.error("sudo apt-get install python3-picamera")
-    else:
-        logging.error("sudo apt-get install python-picamera")
-    logging.error("Exiting %s Due to Error", PROG_NAME)
-    sys.exit(1)
-from picamera.array import PiRGBArray
-import picamera.array
-# Check that pi camera module is installed and enabled
-logging.info("Checking Pi Camera Module using command - vcgencmd get_camera")
-camResult = subprocess.check_output("vcgencmd get_camera", shell=True)
-camResult = camResult.decode("utf-8")
-camResult = camResult.replace("\n", "")
-params = camResult.split()
-for x in range(0,2):
-    if params[x].find("0") >= 0:
-        logging.error("Detected picamera issue per %s", params[x])
-        logging.error("  if supported=0 Enable Camera per command  sudo raspi-config")
-        logging.error("  Bullseye and later enable Legacy picamera support.")
-        logging.error("  if detected=0 Check Pi Camera Module and cable is Installed Correctly.")
-        logging.error("%s %s Exiting Due to Error", PROG_NAME, PROG_VER)
-        sys.exit(1)
+    motion_tracker = None
+# Line crossing count store module used when MOTION_COUNT_ON = True
+try:
+    import motion_counts
+except ImportError:
+    motion_counts = None
+# Command line options
+argParser = argparse.ArgumentParser(description="pi-timolo timelapse and motion tracking")
+argParser.add_argument(
+    "--tune",
+    metavar="PATH",
+    help="Replay a video file or directory of images through motion tracking"
+    " for each MOTION_TUNE_GRID parameter set and report results. No camera used",
+)
+argParser.add_argument(
+    "--workers",
+    type=int,
+    default=MOTION_TUNE_WORKERS,
+    help="Number of --tune worker processes. 0= One per cpu core",
+)
+argParser.add_argument(
+    "--bench",
+    metavar="PATH",
+    help="Replay a video file or directory of images in real time with motion"
+    " detection in the main process then in a worker process while the main"
+    " process saves images and report detection fps. No camera used",
+)
+argParser.add_argument(
+    "--alloc-check",
+    action="store_true",
+    help="Run motion detection and tracking on 10000 generated frames with"
+    " tracemalloc and report memory growth. No camera or footage used",
+)
+argParser.add_argument(
+    "--counts",
+    metavar="PERIOD",
+    help="Report MOTION_COUNT_ON line crossing counts per day and hour for"
+    " PERIOD YYYY-MM or YYYY-MM-DD. No camera used",
+)
+args = argParser.parse_args()
+if args.tune or args.bench:
+    # Skip pi camera checks since recorded footage is replayed
+    STREAM_SOURCE = "replay"
+    STREAM_SOURCE_PATH = args.tune or args.bench
+    CAMERAS = []
+if args.counts or args.alloc_check:
+    streamSources = []  # Count report and alloc check use no camera
+elif CAMERAS:
+    streamSources = [cam.get("STREAM_SOURCE", STREAM_SOURCE) for cam in CAMERAS]
 else:
-    logging.info("Success Pi Camera %s", camResult)
-    # use raspistill to check maximum image resolution of attached camera module
-    logging.info("Checking Pi Camera Module Version Wait ...")
-    import picamera
-    with picamera.PiCamera() as camera:
-        CAM_MAX_RESOLUTION = camera.MAX_RESOLUTION
-    logging.info("PiCamera Max resolution is %s", CAM_MAX_RESOLUTION)
-    CAM_MAX_WIDTH, CAM_MAX_HEIGHT = CAM_MAX_RESOLUTION.width, CAM_MAX_RESOLUTION.height
-    if CAM_MAX_WIDTH == "3280":
-        picameraVer = "2"
+    streamSources = [STREAM_SOURCE]
+if "picamera" in streamSources:
+    try:
+        from picamera import PiCamera
+    except ImportError:
+        logging.error("Problem importing picamera module")
+        logging.error("Try command below to import module")
+        if sys.version_info > (2, 9):
+            logging.error("sudo apt-get install python3-picamera")
+        else:
+            logging.error("sudo apt-get install python-picamera")
+        logging.error("Exiting %s Due to Error", PROG_NAME)
+        sys.exit(1)
+    from picamera.array import PiRGBArray
+    import picamera.array
+    # Check that pi camera module is installed and enabled
+    logging.info("Checking Pi Camera Module using command - vcgencmd get_camera")
+    camResult = subprocess.check_output("vcgencmd get_camera", shell=True)
+    camResult = camResult.decode("utf-8")
+    camResult = camResult.replace("\n", "")
+    params = camResult.split()
+    for x in range(0,2):
+        if params[x].find("0") >= 0:
+            logging.error("Detected picamera issue per %s", params[x])
+            logging.error("  if supported=0 Enable Camera per command  sudo raspi-config")
+            logging.error("  Bullseye and later enable Legacy picamera support.")
+            logging.error("  if detected=0 Check Pi Camera Module and cable is Installed Correctly.")
+            logging.error("%s %s Exiting Due to Error", PROG_NAME, PROG_VER)
+            sys.exit(1)
     else:
-        picameraVer = "1"
-    logging.info("PiCamera Module Hardware is Ver %s", picameraVer)
+        logging.info("Success Pi Camera %s", camResult)
+        # use raspistill to check maximum image resolution of attached camera module
+        logging.info("Checking Pi Camera Module Version Wait ...")
+        import picamera
+        with picamera.PiCamera() as camera:
+            CAM_MAX_RESOLUTION = camera.MAX_RESOLUTION
+        logging.info("PiCamera Max resolution is %s", CAM_MAX_RESOLUTION)
+        CAM_MAX_WIDTH, CAM_MAX_HEIGHT = CAM_MAX_RESOLUTION.width, CAM_MAX_RESOLUTION.height
+        if CAM_MAX_WIDTH == "3280":
+            picameraVer = "2"
+        else:
+            picameraVer = "1"
+        logging.info("PiCamera Module Hardware is Ver %s", picameraVer)
+else:
+    # opencv and replay frame sources do not need a pi camera module
+    logging.info(
+        "STREAM_SOURCE=%s Skip Pi Camera Module Checks",
+        ", ".join(streamSources) or "None",
+    )
+    picameraVer = "2"
 
 
 if PLUGIN_ON:  # Check and verify plugin and load variable overlay
@@ -500,35 +646,14 @@ if PLUGIN_ON:  # Check and verify plugin and load variable overlay
             time.sleep(5)
 else:
     logging.info("No Plugin Enabled per PLUGIN_ON=%s", PLUGIN_ON)
-# Turn on VERBOSE_ON when DEBUG_ON mode is enabled
-if DEBUG_ON:
-    VERBOSE_ON = True
-# Make sure image format extention starts with a dot
-if not IMAGE_FORMAT.startswith(".", 0, 1):
-    IMAGE_FORMAT = "." + IMAGE_FORMAT
 # ==================================
 #      System Variables
 # Should Not need to be customized
 # ==================================
 SECONDS2MICRO = 1000000  # Used to convert from seconds to microseconds
-NIGHT_MAX_SHUTTER = int(NIGHT_MAX_SHUT_SEC * SECONDS2MICRO)
-# default=5 seconds IMPORTANT- 6 seconds works sometimes
-# but occasionally locks RPI and HARD reboot required to clear
-darkAdjust = int((SECONDS2MICRO / 5.0) * NIGHT_DARK_ADJUST)
 daymode = False  # default should always be False.
-MOTION_PATH = os.path.join(BASE_DIR, MOTION_DIR)  # Store Motion images
-# motion dat file to save currentCount
-
 # Setup filepath's for storing image numbering data
 DATA_DIR = "./data"
-NUM_PATH_MOTION = os.path.join(DATA_DIR, MOTION_PREFIX + BASE_FILENAME + ".dat")
-NUM_PATH_TIMELAPSE = os.path.join(DATA_DIR, TIMELAPSE_PREFIX + BASE_FILENAME + ".dat")
-NUM_PATH_PANO = os.path.join(DATA_DIR, PANO_IMAGE_PREFIX + BASE_FILENAME + ".dat")
-NUM_PATH_PANTILT_SEQ = os.path.join(
-    DATA_DIR, PANTILT_SEQ_IMAGE_PREFIX + BASE_FILENAME + ".dat"
-)
-
-TIMELAPSE_PATH = os.path.join(BASE_DIR, TIMELAPSE_DIR)  # Store Time Lapse images
 # timelapse dat file to save currentCount
 LOCK_FILEPATH = os.path.join(BASE_DIR, BASE_FILENAME + ".sync")
 # Colors for drawing lines
@@ -553,118 +678,1194 @@ logging.info(
     imageWidthMax,
     imageHeightMax,
 )
-
-# Round image resolution to avoid picamera errors
-image_width = (IMAGE_WIDTH + 31) // 32 * 32
-if image_width > imageWidthMax:
-    image_width = imageWidthMax
-image_height = (IMAGE_HEIGHT + 15) // 16 * 16
-
-if image_height > imageHeightMax:
-    image_height = imageHeightMax
-stream_width = (STREAM_WIDTH + 31) // 32 * 32
-if stream_width > imageWidthMax:
-    stream_width = imageWidthMax
-stream_height = (STREAM_HEIGHT + 15) // 16 * 16
-if stream_height > imageHeightMax:
-    stream_height = imageHeightMax
-stream_framerate = STREAM_FPS  # camera framerate
-
-# If camera being used inside where there is no twilight
-# Reduce night threshold settings to reduce overexposures.
-if not NIGHT_TWILIGHT_MODE_ON:
-    NIGHT_TWILIGHT_THRESHOLD = 20
-    NIGHT_DARK_THRESHOLD = 10
-    NIGHT_BLACK_THRESHOLD = 4
-# increase size of MOTION_TRACK_QUICK_PIC_ON image
-bigImage = MOTION_TRACK_QUICK_PIC_BIGGER
-bigImageWidth = int(stream_width * bigImage)
-bigImageHeight = int(stream_height * bigImage)
-TRACK_TRIG_LEN = MOTION_TRACK_TRIG_LEN  # Pixels moved to trigger motion photo
-# Don't track progress until this Len reached.
-TRACK_TRIG_LEN_MIN = int(MOTION_TRACK_TRIG_LEN / 6)
-# Set max overshoot triglen allowed half cam height
-TRACK_TRIG_LEN_MAX = int(stream_height / 2)
-# Timeout seconds Stops motion tracking when no activity
-TRACK_TIMEOUT = MOTION_TRACK_TIMEOUT_SEC
-# OpenCV Contour sq px area must be greater than this.
-MIN_AREA = MOTION_TRACK_MIN_AREA
 BLUR_SIZE = 10  # OpenCV setting for Gaussian difference image blur
 THRESHOLD_SENSITIVITY = 20  # OpenCV setting for difference image threshold
+# h264 encoder motion vector for each 16x16 macroblock. Same layout as
+# picamera motion_output and raspivid -x vector files
+MOTION_VECTOR_DTYPE = np.dtype([("x", "i1"), ("y", "i1"), ("sad", "u2")])
+# MOTION_SPEED_UNITS per metre/sec
+SPEED_UNIT_FACTORS = {"kph": 3.6, "mph": 2.23694, "mps": 1.0}
+# Empty blobs array. Rows are x, y, w, h, area, cx, cy per motion blob
+# where cx, cy is the track point. See getMotionBlobs()
+NO_BLOBS = np.zeros((0, 7), dtype=np.int32)
+# MotionRoi for each stream frame (width, height) see getMotionRoi()
+motionRois = {}
+# Set by each CAMERAS process. Names media sub folders and counter files
+cameraName = ""
+
 
-# Fix range Errors  Use zero to set default quality to 85
-if IMAGE_JPG_QUAL < 1:
-    IMAGE_JPG_QUAL = 85
-elif IMAGE_JPG_QUAL > 100:
-    IMAGE_JPG_QUAL = 100
 # ------------------------------------------------------------------------------
-class PiVideoStream:
+def setDerivedSettings():
     """
-    Create a picamera in memory video stream and
-    return a frame when update called
+    Calculate variables derived from config.py settings.
+    Called at startup and again by each CAMERAS process
+    after the camera settings are applied.
+    """
+    global VERBOSE_ON, IMAGE_FORMAT, IMAGE_JPG_QUAL
+    global NIGHT_MAX_SHUTTER, darkAdjust
+    global NIGHT_TWILIGHT_THRESHOLD, NIGHT_DARK_THRESHOLD, NIGHT_BLACK_THRESHOLD
+    global MOTION_PATH, TIMELAPSE_PATH
+    global NUM_PATH_MOTION, NUM_PATH_TIMELAPSE, NUM_PATH_PANO, NUM_PATH_PANTILT_SEQ
+    global STATS_PATH, COUNT_PATH, COUNT_NAME, HEATMAP_PATH
+    global image_width, image_height, stream_width, stream_height, stream_framerate
+    global bigImage, bigImageWidth, bigImageHeight
+    global TRACK_TRIG_LEN, TRACK_TRIG_LEN_MIN, TRACK_TRIG_LEN_MAX, TRACK_TIMEOUT
+    global TRACK_MATCH_DIST
+    global MIN_AREA
+    # Turn on VERBOSE_ON when DEBUG_ON mode is enabled
+    if DEBUG_ON:
+        VERBOSE_ON = True
+    # Make sure image format extention starts with a dot
+    if not IMAGE_FORMAT.startswith(".", 0, 1):
+        IMAGE_FORMAT = "." + IMAGE_FORMAT
+    NIGHT_MAX_SHUTTER = int(NIGHT_MAX_SHUT_SEC * SECONDS2MICRO)
+    # default=5 seconds IMPORTANT- 6 seconds works sometimes
+    # but occasionally locks RPI and HARD reboot required to clear
+    darkAdjust = int((SECONDS2MICRO / 5.0) * NIGHT_DARK_ADJUST)
+    MOTION_PATH = os.path.join(BASE_DIR, MOTION_DIR)  # Store Motion images
+    TIMELAPSE_PATH = os.path.join(BASE_DIR, TIMELAPSE_DIR)  # Store Time Lapse images
+    # dat files to save currentCount. Each camera keeps its own count
+    countName = BASE_FILENAME
+    if cameraName:
+        countName = BASE_FILENAME + "-" + cameraName
+    NUM_PATH_MOTION = os.path.join(DATA_DIR, MOTION_PREFIX + countName + ".dat")
+    NUM_PATH_TIMELAPSE = os.path.join(DATA_DIR, TIMELAPSE_PREFIX + countName + ".dat")
+    NUM_PATH_PANO = os.path.join(DATA_DIR, PANO_IMAGE_PREFIX + countName + ".dat")
+    NUM_PATH_PANTILT_SEQ = os.path.join(
+        DATA_DIR, PANTILT_SEQ_IMAGE_PREFIX + countName + ".dat"
+    )
+    # Motion stream pipeline statistics json file
+    STATS_PATH = os.path.join(DATA_DIR, countName + "-stats.json")
+    # MOTION_COUNT_ON line crossing count files
+    COUNT_PATH = os.path.join(BASE_DIR, MOTION_COUNT_DIR)
+    COUNT_NAME = countName
+    # MOTION_HEATMAP_ON .npy and .png files path without extension
+    HEATMAP_PATH = os.path.join(DATA_DIR, countName + "-heatmap")
+
+    # Round image resolution to avoid picamera errors
+    image_width = (IMAGE_WIDTH + 31) // 32 * 32
+    if image_width > imageWidthMax:
+        image_width = imageWidthMax
+    image_height = (IMAGE_HEIGHT + 15) // 16 * 16
+
+    if image_height > imageHeightMax:
+        image_height = imageHeightMax
+    stream_width = (STREAM_WIDTH + 31) // 32 * 32
+    if stream_width > imageWidthMax:
+        stream_width = imageWidthMax
+    stream_height = (STREAM_HEIGHT + 15) // 16 * 16
+    if stream_height > imageHeightMax:
+        stream_height = imageHeightMax
+    stream_framerate = STREAM_FPS  # camera framerate
+
+    # If camera being used inside where there is no twilight
+    # Reduce night threshold settings to reduce overexposures.
+    if not NIGHT_TWILIGHT_MODE_ON:
+        NIGHT_TWILIGHT_THRESHOLD = 20
+        NIGHT_DARK_THRESHOLD = 10
+        NIGHT_BLACK_THRESHOLD = 4
+    # increase size of MOTION_TRACK_QUICK_PIC_ON image
+    bigImage = MOTION_TRACK_QUICK_PIC_BIGGER
+    bigImageWidth = int(stream_width * bigImage)
+    bigImageHeight = int(stream_height * bigImage)
+    TRACK_TRIG_LEN = MOTION_TRACK_TRIG_LEN  # Pixels moved to trigger motion photo
+    # Don't track progress until this Len reached.
+    TRACK_TRIG_LEN_MIN = int(MOTION_TRACK_TRIG_LEN / 6)
+    # Set max overshoot triglen allowed half cam height
+    TRACK_TRIG_LEN_MAX = int(stream_height / 2)
+    # Timeout seconds Stops motion tracking when no activity
+    TRACK_TIMEOUT = MOTION_TRACK_TIMEOUT_SEC
+    # Multi tracker max px a blob can move between frames and stay the same object
+    if MOTION_TRACK_MATCH_DIST > 0:
+        TRACK_MATCH_DIST = MOTION_TRACK_MATCH_DIST
+    else:
+        TRACK_MATCH_DIST = MOTION_TRACK_TRIG_LEN
+    # OpenCV Contour sq px area must be greater than this.
+    MIN_AREA = MOTION_TRACK_MIN_AREA
+
+    # Fix range Errors  Use zero to set default quality to 85
+    if IMAGE_JPG_QUAL < 1:
+        IMAGE_JPG_QUAL = 85
+    elif IMAGE_JPG_QUAL > 100:
+        IMAGE_JPG_QUAL = 100
+
+
+setDerivedSettings()
+
+
+# ------------------------------------------------------------------------------
+class FrameRing:
+    """
+    Fixed size ring of preallocated stream frame slots.
+    Each committed frame gets a monotonically increasing frame id and
+    capture timestamp so consumers can wait for a new frame rather
+    than processing the same frame twice. Frames are written in place
+    so there is no memory allocation per frame.
+    """
+
+    def __init__(self, shape, size=None, dtype=np.uint8, autoCommit=False):
+        # Need room for the slot being written plus the two frames
+        # (previous and current) a consumer may be holding.
+        if size is None:
+            size = STREAM_RING_SIZE
+        self.size = max(int(size), 4)
+        self.shape = tuple(shape)
+        self.frames = self.createArray((self.size,) + self.shape, dtype)
+        self.frameIds = self.createArray(self.size, np.int64)  # 0 = empty slot
+        self.timestamps = self.createArray(self.size, np.float64)
+        # wall clock time each frame was committed. Used for latency stats
+        self.commitTimes = self.createArray(self.size, np.float64)
+        # flat byte view of each slot used by write()
+        self.slotBytes = self.frames.reshape(self.size, -1).view(np.uint8)
+        self.latestId = 0
+        self.dropped = 0  # new frames never handed to a consumer
+        self.duplicates = 0  # read() calls that returned an already read frame
+        self.skipped = 0  # new frames deliberately passed over by a consumer
+        self.writeSlot = 0
+        self.writePos = 0
+        self.latestSlot = 0
+        self.lastReadId = 0
+        self.readSlot = 0
+        self.held = (0, 0)  # frame ids a consumer is still working with
+        # commit as soon as write() fills a slot. For writers like picamera
+        # motion_output that have no separate end of frame call
+        self.autoCommit = autoCommit
+        self.cond = Condition()
+
+    def createArray(self, shape, dtype):
+        """Return a zero filled array for ring data"""
+        return np.zeros(shape, dtype=dtype)
+
+    def write(self, buf):
+        """
+        File like write so picamera can capture directly
+        into the next free slot. Call commit() when frame complete.
+        """
+        size = len(buf)
+        end = min(self.writePos + size, self.slotBytes.shape[1])
+        self.slotBytes[self.writeSlot, self.writePos:end] = np.frombuffer(
+            buf, dtype=np.uint8, count=end - self.writePos
+        )
+        self.writePos = end
+        if self.autoCommit and end == self.slotBytes.shape[1]:
+            self.commit()
+        return size
+
+    def flush(self):
+        """Nothing to flush since data is written directly to a slot"""
+        pass
+
+    def put(self, frame, timestamp=None):
+        """Copy a frame array into the next free slot and commit it"""
+        np.copyto(self.frames[self.writeSlot], frame)
+        return self.commit(timestamp)
+
+    def nextFrame(self):
+        """
+        Return the free slot array so a writer can fill it in place
+        eg as an opencv dst. Call commit() when frame complete.
+        """
+        return self.frames[self.writeSlot]
+
+    def commit(self, timestamp=None):
+        """Publish the slot just written and notify any waiting consumers"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self.cond:
+            self.latestId += 1
+            slot = self.writeSlot
+            self.frameIds[slot] = self.latestId
+            self.timestamps[slot] = timestamp
+            self.commitTimes[slot] = time.time()
+            self.latestSlot = slot
+            # Next write slot must not be one a consumer is still holding
+            nextSlot = (slot + 1) % self.size
+            while self.frameIds[nextSlot] and self.isHeld(self.frameIds[nextSlot]):
+                nextSlot = (nextSlot + 1) % self.size
+            self.frameIds[nextSlot] = 0
+            self.writeSlot = nextSlot
+            self.writePos = 0
+            self.cond.notify_all()
+        return self.latestId
+
+    def isHeld(self, frameId):
+        """Return True if a consumer is still working with frame frameId"""
+        return frameId in self.held
+
+    def consumedId(self):
+        """Return the newest frame id read by a consumer"""
+        return self.lastReadId
+
+    def copyFrame(self, frameId, out):
+        """
+        Copy frame frameId into array out if it is still in the ring.
+        Return its timestamp or None if the slot was already reused.
+        The slot id is checked again after the copy since the writer
+        clears it before writing a new frame
+        """
+        slots = np.flatnonzero(self.frameIds == frameId)
+        if not len(slots):
+            return None
+        slot = slots[0]
+        timestamp = float(self.timestamps[slot])
+        np.copyto(out, self.frames[slot])
+        if self.frameIds[slot] != frameId:
+            return None
+        return timestamp
+
+    def wake(self):
+        """Release any consumer waiting in read_next eg when stream stops"""
+        with self.cond:
+            self.cond.notify_all()
+
+    def waitConsumed(self, timeout=None):
+        """
+        Wait up to timeout seconds for a consumer to read the most
+        recent frame. Return True if no unread frame is pending.
+        Lets a replay source run as fast as frames are processed
+        without dropping any.
+        """
+        with self.cond:
+            if self.consumedId() < self.latestId:
+                self.cond.wait(timeout)
+            return self.consumedId() >= self.latestId
+
+    def readCommitTime(self):
+        """return the commit time of the frame last returned by read_next"""
+        return self.commitTimes[self.readSlot]
+
+    def latest(self):
+        """return the most recently committed frame without marking it read"""
+        if self.latestId == 0:
+            return None
+        return self.frames[self.latestSlot]
+
+    def read(self):
+        """return the frame most recently committed or None"""
+        if self.latestId == 0:
+            return None
+        if self.latestId == self.lastReadId:
+            self.duplicates += 1
+        self.lastReadId = self.latestId
+        return self.frames[self.latestSlot]
+
+    def read_next(self, after_id, timeout=None, skip=False):
+        """
+        Wait up to timeout seconds for a frame newer than after_id.
+        Return tuple (frame_id, timestamp, frame) or None on timeout.
+        The returned frame and frame after_id stay valid until the
+        next read_next call since the writer will skip these slots.
+        skip=True counts frames passed over as skipped not dropped.
+        """
+        with self.cond:
+            if self.latestId <= after_id:
+                if timeout is None:
+                    while self.latestId <= after_id:
+                        self.cond.wait()
+                else:
+                    endTime = time.time() + timeout
+                    while self.latestId <= after_id:
+                        remaining = endTime - time.time()
+                        if remaining <= 0:
+                            return None
+                        self.cond.wait(remaining)
+            if after_id and self.latestId > after_id + 1:
+                if skip:
+                    self.skipped += self.latestId - after_id - 1
+                else:
+                    self.dropped += self.latestId - after_id - 1
+            self.held = (after_id, self.latestId)
+            self.lastReadId = self.latestId
+            slot = self.latestSlot
+            self.readSlot = slot
+            self.cond.notify_all()  # wake a writer waiting in waitConsumed
+            return self.latestId, self.timestamps[slot], self.frames[slot]
+
+
+# ------------------------------------------------------------------------------
+def sharedRingField(index):
+    """Return a property stored in the SharedFrameRing state array"""
+
+    def getField(self):
+        return int(self.state[index])
+
+    def setField(self, value):
+        self.state[index] = value
+
+    return property(getField, setField)
+
+
+# ------------------------------------------------------------------------------
+class SharedFrameRing(FrameRing):
+    """
+    FrameRing kept in multiprocessing shared memory so a motion
+    worker process can read frames without pickling them. Frame
+    slots and writer state are shared and a process shared Condition
+    wakes the readers. Each of READERS consumer processes has its own
+    row of held frame ids, last read id and read slot so one reader
+    never releases a frame another is still working with. reader is
+    the row of this process. The worker sets it after the fork.
+    Requires python 3.8+ and a fork started worker process that
+    inherits the mappings.
+    """
+
+    READERS = 2  # main process and motion worker
+    latestId = sharedRingField(0)
+    latestSlot = sharedRingField(1)
+    dropped = sharedRingField(2)
+    duplicates = sharedRingField(3)
+    skipped = sharedRingField(4)
+
+    def __init__(self, shape, size=None, dtype=np.uint8, autoCommit=False):
+        self.sharedBlocks = []
+        self.state = self.createArray(5, np.int64)
+        # per reader columns held id, held id, last read id, read slot
+        self.readerState = self.createArray((self.READERS, 4), np.int64)
+        self.reader = 0
+        # room for the slot being written plus two held frames per reader
+        if size is None:
+            size = STREAM_RING_SIZE
+        size = max(int(size), 2 * self.READERS + 1)
+        FrameRing.__init__(self, shape, size, dtype, autoCommit)
+        self.cond = multiprocessing.Condition()
+        atexit.register(self.unlink)
+
+    @property
+    def held(self):
+        row = self.readerState[self.reader]
+        return (int(row[0]), int(row[1]))
+
+    @held.setter
+    def held(self, ids):
+        self.readerState[self.reader, :2] = ids
+
+    @property
+    def lastReadId(self):
+        return int(self.readerState[self.reader, 2])
+
+    @lastReadId.setter
+    def lastReadId(self, value):
+        self.readerState[self.reader, 2] = value
+
+    @property
+    def readSlot(self):
+        return int(self.readerState[self.reader, 3])
+
+    @readSlot.setter
+    def readSlot(self, value):
+        self.readerState[self.reader, 3] = value
+
+    def isHeld(self, frameId):
+        """Return True if any reader is still working with frame frameId"""
+        return bool((self.readerState[:, :2] == frameId).any())
+
+    def consumedId(self):
+        """Return the newest frame id read by any reader"""
+        return int(self.readerState[:, 2].max())
+
+    def createArray(self, shape, dtype):
+        """Return a zero filled array in a new shared memory block"""
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        block = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        self.sharedBlocks.append(block)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.fill(0)
+        return array
+
+    def unlink(self):
+        """Free the shared memory when the program exits"""
+        for block in self.sharedBlocks:
+            try:
+                block.unlink()
+            except (IOError, OSError):
+                pass
+        self.sharedBlocks = []
+
+
+# ------------------------------------------------------------------------------
+def createFrameRing(shape, dtype=np.uint8, autoCommit=False):
+    """
+    Return a SharedFrameRing if MOTION_WORKER_ON so a worker process
+    can read it otherwise a FrameRing
+    """
+    if MOTION_WORKER_ON:
+        if shared_memory is None:
+            logging.error("MOTION_WORKER_ON = True Requires python 3.8 or later")
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            exit(1)
+        return SharedFrameRing(shape, dtype=dtype, autoCommit=autoCommit)
+    return FrameRing(shape, dtype=dtype, autoCommit=autoCommit)
+
+
+# ------------------------------------------------------------------------------
+class FrameSource:
+    """
+    Base class for motion stream frame sources. A source thread puts
+    frames into a FrameRing and consumers use read or read_next.
+    Subclasses override openSource() to open the camera, device or file
+    and define update(), which start() runs in the source thread to put
+    frames into the ring with putImage() or ring.commit() until stopped
+    is set. Sources other than picamera save stream frames as stills.
     """
 
     def __init__(
         self,
-        resolution=(stream_width, stream_height),
-        framerate=stream_framerate,
+        resolution=None,
+        framerate=None,
         rotation=0,
         hflip=False,
         vflip=False,
+        preTriggerSec=0,
     ):
-        # initialize the camera and stream
-        try:
-            self.camera = PiCamera()
-        except:
-            logging.error("PiCamera Already in Use by Another Process")
-            logging.error("Exiting %s Due to Error", PROG_NAME)
-            exit(1)
-        self.camera.resolution = resolution
-        self.camera.framerate = framerate
-        self.camera.hflip = hflip
-        self.camera.vflip = vflip
-        self.camera.rotation = rotation
-        self.rawCapture = PiRGBArray(self.camera, size=resolution)
-        self.stream = self.camera.capture_continuous(
-            self.rawCapture, format="bgr", use_video_port=True
-        )
-        # initialize the frame and the variable used to indicate
-        # if the thread should be stopped
+        # None uses the stream settings current when the source is created
+        if resolution is None:
+            resolution = (stream_width, stream_height)
+        if framerate is None:
+            framerate = stream_framerate
+        self.resolution = resolution
+        self.framerate = framerate
+        self.rotation = rotation
+        self.hflip = hflip
+        self.vflip = vflip
+        # frames are kept in the ring across stream stop/start so
+        # frame ids keep increasing when the stream is restarted
+        if STREAM_FORMAT == "yuv":
+            # YUV420 (I420) frame. Top 2/3 of rows is the luma Y plane
+            self.ring = createFrameRing((resolution[1] * 3 // 2, resolution[0]))
+        else:
+            self.ring = createFrameRing((resolution[1], resolution[0], 3))
+        # bgr work buffer for frames that need resizing to stream size
+        self.resizeBuf = np.empty((resolution[1], resolution[0], 3), dtype=np.uint8)
+        # Optional in memory pre trigger video. Only picamera supports this
+        self.preTriggerSec = preTriggerSec
+        self.videoBuffer = None
+        # Optional h264 motion vector ring for MOTION_DETECTOR = "vectors"
+        self.vectorRing = None
+        self.vectorSize = None  # (width, height) the vectors were encoded at
         self.thread = None  # Initialize thread
-        self.frame = None
-        self.stopped = False
+        self.stopped = True
+        self.finished = False  # True when a replay source runs out of frames
+        # False when frame timestamps do not follow the wall clock
+        self.realtime = True
+
+    def openSource(self):
+        """Open the camera, device or file. Called by start()"""
+        pass
+
+    def now(self):
+        """
+        Return the current time on the frame timestamp clock. Timers
+        compared with frame timestamps must use this, not time.time()
+        """
+        return time.time()
+
+    def createVectorRing(self, width, height):
+        """
+        Create the motion vector ring for video encoded at width x height.
+        There is one vector per 16x16 macroblock plus one extra column
+        """
+        cols = (width + 15) // 16 + 1
+        rows = (height + 15) // 16
+        self.vectorSize = (width, height)
+        self.vectorRing = createFrameRing(
+            (rows, cols), dtype=MOTION_VECTOR_DTYPE, autoCommit=True
+        )
 
     def start(self):
-        """start the thread to read frames from the video stream"""
+        """open the source and start the thread to read frames"""
+        self.openSource()
+        self.stopped = False
         self.thread = Thread(target=self.update, args=())
         self.thread.daemon = True
         self.thread.start()
         return self
 
-    def update(self):
-        """keep looping infinitely until the thread is stopped"""
-        for f in self.stream:
-            # grab the frame from the stream and clear the stream in
-            # preparation for the next frame
-            self.frame = f.array
-            self.rawCapture.truncate(0)
-            # if the thread indicator variable is set, stop the thread
-            # and release camera resources
-            if self.stopped:
-                self.stream.close()
-                self.rawCapture.close()
-                self.camera.close()
-                return
+    def putImage(self, image, timestamp=None):
+        """
+        Resize a bgr image to the stream size if required and convert
+        it directly into the next ring slot. Return the new frame id
+        """
+        width, height = self.resolution
+        if image.shape[1] != width or image.shape[0] != height:
+            image = cv2.resize(image, (width, height), dst=self.resizeBuf)
+        slot = self.ring.nextFrame()
+        if slot.ndim == 2:
+            cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420, dst=slot)
+        else:
+            np.copyto(slot, image)
+        return self.ring.commit(timestamp)
 
     def read(self):
         """return the frame most recently read"""
-        return self.frame
+        return self.ring.read()
+
+    def read_next(self, after_id=0, timeout=None, skip=False):
+        """
+        Wait for a frame newer than after_id.
+        Return (frame_id, timestamp, frame) or None if timeout expires
+        """
+        return self.ring.read_next(after_id, timeout, skip)
+
+    def canTakeStill(self, daymode):
+        """
+        Return True if a still can be taken without stopping the stream.
+        Stream frames are always available once the source has started.
+        """
+        return self.ring.latestId > 0
+
+    def takeStill(self, filename):
+        """
+        Still capture for sources without a picamera. Saves the most
+        recent stream frame scaled to the image size.
+        """
+        image = cv2.resize(
+            getStreamBGR(self.ring.latest()), (image_width, image_height)
+        )
+        if IMAGE_GRAYSCALE:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if IMAGE_FORMAT == ".jpg":
+            cv2.imwrite(filename, image, [cv2.IMWRITE_JPEG_QUALITY, IMAGE_JPG_QUAL])
+        else:
+            cv2.imwrite(filename, image)
+
+    def canSaveVideoClip(self):
+        """Return True if pre trigger video is being buffered"""
+        return False
 
     def stop(self):
         """indicate that the thread should be stopped"""
         self.stopped = True
         if self.thread is not None:
             self.thread.join()
+            self.thread = None
+        logging.info(
+            "Stream frames=%i dropped=%i duplicates=%i",
+            self.ring.latestId,
+            self.ring.dropped,
+            self.ring.duplicates,
+        )
+
+
+# ------------------------------------------------------------------------------
+class PiVideoStream(FrameSource):
+    """
+    Create a picamera in memory video stream and
+    return a frame when update called
+    """
+
+    def __init__(self, **kwargs):
+        FrameSource.__init__(self, **kwargs)
+        # Run camera at full image size and resize the stream so full
+        # size day stills can be taken from a second splitter port
+        self.stillPortOn = STREAM_STILL_SPLITTER_ON
+        self.camera = None
+        self.stream = None
+        self.recording = False  # h264 recording on splitter port 2
+        if MOTION_DETECTOR == "vectors":
+            # Vectors come from the pre trigger recording if there is one
+            if self.preTriggerSec > 0:
+                self.createVectorRing(MOTION_VIDEO_WIDTH, MOTION_VIDEO_HEIGHT)
+            else:
+                self.createVectorRing(*self.resolution)
+
+    def openSource(self):
+        """
+        Start the continuous capture into the ring on the cameraSession
+        camera so the still camera settings survive stream restarts
+        """
+        if self.stillPortOn:
+            resolution = (image_width, image_height)
+            resize = self.resolution
+            colorEffects = (128, 128) if IMAGE_GRAYSCALE else None
+        else:
+            resolution = self.resolution
+            resize = None
+            colorEffects = None
+        self.camera = cameraSession.setStream(
+            [
+                ("resolution", resolution),
+                ("framerate", Fraction(self.framerate)),
+                ("hflip", self.hflip),
+                ("vflip", self.vflip),
+                ("rotation", self.rotation),
+                ("color_effects", colorEffects),
+            ]
+        )
+        # picamera writes each frame straight into a preallocated ring slot
+        self.stream = self.camera.capture_continuous(
+            self.ring,
+            format=STREAM_FORMAT,
+            use_video_port=True,
+            resize=resize,
+            splitter_port=0,
+        )
+        if self.preTriggerSec > 0:
+            # Size in bytes is bounded so memory use does not grow
+            self.videoBuffer = picamera.PiCameraCircularIO(
+                self.camera,
+                size=int(MOTION_VIDEO_BITRATE / 8 * self.preTriggerSec),
+                splitter_port=2,
+            )
+            self.camera.start_recording(
+                self.videoBuffer,
+                format="h264",
+                splitter_port=2,
+                resize=(MOTION_VIDEO_WIDTH, MOTION_VIDEO_HEIGHT),
+                bitrate=MOTION_VIDEO_BITRATE,
+                motion_output=self.vectorRing,
+            )
+            self.recording = True
+        elif self.vectorRing is not None:
+            # Only the encoder motion vectors are needed so discard the video
+            self.camera.start_recording(
+                os.devnull,
+                format="h264",
+                splitter_port=2,
+                resize=resize,
+                motion_output=self.vectorRing,
+            )
+            self.recording = True
+
+    def update(self):
+        """keep looping infinitely until the thread is stopped"""
+        for f in self.stream:
+            # frame data is already in the ring so just publish it
+            self.ring.commit()
+            # if the thread indicator variable is set, stop the thread.
+            # The camera stays open in cameraSession for stills
+            if self.stopped:
+                if self.recording:
+                    self.camera.stop_recording(splitter_port=2)
+                    self.recording = False
+                    self.videoBuffer = None
+                self.stream.close()
+                self.ring.wake()
+                return
+
+    def canTakeStill(self, daymode):
+        """
+        Return True if a full size still can be taken without stopping
+        the stream. Night images need long exposure camera settings
+        that would stall the stream so still require a stop.
+        """
+        return self.stillPortOn and daymode and not self.stopped
+
+    def takeStill(self, filename):
+        """Capture a full size image from splitter port 1 while streaming"""
+        if IMAGE_FORMAT == ".jpg":
+            self.camera.capture(
+                filename,
+                use_video_port=True,
+                splitter_port=1,
+                quality=IMAGE_JPG_QUAL,
+            )
+        else:
+            self.camera.capture(filename, use_video_port=True, splitter_port=1)
+
+    def canSaveVideoClip(self):
+        """Return True if pre trigger video is being buffered"""
+        return self.videoBuffer is not None and not self.stopped
+
+    def saveVideoClip(self, filename, duration):
+        """
+        Write the buffered pre trigger video followed by duration seconds
+        of live video to a single h264 file. Live video is split off
+        first since split_recording only returns at the next keyframe.
+        Every frame up to that keyframe is then in the circular buffer
+        and is copied before the live video so the clip has no gap.
+        """
+        livePath = filename + ".live"
+        with io.open(livePath, "wb") as live:
+            self.camera.split_recording(live, splitter_port=2)
+            # The buffer no longer changes so copy it while live video records.
+            # starts at the first sps header within preTriggerSec
+            with io.open(filename, "wb") as output:
+                self.videoBuffer.copy_to(output, seconds=self.preTriggerSec)
+            self.camera.wait_recording(duration, splitter_port=2)
+            self.videoBuffer.clear()
+            self.camera.split_recording(self.videoBuffer, splitter_port=2)
+        # live video starts with an sps header so it can follow the buffer
+        with io.open(filename, "ab") as output, io.open(livePath, "rb") as live:
+            shutil.copyfileobj(live, output)
+        os.remove(livePath)
+
+
+# ------------------------------------------------------------------------------
+class CvVideoStream(FrameSource):
+    """
+    Stream frames from a USB webcam or other video device
+    using opencv VideoCapture (V4L2 on linux)
+    """
+
+    def __init__(self, device=None, **kwargs):
+        FrameSource.__init__(self, **kwargs)
+        self.device = STREAM_SOURCE_PATH if device is None else device
+        self.capture = None
+        self.captureBuf = None  # reused by VideoCapture.read
+        self.flipBuf = None
+        # picamera style flips. rotation 180 is the same as both flips
+        self.flipCode = None
+        hflip = self.hflip != (self.rotation == 180)
+        vflip = self.vflip != (self.rotation == 180)
+        if hflip and vflip:
+            self.flipCode = -1
+        elif hflip:
+            self.flipCode = 1
+        elif vflip:
+            self.flipCode = 0
+
+    def openSource(self):
+        """open the video device and request the stream size and framerate"""
+        device = str(self.device)
+        if device == "":
+            device = "0"
+        if device.isdigit():
+            self.capture = cv2.VideoCapture(int(device), getattr(cv2, "CAP_V4L2", 0))
+        else:
+            self.capture = cv2.VideoCapture(device)
+        if not self.capture.isOpened():
+            logging.error("Could Not Open Video Device %s", device)
+            logging.error("Check STREAM_SOURCE_PATH in %s", CONFIG_FILE_PATH)
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            exit(1)
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+        self.capture.set(cv2.CAP_PROP_FPS, self.framerate)
+
+    def update(self):
+        """keep reading device frames until the thread is stopped"""
+        while not self.stopped:
+            ok, self.captureBuf = self.capture.read(self.captureBuf)
+            if not ok:
+                logging.warning("Video Device %s Read Failed", self.device)
+                time.sleep(0.5)
+                continue
+            image = self.captureBuf
+            if self.flipCode is not None:
+                self.flipBuf = cv2.flip(image, self.flipCode, dst=self.flipBuf)
+                image = self.flipBuf
+            self.putImage(image)
+        self.capture.release()
+        self.capture = None
+        self.ring.wake()
+
+
+# ------------------------------------------------------------------------------
+class ReplayStream(FrameSource):
+    """
+    Replay a video file or a directory of jpg/png images as the
+    motion stream. Frames are paced at real time or put as fast as
+    the consumer reads them so none are dropped. Replay continues
+    from the same position if the stream is stopped and restarted.
+    """
+
+    def __init__(self, path=None, realtime=None, **kwargs):
+        FrameSource.__init__(self, **kwargs)
+        self.path = STREAM_SOURCE_PATH if path is None else path
+        if realtime is None:
+            realtime = STREAM_REPLAY_REALTIME_ON
+        self.realtime = realtime
+        self.capture = None
+        self.captureBuf = None
+        self.fileList = None
+        self.frameNum = 0
+        self.replayFps = float(self.framerate)
+        self.replayStart = 0.0
+        self.vectorPath = None
+        self.vectorFile = None
+        if MOTION_DETECTOR == "vectors":
+            # Vector ring size comes from the footage. Create it now so
+            # it exists before a motion worker process is started
+            self.openSource()
+
+    def openSource(self):
+        """open the replay file or directory list on first start"""
+        if self.capture is None and self.fileList is None:
+            if os.path.isdir(self.path):
+                self.fileList = []
+                for ext in ("*.jpg", "*.jpeg", "*.png"):
+                    self.fileList.extend(glob.glob(os.path.join(self.path, ext)))
+                self.fileList.sort()
+                logging.info(
+                    "Replay %i Images from %s", len(self.fileList), self.path
+                )
+            elif os.path.isfile(self.path):
+                self.capture = cv2.VideoCapture(self.path)
+                if not self.capture.isOpened():
+                    logging.error("Could Not Open Replay Video %s", self.path)
+                    logging.error("Exiting %s Due to Error", PROG_NAME)
+                    exit(1)
+                fps = self.capture.get(cv2.CAP_PROP_FPS)
+                if fps > 0:
+                    self.replayFps = fps
+                logging.info("Replay Video %s at %.1f fps", self.path, self.replayFps)
+            else:
+                logging.error("Replay Path Not Found STREAM_SOURCE_PATH=%s", self.path)
+                logging.error("Exiting %s Due to Error", PROG_NAME)
+                exit(1)
+        if MOTION_DETECTOR == "vectors" and self.vectorRing is None:
+            self.openVectors()
+        # frame timestamps continue from the current replay position
+        self.replayStart = time.time() - self.frameNum / self.replayFps
+
+    def openVectors(self):
+        """
+        Open the recorded motion vector file that goes with the replay
+        footage eg from raspivid -o footage.h264 -x footage.vec
+        Vectors are at the footage size so that sets the vector ring size
+        """
+        if STREAM_VECTOR_PATH:
+            self.vectorPath = STREAM_VECTOR_PATH
+        else:
+            self.vectorPath = os.path.splitext(self.path.rstrip("/"))[0] + ".vec"
+        if not os.path.isfile(self.vectorPath):
+            logging.error("Replay Motion Vector File Not Found %s", self.vectorPath)
+            logging.error("Check STREAM_VECTOR_PATH in %s", CONFIG_FILE_PATH)
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            exit(1)
+        if self.capture is not None:
+            width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        else:
+            image = cv2.imread(self.fileList[0]) if self.fileList else None
+            if image is None:
+                logging.error("No Replay Image to Size Motion Vectors in %s", self.path)
+                logging.error("Exiting %s Due to Error", PROG_NAME)
+                exit(1)
+            height, width = image.shape[:2]
+        self.createVectorRing(width, height)
+        self.vectorFile = io.open(self.vectorPath, "rb")
+        frameBytes = self.vectorRing.slotBytes.shape[1]
+        logging.info(
+            "Replay %i Motion Vector Frames for %ix%i from %s",
+            os.path.getsize(self.vectorPath) // frameBytes,
+            width,
+            height,
+            self.vectorPath,
+        )
+
+    def readVectors(self, timestamp=None):
+        """
+        Read the next recorded motion vector frame into the vector ring.
+        Return False if there are no more vector frames
+        """
+        if self.vectorFile is None:
+            return False
+        slot = self.vectorRing.slotBytes[self.vectorRing.writeSlot]
+        if self.vectorFile.readinto(slot) < len(slot):
+            logging.info("Replay Motion Vectors Finished %s", self.vectorPath)
+            self.vectorFile.close()
+            self.vectorFile = None
+            return False
+        self.vectorRing.commit(timestamp)
+        return True
+
+    def readImage(self):
+        """return the next replay bgr image or None at end of replay"""
+        if self.fileList is not None:
+            image = None
+            while image is None and self.frameNum < len(self.fileList):
+                image = cv2.imread(self.fileList[self.frameNum])
+                if image is None:
+                    logging.warning("Skip Unreadable Image %s", self.fileList[self.frameNum])
+                    self.frameNum += 1
+        else:
+            ok, self.captureBuf = self.capture.read(self.captureBuf)
+            image = self.captureBuf if ok else None
+        if image is not None:
+            self.frameNum += 1
+        return image
+
+    def update(self):
+        """put replay frames into the ring until stopped or finished"""
+        while not self.stopped:
+            image = self.readImage()
+            if image is None:
+                logging.info(
+                    "Replay Finished After %i Frames from %s", self.frameNum, self.path
+                )
+                if self.capture is not None:
+                    self.capture.release()
+                self.finished = True
+                self.stopped = True
+                break
+            # timestamps are replay time so timers behave the same at any speed
+            frameTime = self.replayStart + self.frameNum / self.replayFps
+            if self.realtime:
+                delay = frameTime - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                while not self.stopped and not self.ring.waitConsumed(0.5):
+                    pass
+            # vectors first so they are ready when the frame is read
+            self.readVectors(frameTime)
+            self.putImage(image, frameTime)
+        self.ring.wake()
+
+    def now(self):
+        """
+        Return the replay clock. Replay not in real time only moves
+        on as frames are read so it is the latest frame timestamp.
+        The ring is shared so a motion worker process gets the same
+        """
+        if self.realtime:
+            return time.time()
+        if self.ring.latestId == 0:
+            return self.replayStart
+        return float(self.ring.timestamps[self.ring.latestSlot])
+
+    def read_next(self, after_id=0, timeout=None, skip=False):
+        """
+        As FrameSource.read_next except once the replay has finished
+        the last frame is returned again rather than waiting forever.
+        Callers check finished to end processing.
+        """
+        endTime = None if timeout is None else time.time() + timeout
+        while True:
+            wait = 0.5
+            if endTime is not None:
+                wait = max(min(wait, endTime - time.time()), 0.0)
+            newFrame = self.ring.read_next(after_id, wait, skip)
+            if newFrame is not None:
+                return newFrame
+            if self.finished:
+                slot = self.ring.latestSlot
+                return (
+                    self.ring.latestId,
+                    self.ring.timestamps[slot],
+                    self.ring.frames[slot],
+                )
+            if endTime is not None and time.time() >= endTime:
+                return None
+
+    def start(self):
+        """start replay unless all frames have already been replayed"""
+        if self.finished:
+            return self
+        return FrameSource.start(self)
+
+
+# ------------------------------------------------------------------------------
+def createFrameSource(**kwargs):
+    """Return the motion stream frame source selected by STREAM_SOURCE"""
+    if STREAM_SOURCE == "opencv":
+        return CvVideoStream(**kwargs)
+    elif STREAM_SOURCE == "replay":
+        return ReplayStream(**kwargs)
+    return PiVideoStream(**kwargs)
+
+
+# ------------------------------------------------------------------------------
+class StreamStats:
+    """
+    Motion stream pipeline statistics. Capture and processed frame
+    rates, dropped frames and a fixed size histogram of the time from
+    frame capture to motion decision. Published to the log and a json
+    stats file every STREAM_STATS_SEC seconds.
+    """
+
+    # Latency histogram bin upper edges in ms. Last bin counts the rest
+    LATENCY_BINS_MS = (5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000)
+
+    def __init__(self, source, publishSec=None, statsPath=None, governor=None):
+        self.source = source
+        self.governor = governor  # optional StreamGovernor to report
+        self.publishSec = STREAM_STATS_SEC if publishSec is None else publishSec
+        self.statsPath = STATS_PATH if statsPath is None else statsPath
+        self.histogram = [0] * (len(self.LATENCY_BINS_MS) + 1)
+        self.processed = 0
+        self.latencySum = 0.0
+        self.latencyMax = 0.0
+        self.startTime = time.time()
+        self.lastTime = self.startTime
+        self.lastCaptured = source.ring.latestId
+        self.lastProcessed = 0
+        self.lastDropped = source.ring.dropped
+        self.boardModel = self.getBoardModel()
+
+    @staticmethod
+    def getBoardModel():
+        """Return the Raspberry Pi model name or platform if not a Pi"""
+        try:
+            with open("/proc/device-tree/model") as f:
+                return f.read().strip("\0\n ")
+        except (IOError, OSError):
+            return sys.platform
+
+    def addFrame(self, decisionTime=None):
+        """Record the frame last read from the source as processed"""
+        if decisionTime is None:
+            decisionTime = time.time()
+        latencyMs = (decisionTime - self.source.ring.readCommitTime()) * 1000.0
+        self.histogram[bisect.bisect_left(self.LATENCY_BINS_MS, latencyMs)] += 1
+        self.processed += 1
+        self.latencySum += latencyMs
+        if latencyMs > self.latencyMax:
+            self.latencyMax = latencyMs
+
+    def getLatencyPercentile(self, percent):
+        """Return the histogram bin edge in ms holding percent of frames"""
+        target = self.processed * percent / 100.0
+        count = 0
+        for binNum, binCount in enumerate(self.histogram):
+            count += binCount
+            if count >= target and binNum < len(self.LATENCY_BINS_MS):
+                return self.LATENCY_BINS_MS[binNum]
+        return self.latencyMax
+
+    def checkPublish(self):
+        """Log and save stats if STREAM_STATS_SEC has elapsed since last time"""
+        if self.publishSec > 0 and time.time() - self.lastTime >= self.publishSec:
+            self.publish()
+
+    def publish(self):
+        """Log interval rates and write all stats to the json stats file"""
+        rightNow = time.time()
+        ring = self.source.ring
+        intervalSec = max(rightNow - self.lastTime, 0.001)
+        captureFps = (ring.latestId - self.lastCaptured) / intervalSec
+        processedFps = (self.processed - self.lastProcessed) / intervalSec
+        dropped = ring.dropped - self.lastDropped
+        latencyMean = self.latencySum / self.processed if self.processed else 0.0
+        governor = self.governor
+        if governor is not None:
+            rateText = " rate=%.1f fps%s" % (
+                governor.rate(),
+                " (idle)" if governor.idle else "",
+            )
+        else:
+            rateText = ""
+        logging.info(
+            "Stream Stats capture=%.1f fps processed=%.1f fps dropped=%i%s"
+            "  latency mean=%.0f ms p95<=%.0f ms max=%.0f ms",
+            captureFps,
+            processedFps,
+            dropped,
+            rateText,
+            latencyMean,
+            self.getLatencyPercentile(95),
+            self.latencyMax,
+        )
+        stats = {
+            "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "board": self.boardModel,
+            "camera": cameraName,
+            "stream": {
+                "source": STREAM_SOURCE,
+                "format": STREAM_FORMAT,
+                "width": self.source.resolution[0],
+                "height": self.source.resolution[1],
+                "fps_setting": self.source.framerate,
+            },
+            "interval_sec": round(intervalSec, 3),
+            "capture_fps": round(captureFps, 2),
+            "processed_fps": round(processedFps, 2),
+            "dropped": dropped,
+            "uptime_sec": round(rightNow - self.startTime, 1),
+            "frames_captured": int(ring.latestId),
+            "frames_processed": self.processed,
+            "frames_dropped": int(ring.dropped),
+            "frames_skipped": int(ring.skipped)
+            + (governor.skipped if governor is not None else 0),
+            "latency_ms": {
+                "mean": round(latencyMean, 2),
+                "max": round(self.latencyMax, 2),
+                "p50": self.getLatencyPercentile(50),
+                "p95": self.getLatencyPercentile(95),
+                "bins": list(self.LATENCY_BINS_MS),
+                "counts": self.histogram,
+            },
+        }
+        if governor is not None:
+            stats["governor"] = {
+                "idle": governor.idle,
+                "rate_fps": governor.rate(),
+                "idle_after_sec": governor.idleSec,
+                "idle_total_sec": round(governor.idleTotal(self.source.now()), 1),
+            }
+        # write then rename so readers never see a partial file
+        tmpPath = self.statsPath + ".tmp"
+        try:
+            with open(tmpPath, "w") as f:
+                json.dump(stats, f, indent=2)
+            os.rename(tmpPath, self.statsPath)
+        except (IOError, OSError) as err:
+            logging.warning("Could Not Write Stats File %s - %s", self.statsPath, err)
+        self.lastTime = rightNow
+        self.lastCaptured = ring.latestId
+        self.lastProcessed = self.processed
+        self.lastDropped = ring.dropped
+
+
+# ------------------------------------------------------------------------------
+class StreamGovernor:
+    """
+    Idle frame rate governor for the motion stream. After
+    STREAM_IDLE_SEC seconds without a motion blob only STREAM_IDLE_FPS
+    frames per second are processed and the rest skipped to save cpu
+    and power. The first motion blob found returns to the full rate.
+    """
+
+    def __init__(self, idleSec=None, idleFps=None, fullFps=None):
+        self.idleSec = STREAM_IDLE_SEC if idleSec is None else idleSec
+        idleFps = STREAM_IDLE_FPS if idleFps is None else idleFps
+        self.fullFps = stream_framerate if fullFps is None else fullFps
+        self.idleFps = min(max(idleFps, 0.1), self.fullFps)
+        self.idle = False
+        self.lastMotion = None
+        self.nextTime = 0.0  # frame time of the next frame to process when idle
+        self.idleStart = 0.0
+        self.idleSum = 0.0
+        self.skipped = 0  # frames read but not processed
+
+    def rate(self):
+        """Return the current processed frame rate setting"""
+        return self.idleFps if self.idle else self.fullFps
+
+    def idleTotal(self, rightNow):
+        """Return total seconds spent at the idle rate"""
+        if self.idle:
+            return self.idleSum + rightNow - self.idleStart
+        return self.idleSum
+
+    def holdRemaining(self, rightNow):
+        """Return seconds to wait before the next frame is needed"""
+        if not self.idle:
+            return 0.0
+        return self.nextTime - rightNow
+
+    def skipFrame(self, timestamp):
+        """Return True if the frame at timestamp should not be processed"""
+        if self.idle and timestamp < self.nextTime:
+            self.skipped += 1
+            return True
+        return False
+
+    def update(self, blobs, timestamp):
+        """Record the motion blobs found in a processed frame"""
+        if self.lastMotion is None:
+            self.lastMotion = timestamp
+        if len(blobs):
+            self.lastMotion = timestamp
+            if self.idle:
+                self.idle = False
+                self.idleSum += timestamp - self.idleStart
+                logging.info("Motion Found. Stream Rate %.1f fps", self.fullFps)
+        elif (
+            not self.idle
+            and self.idleSec > 0
+            and timestamp - self.lastMotion >= self.idleSec
+        ):
+            self.idle = True
+            self.idleStart = timestamp
+            logging.info(
+                "No Motion for %i sec. Stream Idle Rate %.1f fps",
+                self.idleSec,
+                self.idleFps,
+            )
+        if self.idle:
+            self.nextTime = timestamp + 1.0 / self.idleFps
 
 
 # ------------------------------------------------------------------------------
@@ -772,6 +1973,10 @@ def displayInfo(motioncount, timelapsecount):
             "               IMAGE_GRAYSCALE=%s   Preview=%s"
             % (IMAGE_GRAYSCALE, IMAGE_PREVIEW)
         )
+        print(
+            "               IMAGE_CAMERA_SESSION_ON=%s (True= Keep Still Camera Open Between Images)"
+            % IMAGE_CAMERA_SESSION_ON
+        )
         if IMAGE_FORMAT == ".jpg" or IMAGE_FORMAT == ".jpeg":
             print(
                 "               JpegQuality=%i where 1=Low 100=High" % (IMAGE_JPG_QUAL)
@@ -828,13 +2033,152 @@ def displayInfo(motioncount, timelapsecount):
                 "               MOTION_TRACK_INFO_ON=%s   MOTION_DOTS_ON=%s  IMAGE_SHOW_STREAM=%s"
                 % (MOTION_TRACK_INFO_ON, MOTION_DOTS_ON, IMAGE_SHOW_STREAM)
             )
+            if MOTION_DETECTOR == "background":
+                print(
+                    "   Detector .. MOTION_DETECTOR=%s  MOTION_BG_ALPHA=%.3f"
+                    "  MOTION_BG_SIGMA=%.1f  MOTION_BG_MIN_STD=%.1f"
+                    % (MOTION_DETECTOR, MOTION_BG_ALPHA, MOTION_BG_SIGMA, MOTION_BG_MIN_STD)
+                )
+            elif MOTION_DETECTOR == "vectors":
+                print(
+                    "   Detector .. MOTION_DETECTOR=%s  MOTION_VECTOR_MAGNITUDE=%i"
+                    "  MOTION_VECTOR_SAD_MAX=%i (0=Off)  MOTION_VECTOR_MIN_CELLS=%i"
+                    % (
+                        MOTION_DETECTOR,
+                        MOTION_VECTOR_MAGNITUDE,
+                        MOTION_VECTOR_SAD_MAX,
+                        MOTION_VECTOR_MIN_CELLS,
+                    )
+                )
+            elif MOTION_AUTO_THRESHOLD_ON:
+                print(
+                    "   Detector .. MOTION_DETECTOR=%s  MOTION_AUTO_THRESHOLD_ON=%s"
+                    "  K=%.1f  Threshold=%i-%i  Blur=%i-%i  Every %i Frames"
+                    % (
+                        MOTION_DETECTOR,
+                        MOTION_AUTO_THRESHOLD_ON,
+                        MOTION_AUTO_THRESHOLD_K,
+                        min(MOTION_AUTO_THRESHOLD_RANGE),
+                        max(MOTION_AUTO_THRESHOLD_RANGE),
+                        min(MOTION_AUTO_BLUR_RANGE),
+                        max(MOTION_AUTO_BLUR_RANGE),
+                        MOTION_AUTO_SAMPLE_FRAMES,
+                    )
+                )
+            else:
+                print(
+                    "   Detector .. MOTION_DETECTOR=%s  THRESHOLD_SENSITIVITY=%i"
+                    % (MOTION_DETECTOR, THRESHOLD_SENSITIVITY)
+                )
+            print("               MOTION_BLOB_METHOD=%s" % MOTION_BLOB_METHOD)
+            if MOTION_LIGHT_CHECK_ON and MOTION_DETECTOR != "vectors":
+                print(
+                    "   Lighting .. MOTION_LIGHT_CHECK_ON=%s  MOTION_LIGHT_MEAN_DIFF=%i"
+                    "  MOTION_LIGHT_HIST_CORREL=%.2f"
+                    % (
+                        MOTION_LIGHT_CHECK_ON,
+                        MOTION_LIGHT_MEAN_DIFF,
+                        MOTION_LIGHT_HIST_CORREL,
+                    )
+                )
+            else:
+                print("   Lighting .. MOTION_LIGHT_CHECK_ON=False")
+            if (
+                max(MOTION_DENOISE_DAY_FRAMES, MOTION_DENOISE_NIGHT_FRAMES) > 1
+                and MOTION_DETECTOR != "vectors"
+            ):
+                print(
+                    "   Denoise ... Temporal Median  MOTION_DENOISE_DAY_FRAMES=%i"
+                    "  MOTION_DENOISE_NIGHT_FRAMES=%i"
+                    % (MOTION_DENOISE_DAY_FRAMES, MOTION_DENOISE_NIGHT_FRAMES)
+                )
+            else:
+                print("   Denoise ... Off")
+            if MOTION_ROI_INCLUDE or MOTION_ROI_EXCLUDE:
+                print(
+                    "   ROI ....... MOTION_ROI_INCLUDE=%i polygons"
+                    "  MOTION_ROI_EXCLUDE=%i polygons"
+                    % (len(MOTION_ROI_INCLUDE), len(MOTION_ROI_EXCLUDE))
+                )
+            else:
+                print("   ROI ....... Off  Whole stream image is processed")
+            if MOTION_HEATMAP_ON:
+                print(
+                    "   Heatmap ... MOTION_HEATMAP_ON=True  DECAY_SEC=%i  SAVE_SEC=%i"
+                    "  NUISANCE=%.2f  MASK_ON=%s  Path=%s.npy"
+                    % (
+                        MOTION_HEATMAP_DECAY_SEC,
+                        MOTION_HEATMAP_SAVE_SEC,
+                        MOTION_HEATMAP_NUISANCE,
+                        MOTION_HEATMAP_MASK_ON,
+                        HEATMAP_PATH,
+                    )
+                )
+            else:
+                print("   Heatmap ... MOTION_HEATMAP_ON=False")
+            if MOTION_TRACKER == "multi":
+                print(
+                    "   Tracker ... MOTION_TRACKER=%s  MOTION_TRACK_MAX_OBJECTS=%i"
+                    "  MOTION_TRACK_MATCH_DIST=%i px"
+                    % (MOTION_TRACKER, MOTION_TRACK_MAX_OBJECTS, TRACK_MATCH_DIST)
+                )
+                print(
+                    "               MOTION_TRACK_KALMAN_ON=%s  MEASURE_STD=%.1f px"
+                    "  ACCEL_STD=%i px/s2"
+                    % (
+                        MOTION_TRACK_KALMAN_ON,
+                        MOTION_TRACK_KALMAN_MEASURE_STD,
+                        MOTION_TRACK_KALMAN_ACCEL_STD,
+                    )
+                )
+                if MOTION_TRIGGER_LINE:
+                    print(
+                        "   Trigger ... MOTION_TRIGGER_LINE=%s"
+                        "  MOTION_TRIGGER_LINE_FROM=%s"
+                        % (MOTION_TRIGGER_LINE, MOTION_TRIGGER_LINE_FROM)
+                    )
+                else:
+                    print("   Trigger ... Track Length  MOTION_TRIGGER_LINE=[] (Off)")
+                print(
+                    "               MOTION_TRIGGER_DIRECTION=%s +/-%i deg"
+                    "  MOTION_TRIGGER_SPEED_MIN=%i px/s (0=Off)"
+                    % (
+                        MOTION_TRIGGER_DIRECTION,
+                        MOTION_TRIGGER_DIRECTION_TOL,
+                        MOTION_TRIGGER_SPEED_MIN,
+                    )
+                )
+            else:
+                print("   Tracker ... MOTION_TRACKER=%s" % MOTION_TRACKER)
+            if MOTION_SPEED_ON:
+                print(
+                    "   Speed ..... MOTION_SPEED_ON=True  MOTION_SPEED_WINDOW=%s px"
+                    "  MOTION_SPEED_PX_PER_M=%.1f  MOTION_SPEED_MIN=%.1f %s"
+                    % (
+                        MOTION_SPEED_WINDOW,
+                        MOTION_SPEED_PX_PER_M,
+                        MOTION_SPEED_MIN,
+                        MOTION_SPEED_UNITS,
+                    )
+                )
+            else:
+                print("   Speed ..... MOTION_SPEED_ON=False")
+            if MOTION_COUNT_ON:
+                print(
+                    "   Counts .... MOTION_COUNT_ON=True  MOTION_COUNT_DIR=%s"
+                    "  MOTION_COUNT_CAPTURE_ON=%s"
+                    % (MOTION_COUNT_DIR, MOTION_COUNT_CAPTURE_ON)
+                )
+            else:
+                print("   Counts .... MOTION_COUNT_ON=False")
             print(
-                "   Stream .... size=%ix%i  framerate=%i fps"
+                "   Stream .... size=%ix%i  framerate=%i fps  format=%s"
                 "  STREAM_STOP_SEC=%.2f  QuickPic=%s"
                 % (
                     stream_width,
                     stream_height,
                     STREAM_FPS,
+                    STREAM_FORMAT,
                     STREAM_STOP_SEC,
                     MOTION_TRACK_QUICK_PIC_ON,
                 )
@@ -844,12 +2188,40 @@ def displayInfo(motioncount, timelapsecount):
                 % (MOTION_PATH, MOTION_CAM_SLEEP)
             )
             print(
-                "   Sched ..... MOTION_START_AT %s blank=Off or"
-                " Set Valid Date and/or Time to Start Sequence" % MOTION_START_AT
+                "   Splitter .. STREAM_STILL_SPLITTER_ON=%s (True= Day Stills Taken Without Stopping Stream)"
+                % STREAM_STILL_SPLITTER_ON
             )
             print(
-                "   Force ..... MOTION_FORCE_SEC=%i min (If No Motion)"
-                % (MOTION_FORCE_SEC / 60)
+                "   Source .... STREAM_SOURCE=%s  STREAM_SOURCE_PATH=%s"
+                "  STREAM_REPLAY_REALTIME_ON=%s"
+                % (STREAM_SOURCE, STREAM_SOURCE_PATH, STREAM_REPLAY_REALTIME_ON)
+            )
+            print(
+                "   Stats ..... STREAM_STATS_SEC=%i (0=Off) Log and Save Stream fps,"
+                " Drops and Latency to %s" % (STREAM_STATS_SEC, STATS_PATH)
+            )
+            print(
+                "   Worker .... MOTION_WORKER_ON=%s (True= Motion detection in a separate process)"
+                % MOTION_WORKER_ON
+            )
+            print(
+                "   Idle ...... STREAM_IDLE_SEC=%i (0=Off)  STREAM_IDLE_FPS=%.1f"
+                " Processed fps when no motion for STREAM_IDLE_SEC"
+                % (STREAM_IDLE_SEC, STREAM_IDLE_FPS)
+            )
+            if cameraName:
+                print(
+                    "   Camera .... CAMERA_NAME=%s  STREAM_CAMERA_NUM=%i"
+                    "  (One of %i CAMERAS Processes)"
+                    % (cameraName, STREAM_CAMERA_NUM, len(CAMERAS))
+                )
+            print(
+                "   Sched ..... MOTION_START_AT %s blank=Off or"
+                " Set Valid Date and/or Time to Start Sequence" % MOTION_START_AT
+            )
+            print(
+                "   Force ..... MOTION_FORCE_SEC=%i min (If No Motion)"
+                % (MOTION_FORCE_SEC / 60)
             )
             print(
                 "   Lockfile .. On=%s  Path=%s  NOTE: For Motion Images Only."
@@ -895,6 +2267,11 @@ def displayInfo(motioncount, timelapsecount):
                     " sec  MOTION_VIDEO_FPS=%i (superseded by QuickTL)"
                     % (MOTION_VIDEO_ON, MOTION_VIDEO_TIMER_SEC, MOTION_VIDEO_FPS)
                 )
+                print(
+                    "               MOTION_VIDEO_PRETRIGGER_SEC=%i (0=off)"
+                    "  MOTION_VIDEO_BITRATE=%i"
+                    % (MOTION_VIDEO_PRETRIGGER_SEC, MOTION_VIDEO_BITRATE)
+                )
             else:
                 print(
                     "   Video ..... MOTION_VIDEO_ON=%s  Motion Video is Disabled"
@@ -1469,12 +2846,14 @@ def postImageProcessing(
     counterpath,
     filename,
     currentDaymode,
+    showText=True,
 ):
     """
-    If required process text to display directly on image
+    If required process text to display directly on image.
+    showText=False when the text was already drawn on the image
     """
     rightNow = datetime.datetime.now()
-    if SHOW_DATE_ON_IMAGE:
+    if SHOW_DATE_ON_IMAGE and showText:
         dateTimeText = "%04d%02d%02d_%02d:%02d:%02d" % (
             rightNow.year,
             rightNow.month,
@@ -1565,9 +2944,8 @@ def getImageFilename(path, prefix, numberon, counter):
 def showBox(filename):
     """
     Show stream image detection area on image to align camera
-    This is a quick fix for restricting motion detection
-    to a portion of the final image. Change the stream image size
-    on line 206 and 207 above
+    To restrict motion detection to part of the stream image
+    set config.py MOTION_ROI_INCLUDE and MOTION_ROI_EXCLUDE polygons
     Adjust track config.py file MOTION_TRACK_TRIG_LEN as required.
     """
     working_image = cv2.imread(filename)
@@ -1581,41 +2959,283 @@ def showBox(filename):
 
 
 # ------------------------------------------------------------------------------
-def takeMotionQuickImage(image, filename):
-    """Enlarge and Save stream image if MOTION_TRACK_QUICK_PIC_ON=True"""
+def getStreamGray(streamData, dst=None):
+    """
+    Return a grayscale image for motion tracking from a stream frame.
+    For a yuv stream frame this is a zero copy view of the luma Y plane.
+    A bgr stream frame is converted into dst if it is the right size
+    so pass the previous result back in to avoid a new array per frame.
+    """
+    if streamData.ndim == 2:
+        return streamData[: streamData.shape[0] * 2 // 3]
+    return cv2.cvtColor(streamData, cv2.COLOR_BGR2GRAY, dst=dst)
+
+
+# ------------------------------------------------------------------------------
+def getStreamBGR(streamData):
+    """
+    Return a bgr colour image from a stream frame.
+    yuv stream frames are only decoded when an image needs to be saved.
+    """
+    if streamData.ndim == 2:
+        return cv2.cvtColor(streamData, cv2.COLOR_YUV2BGR_I420)
+    return streamData
+
+
+# ------------------------------------------------------------------------------
+def takeMotionQuickImage(image, filename, text=None):
+    """
+    Enlarge and Save stream image if MOTION_TRACK_QUICK_PIC_ON=True.
+    text eg a MOTION_SPEED_ON speed is drawn top left before the
+    image is written so it is not reopened to add it
+    """
+    image = getStreamBGR(image)
     big_image = (
         cv2.resize(image, (bigImageWidth, bigImageHeight)) if bigImage != 1 else image
     )
+    if text:
+        if big_image is image:
+            big_image = image.copy()  # leave the stream frame as captured
+        scale = max(big_image.shape[1] / 640.0, 0.4)
+        org = (int(10 * scale), int(30 * scale))
+        # black outline so white text shows on any background
+        for colour, thickness in ((cvBlack, 4), (cvWhite, 2)):
+            cv2.putText(
+                big_image,
+                text,
+                org,
+                cv2.FONT_HERSHEY_SIMPLEX,
+                scale,
+                colour,
+                max(int(thickness * scale), 1),
+                cv2.LINE_AA,
+            )
     cv2.imwrite(filename, big_image)
     logging.info("Saved %ix%i Image to %s", bigImageWidth, bigImageHeight, filename)
 
 
 # ------------------------------------------------------------------------------
-def takeDayImage(filename, cam_sleep_time):
-    """Take a Day image using exp=auto and awb=auto"""
-    with picamera.PiCamera() as camera:
-        camera.resolution = (image_width, image_height)
-        camera.vflip = IMAGE_VFLIP
-        camera.hflip = IMAGE_HFLIP
-        camera.rotation = IMAGE_ROTATION  # Valid values are 0, 90, 180, 270
-        # Day Automatic Mode
-        camera.exposure_mode = "auto"
-        camera.awb_mode = "auto"
-        if IMAGE_GRAYSCALE:
-            camera.color_effects = (128, 128)
-        time.sleep(cam_sleep_time)  # use motion or TL camera sleep to get AWB
-        if IMAGE_PREVIEW:
-            camera.start_preview()
+class CameraSession:
+    """
+    Camera kept open between day, twilight and night images and
+    shared with the picamera motion stream so it also stays open
+    across stream restarts. Only camera settings that differ from
+    those already applied are changed and settle sleeps are skipped
+    when nothing changed. close() releases the camera eg for video.
+    """
+
+    def __init__(self):
+        self.camera = None
+        self.applied = {}  # camera setting name: value already applied
+        self.profile = None  # "day", "twilight", "night" or "stream"
+
+    def open(self):
+        """Open the camera if required. Return True if newly opened"""
+        if self.camera is not None:
+            return False
+        try:
+            self.camera = picamera.PiCamera(camera_num=STREAM_CAMERA_NUM)
+        except:
+            logging.error("PiCamera Already in Use by Another Process")
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            exit(1)
+        self.profile = None
+        # picamera values when opened so these are not set again
+        self.applied = {
+            "framerate": Fraction(30, 1),
+            "iso": 0,
+            "shutter_speed": 0,
+            "exposure_mode": "auto",
+            "awb_mode": "auto",
+            "color_effects": None,
+        }
+        return True
+
+    def openStill(self):
+        """
+        Open the camera if required and apply the still image settings.
+        Return True if newly opened
+        """
+        opened = self.open()
+        self.apply(
+            [
+                ("resolution", (image_width, image_height)),
+                ("vflip", IMAGE_VFLIP),
+                ("hflip", IMAGE_HFLIP),
+                ("rotation", IMAGE_ROTATION),  # Valid values are 0, 90, 180, 270
+                ("color_effects", (128, 128) if IMAGE_GRAYSCALE else None),
+            ]
+        )
+        return opened
+
+    def apply(self, settings):
+        """
+        Set each (name, value) camera setting that differs from the
+        value already applied. Return list of changed setting names
+        """
+        changed = []
+        for name, value in settings:
+            if name in self.applied and self.applied[name] == value:
+                continue
+            setattr(self.camera, name, value)
+            self.applied[name] = value
+            # framerate and framerate_range replace each other
+            if name == "framerate":
+                self.applied.pop("framerate_range", None)
+            elif name == "framerate_range":
+                self.applied.pop("framerate", None)
+            changed.append(name)
+        return changed
+
+    def setStream(self, settings):
+        """
+        Apply the motion stream (name, value) settings in automatic
+        exposure and white balance and return the camera to stream from
+        """
+        self.open()
+        self.apply(
+            [("exposure_mode", "auto")]
+            + settings
+            + [("iso", 0), ("shutter_speed", 0), ("awb_mode", "auto")]
+        )
+        self.profile = "stream"
+        return self.camera
+
+    def setDay(self, settleSec):
+        """
+        Day automatic exposure and white balance. Sleep settleSec so
+        AWB can settle only if camera opened or settings changed.
+        Return seconds slept
+        """
+        opened = self.openStill()
+        changed = self.apply(
+            [
+                ("framerate", Fraction(30, 1)),
+                ("iso", 0),
+                ("shutter_speed", 0),
+                ("exposure_mode", "auto"),
+                ("awb_mode", "auto"),
+            ]
+        )
+        self.profile = "day"
+        if opened or changed:
+            time.sleep(settleSec)
+            return settleSec
+        return 0.0
+
+    def setTwilight(self):
+        """Twilight variable framerate_range at max iso. Return seconds slept"""
+        opened = self.openStill()
+        sleepSec = 0.0
+        if self.apply(
+            [
+                ("framerate_range", (Fraction(1, 6), Fraction(30, 1))),
+                ("shutter_speed", 0),
+                ("exposure_mode", "auto"),
+            ]
+        ):
+            time.sleep(1)
+            sleepSec += 1
+        if self.apply([("iso", NIGHT_MAX_ISO)]) or opened or sleepSec:
+            time.sleep(4)
+            sleepSec += 4
+        self.profile = "twilight"
+        return sleepSec
+
+    def setNight(self, shutter):
+        """
+        Night fixed low framerate long exposure at max iso. Exposure
+        gains are locked with exposure_mode off once settled and only
+        follow new settings in auto exposure, so any change unlocks
+        them first. A newly opened camera starts at low gains so waits
+        NIGHT_SLEEP_SEC. Otherwise the gains already follow the scene,
+        eg from the motion stream, and only two frames at the new
+        settings are waited for. Return seconds slept
+        """
+        opened = self.openStill()
+        settings = [
+            ("framerate", Fraction(1, 6)),
+            ("iso", NIGHT_MAX_ISO),
+            ("shutter_speed", shutter),
+        ]
+        if self.profile == "night" and all(
+            self.applied.get(name) == value for name, value in settings
+        ):
+            return 0.0
+        self.apply([("exposure_mode", "auto"), settings[0]])
+        if opened:
+            time.sleep(1)
+            self.apply(settings)
+            sleepSec = 1 + NIGHT_SLEEP_SEC
+            time.sleep(NIGHT_SLEEP_SEC)
+        else:
+            self.apply(settings)
+            # framerate is 1/6 so each frame takes at least 6 seconds
+            sleepSec = min(NIGHT_SLEEP_SEC, 2 * max(6.0, shutter / float(SECONDS2MICRO)))
+            time.sleep(sleepSec)
+        self.apply([("exposure_mode", "off")])
+        self.profile = "night"
+        return sleepSec
+
+    def capture(self, filename):
+        """Save a full size image using the current profile"""
         if IMAGE_FORMAT == ".jpg":  # Set quality if image is jpg
-            camera.capture(filename, quality=IMAGE_JPG_QUAL)
+            self.camera.capture(filename, format="jpeg", quality=IMAGE_JPG_QUAL)
         else:
-            camera.capture(filename)
-        camera.close()
+            self.camera.capture(filename)
+
+    def readStreamFrame(self):
+        """Return a stream size bgr frame from the open camera video port"""
+        frame = np.empty((stream_height, stream_width, 3), dtype=np.uint8)
+        self.camera.capture(
+            frame, format="bgr", resize=(stream_width, stream_height), use_video_port=True
+        )
+        return frame
+
+    def close(self):
+        """Release the camera eg before the motion stream is started"""
+        if self.camera is not None:
+            self.camera.framerate = 10  # Adhoc Fix for Stretch camera freeze issue
+            self.camera.close()
+            self.camera = None
+            self.profile = None
+
+
+cameraSession = CameraSession()
+
+
+# ------------------------------------------------------------------------------
+def takeDayImage(filename, cam_sleep_time, stream=None):
+    """
+    Take a Day image using exp=auto and awb=auto.
+    If stream can take a still then use its splitter port and keep
+    the motion stream running. Camera AWB is already settled.
+    """
+    if stream is not None and stream.canTakeStill(True):
+        stream.takeStill(filename)
+        if IMAGE_SHOW_STREAM:
+            showBox(filename)
+        logging.info(
+            "%s Still exp=auto awb=auto Size=%ix%i ",
+            "Splitter Port" if STREAM_SOURCE == "picamera" else STREAM_SOURCE,
+            image_width,
+            image_height,
+        )
+        if not SHOW_DATE_ON_IMAGE:
+            logging.info("Saved  %s", filename)
+        return
+    # Day Automatic Mode. use motion or TL camera sleep to get AWB
+    sleepSec = cameraSession.setDay(cam_sleep_time)
+    if IMAGE_PREVIEW:
+        cameraSession.camera.start_preview()
+    cameraSession.capture(filename)
+    if not IMAGE_CAMERA_SESSION_ON:
+        cameraSession.close()
     if IMAGE_SHOW_STREAM:  # Show motion area on full image to align camera
         showBox(filename)
     logging.info(
         "camSleepSec=%.2f exp=auto awb=auto Size=%ix%i ",
-        cam_sleep_time,
+        sleepSec,
         image_width,
         image_height,
     )
@@ -1640,71 +3260,60 @@ def getShutterSetting(pxAve):
 
 
 # ------------------------------------------------------------------------------
-def takeNightImage(filename, pixelAve):
+def takeNightImage(filename, pixelAve, stream=None):
     """Take low light Twilight or Night image"""
-    with picamera.PiCamera() as camera:
-        camera.resolution = (image_width, image_height)
-        camera.vflip = IMAGE_VFLIP
-        camera.hflip = IMAGE_HFLIP
-        camera.rotation = IMAGE_ROTATION  # valid values are 0, 90, 180, 270
-        if IMAGE_GRAYSCALE:
-            camera.color_effects = (128, 128)
-        # Use Twilight Threshold variable framerate_range
-        if pixelAve >= NIGHT_DARK_THRESHOLD:
-            camera.framerate_range = (Fraction(1, 6), Fraction(30, 1))
-            time.sleep(1)
-            camera.iso = NIGHT_MAX_ISO
-            logging.info(
-                "%ix%i  TwilightThresh=%i/%i  MaxISO=%i uses framerate_range",
-                image_width,
-                image_height,
-                pixelAve,
-                NIGHT_TWILIGHT_THRESHOLD,
-                NIGHT_MAX_ISO,
-            )
-            time.sleep(4)
-        else:
-            # Set the framerate to a fixed value
-            camera.framerate = Fraction(1, 6)
-            time.sleep(1)
-            camera.iso = NIGHT_MAX_ISO
-            if pixelAve <= NIGHT_BLACK_THRESHOLD:  # Black Threshold (very dark)
-                camera.shutter_speed = NIGHT_MAX_SHUTTER
-                logging.info(
-                    "%ix%i  BlackThresh=%i/%i shutSec=%s  MaxISO=%i  NIGHT_SLEEP_SEC=%i",
-                    image_width,
-                    image_height,
-                    pixelAve,
-                    NIGHT_BLACK_THRESHOLD,
-                    shut2sec(NIGHT_MAX_SHUTTER),
-                    NIGHT_MAX_ISO,
-                    NIGHT_SLEEP_SEC,
-                )
-            else:  # Dark Threshold (Between Twilight and Black)
-                camShut = getShutterSetting(pixelAve)
-                if camShut > NIGHT_MAX_SHUTTER:
-                    camShut = NIGHT_MAX_SHUTTER
-                # Set the shutter for long exposure
-                camera.shutter_speed = camShut
-                logging.info(
-                    "%ix%i  DarkThresh=%i/%i  shutSec=%s  MaxISO=%i  NIGHT_SLEEP_SEC=%i",
-                    image_width,
-                    image_height,
-                    pixelAve,
-                    NIGHT_DARK_THRESHOLD,
-                    shut2sec(camShut),
-                    NIGHT_MAX_ISO,
-                    NIGHT_SLEEP_SEC,
-                )
-            time.sleep(NIGHT_SLEEP_SEC)
-            camera.exposure_mode = "off"
-        if IMAGE_FORMAT == ".jpg":
-            camera.capture(filename, format="jpeg", quality=IMAGE_JPG_QUAL)
-        else:
-            camera.capture(filename)
-        camera.framerate = 10  # Adhoc Fix for Stretch camera freeze issue
-        # Perform sudo rpi-update
-        camera.close()
+    if stream is not None and stream.canTakeStill(False):
+        # frame source without a picamera saves the latest stream frame
+        stream.takeStill(filename)
+        logging.info(
+            "Stream Still %s Size=%ix%i", STREAM_SOURCE, image_width, image_height
+        )
+        if not SHOW_DATE_ON_IMAGE:
+            logging.info("Saved  %s", filename)
+        return
+    # Use Twilight Threshold variable framerate_range
+    if pixelAve >= NIGHT_DARK_THRESHOLD:
+        sleepSec = cameraSession.setTwilight()
+        logging.info(
+            "%ix%i  TwilightThresh=%i/%i  MaxISO=%i uses framerate_range  sleepSec=%i",
+            image_width,
+            image_height,
+            pixelAve,
+            NIGHT_TWILIGHT_THRESHOLD,
+            NIGHT_MAX_ISO,
+            sleepSec,
+        )
+    elif pixelAve <= NIGHT_BLACK_THRESHOLD:  # Black Threshold (very dark)
+        sleepSec = cameraSession.setNight(NIGHT_MAX_SHUTTER)
+        logging.info(
+            "%ix%i  BlackThresh=%i/%i shutSec=%s  MaxISO=%i  sleepSec=%i",
+            image_width,
+            image_height,
+            pixelAve,
+            NIGHT_BLACK_THRESHOLD,
+            shut2sec(NIGHT_MAX_SHUTTER),
+            NIGHT_MAX_ISO,
+            sleepSec,
+        )
+    else:  # Dark Threshold (Between Twilight and Black)
+        camShut = getShutterSetting(pixelAve)
+        if camShut > NIGHT_MAX_SHUTTER:
+            camShut = NIGHT_MAX_SHUTTER
+        # Set the shutter for long exposure
+        sleepSec = cameraSession.setNight(camShut)
+        logging.info(
+            "%ix%i  DarkThresh=%i/%i  shutSec=%s  MaxISO=%i  sleepSec=%i",
+            image_width,
+            image_height,
+            pixelAve,
+            NIGHT_DARK_THRESHOLD,
+            shut2sec(camShut),
+            NIGHT_MAX_ISO,
+            sleepSec,
+        )
+    cameraSession.capture(filename)
+    if not IMAGE_CAMERA_SESSION_ON:
+        cameraSession.close()
     if IMAGE_SHOW_STREAM:  # Show motion area on full image to align camera
         showBox(filename)
     # SHOW_DATE_ON_IMAGE displays FilePath to avoid showing twice
@@ -1742,54 +3351,1481 @@ def createSyncLockFile(imagefilename):
 
 
 # ------------------------------------------------------------------------------
-def getMotionTrackPoint(grayimage1, grayimage2):
+class MotionBuffers:
+    """
+    Preallocated work buffers for motion detection on images of shape
+    so steady state frames allocate no image sized arrays. opencv
+    writes into them through its dst output parameters. diff=False
+    only creates the connected components buffers.
+    """
+
+    def __init__(self, shape, diff=True):
+        self.shape = shape
+        self.labels = np.empty(shape, dtype=np.int32)
+        # Resized by opencv only when the number of components changes
+        self.stats = np.empty((1, 5), dtype=np.int32)
+        self.centroids = np.empty((1, 2), dtype=np.float64)
+        if diff:
+            self.prev = np.zeros(shape, dtype=np.uint8)
+            self.diff = np.empty(shape, dtype=np.uint8)
+            self.blurred = np.empty(shape, dtype=np.uint8)
+            self.thresh = np.empty(shape, dtype=np.uint8)
+
+    def components(self, binaryimage):
+        """
+        Return connected components (stats, centroids) of binaryimage
+        using the buffers
+        """
+        count, labels, self.stats, self.centroids = cv2.connectedComponentsWithStats(
+            binaryimage,
+            labels=self.labels,
+            stats=self.stats,
+            centroids=self.centroids,
+            connectivity=8,
+            ltype=cv2.CV_32S,
+        )
+        return self.stats, self.centroids
+
+
+# ------------------------------------------------------------------------------
+def getMotionBlobs(thresholdimage, buffers=None):
+    """
+    Return all blobs in a binary motion image with area larger than
+    MIN_AREA as an int32 array with one row of x, y, w, h, area, cx, cy
+    per blob where cx, cy is the point tracked.
+    MOTION_BLOB_METHOD "components" gets every blob in one opencv call
+    and filters with numpy. Area is the blob pixel count and cx, cy the
+    centroid opencv already computed. "contours" loops over findContours
+    results. Area is contourArea and cx, cy the bounding box center.
+    Optional MotionBuffers are reused for the components labels image.
+    """
+    if MOTION_BLOB_METHOD == "components":
+        if buffers is None:
+            count, labels, stats, centroids = cv2.connectedComponentsWithStats(
+                thresholdimage, connectivity=8, ltype=cv2.CV_32S
+            )
+        else:
+            stats, centroids = buffers.components(thresholdimage)
+        # label 0 is the background
+        keep = stats[1:, cv2.CC_STAT_AREA] > MIN_AREA
+        blobs = np.empty((np.count_nonzero(keep), 7), dtype=np.int32)
+        blobs[:, :5] = stats[1:][keep]
+        blobs[:, 5:] = centroids[1:][keep] + 0.5  # rounded on conversion
+        return blobs
+    try:
+        # opencv2 syntax default
+        contours, hierarchy = cv2.findContours(
+            thresholdimage, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+    except ValueError:
+        # opencv 3 syntax
+        thresholdimage, contours, hierarchy = cv2.findContours(
+            thresholdimage, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+    blobs = []
+    for c in contours:
+        cArea = cv2.contourArea(c)
+        if cArea > MIN_AREA:
+            (x, y, w, h) = cv2.boundingRect(c)
+            cx = int(x + w / 2)  # x center point of blob
+            cy = int(y + h / 2)  # y center point of blob
+            blobs.append((x, y, w, h, cArea, cx, cy))
+    return np.array(blobs, dtype=np.int32).reshape(-1, 7)
+
+
+# ------------------------------------------------------------------------------
+def getLargestBlobPoint(blobs):
+    """
+    Return the cx, cy track point of the largest blob in a blobs
+    array from getMotionBlobs or empty list if no blobs
+    """
+    if not len(blobs):
+        return []
+    (x, y, w, h, area, cx, cy) = blobs[blobs[:, 4].argmax()]
+    return [int(cx), int(cy)]
+
+
+# ------------------------------------------------------------------------------
+def getMotionBlobPoint(thresholdimage):
+    """
+    Return center point of the largest blob in a binary
+    motion image or empty list if none larger than MIN_AREA
+    """
+    return getLargestBlobPoint(getMotionBlobs(thresholdimage))
+
+
+# ------------------------------------------------------------------------------
+def getMotionTrackPoint(grayimage1, grayimage2):
+    """
+    Process two cropped grayscale images.
+    check for motion and return center point
+    of motion for largest contour.
+    """
+    return getLargestBlobPoint(getMotionTrackBlobs(grayimage1, grayimage2))
+
+
+# ------------------------------------------------------------------------------
+def getMotionTrackBlobs(
+    grayimage1,
+    grayimage2,
+    mask=None,
+    autoThreshold=None,
+    buffers=None,
+    heatmap=None,
+    timestamp=None,
+):
+    """
+    Process two cropped grayscale images and
+    return the blobs array of all motion blobs.
+    Difference pixels outside the optional uint8 mask are ignored.
+    An AutoThreshold sets the blur and threshold from the image noise.
+    A MotionHeatmap accumulates the threshold image of grayimage2 seen
+    at frame timestamp and clears its nuisance pixels.
+    MotionBuffers hold every intermediate image so nothing is allocated
+    """
+    if buffers is None:
+        buffers = MotionBuffers(grayimage1.shape)
+    # Get differences between the two greyed images
+    differenceimage = cv2.absdiff(grayimage1, grayimage2, dst=buffers.diff)
+    blurSize, threshold = BLUR_SIZE, THRESHOLD_SENSITIVITY
+    if autoThreshold is not None:
+        blurSize = autoThreshold.blurFor(differenceimage)
+    if mask is not None:
+        cv2.bitwise_and(differenceimage, mask, dst=differenceimage)
+    # Blur difference image to enhance motion vectors
+    blurredimage = cv2.blur(differenceimage, (blurSize, blurSize), dst=buffers.blurred)
+    if autoThreshold is not None:
+        threshold = autoThreshold.thresholdFor(blurredimage)
+    # Get threshold of blurred difference image
+    # based on THRESHOLD_SENSITIVITY variable
+    retval, thresholdimage = cv2.threshold(
+        blurredimage, threshold, 255, cv2.THRESH_BINARY, dst=buffers.thresh
+    )
+    if heatmap is not None:
+        heatmap.update(thresholdimage, timestamp)
+    return getMotionBlobs(thresholdimage, buffers)
+
+
+# ------------------------------------------------------------------------------
+class AutoThreshold:
+    """
+    Set the difference image blur and threshold from an estimate of the
+    sensor noise so the same settings work in daylight and in noisy
+    night images. Noise changes slowly so it is only measured once
+    every frames images and the last blur and threshold are used in
+    between. Noise is measured with the robust median and MAD (median
+    absolute deviation) of the difference image sampled every step
+    pixels, so moving objects covering less than half the image do
+    not affect it. Blur grows across blurRange as
+    the raw difference noise rises. The threshold is the median of the
+    blurred difference plus k noise std deviations limited to
+    thresholdRange. Noise that survives the blur sets the threshold.
+    """
+
+    def __init__(
+        self,
+        k=None,
+        thresholdRange=None,
+        blurRange=None,
+        step=None,
+        frames=None,
+        verbose=True,
+    ):
+        self.k = MOTION_AUTO_THRESHOLD_K if k is None else k
+        thresholdRange = (
+            MOTION_AUTO_THRESHOLD_RANGE if thresholdRange is None else thresholdRange
+        )
+        blurRange = MOTION_AUTO_BLUR_RANGE if blurRange is None else blurRange
+        self.thresholdMin, self.thresholdMax = sorted(thresholdRange)
+        self.blurMin, self.blurMax = sorted(blurRange)
+        self.step = max(1, int(MOTION_AUTO_SAMPLE_STEP if step is None else step))
+        frames = MOTION_AUTO_SAMPLE_FRAMES if frames is None else frames
+        self.frames = max(1, int(frames))
+        self.frameCount = 0
+        self.measure = True  # noise is measured on this frame
+        self.verbose = verbose
+        self.sample = None
+        self.deviation = None
+        self.noise = None
+        self.threshold = self.thresholdMin
+        self.blurSize = self.blurMin
+        self.loggedThreshold = None
+
+    def sampleMedian(self, image, deviation=False):
+        """
+        Return the median of image sampled every step pixels and, with
+        deviation, the (median, median absolute deviation) tuple
+        """
+        view = image[:: self.step, :: self.step]
+        if self.sample is None or self.sample.shape != view.shape:
+            # int16 so deviations below the median stay positive after abs
+            self.sample = np.empty(view.shape, dtype=np.int16)
+            self.deviation = np.empty(view.shape, dtype=np.int16)
+        np.copyto(self.sample, view)
+        flat = self.sample.reshape(-1)
+        middle = flat.size // 2
+        flat.partition(middle)
+        median = int(flat[middle])
+        if not deviation:
+            return median
+        np.subtract(self.sample, median, out=self.deviation)
+        np.abs(self.deviation, out=self.deviation)
+        flat = self.deviation.reshape(-1)
+        flat.partition(middle)
+        return median, int(flat[middle])
+
+    def blurFor(self, differenceimage):
+        """
+        Estimate the noise of uint8 differenceimage once every frames
+        calls and return the blur size
+        """
+        self.measure = self.frameCount % self.frames == 0
+        self.frameCount += 1
+        if not self.measure:
+            return self.blurSize
+        # absdiff is already the absolute deviation from a zero median.
+        # 1.4826 x MAD is the std deviation for gaussian noise
+        noise = 1.4826 * self.sampleMedian(differenceimage)
+        if self.noise is None:
+            self.noise = noise
+        else:
+            # light smoothing so single frames do not make it jitter
+            self.noise += 0.2 * (noise - self.noise)
+        # Same noise to blur scale as the threshold range
+        ratio = (self.k * self.noise - self.thresholdMin) / float(
+            max(1, self.thresholdMax - self.thresholdMin)
+        )
+        ratio = min(max(ratio, 0.0), 1.0)
+        self.blurSize = int(round(self.blurMin + ratio * (self.blurMax - self.blurMin)))
+        return self.blurSize
+
+    def thresholdFor(self, blurredimage):
+        """Return the threshold for the noise left in the blurred difference"""
+        if not self.measure:
+            return self.threshold
+        median, mad = self.sampleMedian(blurredimage, deviation=True)
+        # at least one grey level so a flat image still has some margin
+        threshold = median + self.k * 1.4826 * max(mad, 1)
+        threshold = min(max(threshold, self.thresholdMin), self.thresholdMax)
+        self.threshold = int(round(threshold))
+        if self.verbose and (
+            self.loggedThreshold is None
+            or abs(self.threshold - self.loggedThreshold) >= 5
+        ):
+            logging.info(
+                "Auto Threshold noise=%.1f threshold=%i blur=%i",
+                self.noise,
+                self.threshold,
+                self.blurSize,
+            )
+            self.loggedThreshold = self.threshold
+        return self.threshold
+
+
+# ------------------------------------------------------------------------------
+class MotionRoi:
+    """
+    Motion detection region of interest for a width x height stream.
+    The MOTION_ROI_INCLUDE polygons (whole frame if none) less the
+    MOTION_ROI_EXCLUDE polygons are rasterised once into a uint8 mask.
+    Detectors only process the bounding box crop of the mask so pixels
+    outside the region are never touched. mask is the cropped mask or
+    None when every pixel in the crop is included.
+    """
+
+    def __init__(self, width, height, include=None, exclude=None):
+        include = MOTION_ROI_INCLUDE if include is None else include
+        exclude = MOTION_ROI_EXCLUDE if exclude is None else exclude
+        self.frameMask = np.zeros((height, width), dtype=np.uint8)
+        if include:
+            cv2.fillPoly(self.frameMask, roiPolygons(include), 255)
+        else:
+            self.frameMask.fill(255)
+        if exclude:
+            cv2.fillPoly(self.frameMask, roiPolygons(exclude), 0)
+        self.x, self.y, cropWidth, cropHeight = cv2.boundingRect(self.frameMask)
+        if cropWidth == 0 or cropHeight == 0:
+            logging.error(
+                "MOTION_ROI_INCLUDE=%s less MOTION_ROI_EXCLUDE=%s"
+                " Leaves No Area of %ix%i Stream to Detect Motion",
+                include,
+                exclude,
+                width,
+                height,
+            )
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            sys.exit(1)
+        self.rows = slice(self.y, self.y + cropHeight)
+        self.cols = slice(self.x, self.x + cropWidth)
+        self.mask = self.frameMask[self.rows, self.cols]
+        self.coverage = 100.0 * cv2.countNonZero(self.frameMask) / (width * height)
+        if cv2.countNonZero(self.mask) == cropWidth * cropHeight:
+            self.mask = None  # rectangle so the crop alone is enough
+        if include or exclude:
+            logging.info(
+                "Motion ROI Crop x=%i y=%i %ix%i of %ix%i Stream  Coverage=%.1f%%",
+                self.x,
+                self.y,
+                cropWidth,
+                cropHeight,
+                width,
+                height,
+                self.coverage,
+            )
+
+    def crop(self, gray):
+        """Return a view of the ROI bounding box of stream image gray"""
+        return gray[self.rows, self.cols]
+
+    def apply(self, image):
+        """Zero pixels of the cropped image outside the ROI in place"""
+        if self.mask is not None:
+            cv2.bitwise_and(image, self.mask, dst=image)
+        return image
+
+    def offsetBlobs(self, blobs):
+        """Move blobs found in the crop to stream coordinates"""
+        if len(blobs) and (self.x or self.y):
+            blobs[:, 0] += self.x
+            blobs[:, 1] += self.y
+            blobs[:, 5] += self.x
+            blobs[:, 6] += self.y
+        return blobs
+
+
+# ------------------------------------------------------------------------------
+def roiPolygons(polygons):
+    """Return config ROI polygon point lists as int32 arrays for fillPoly"""
+    return [np.array(points, dtype=np.int32).reshape(-1, 2) for points in polygons]
+
+
+# ------------------------------------------------------------------------------
+def getMotionRoi(shape):
+    """Return the MotionRoi for a stream frame shape, created once per shape"""
+    height, width = shape[:2]
+    roi = motionRois.get((width, height))
+    if roi is None:
+        roi = MotionRoi(width, height)
+        motionRois[(width, height)] = roi
+    return roi
+
+
+# ------------------------------------------------------------------------------
+class LightingCheck:
+    """
+    Cheap pre-check for global illumination changes such as clouds,
+    headlights or lights switching on. The mean and a 32 bin histogram
+    of the stream luma (the same data getStreamPixAve uses) sampled
+    every MOTION_LIGHT_SAMPLE_STEP pixels are compared with a reference.
+    A mean change of at least MOTION_LIGHT_MEAN_DIFF is global when
+    the histogram, scaled back to the reference mean, still correlates
+    by MOTION_LIGHT_HIST_CORREL or more. The whole scene changed rather
+    than an object moving in part of it. The reference follows the
+    detector reference frame, alpha=1.0 for the previous frame or the
+    background learning rate.
+    """
+
+    def __init__(
+        self, alpha=1.0, meanDiff=None, histCorrel=None, step=None, verbose=True
+    ):
+        self.alpha = alpha
+        self.meanDiff = MOTION_LIGHT_MEAN_DIFF if meanDiff is None else meanDiff
+        self.histCorrel = MOTION_LIGHT_HIST_CORREL if histCorrel is None else histCorrel
+        self.step = max(1, int(MOTION_LIGHT_SAMPLE_STEP if step is None else step))
+        self.verbose = verbose
+        self.refMean = None
+        self.refHist = np.zeros((32, 1), dtype=np.float32)
+        self.hist = np.zeros((32, 1), dtype=np.float32)
+        self.scaledHist = np.zeros((32, 1), dtype=np.float32)
+        self.scaled = None
+        self.changeCount = 0
+
+    def measure(self, gray):
+        """Return (sample view, mean) of gray luma and update self.hist"""
+        sample = gray[:: self.step, :: self.step]
+        mean = cv2.mean(sample)[0]
+        cv2.calcHist([sample], [0], None, [32], [0, 256], hist=self.hist)
+        return sample, mean
+
+    def reset(self, gray):
+        """Make gray the reference eg after the detector was re-based"""
+        sample, self.refMean = self.measure(gray)
+        np.copyto(self.refHist, self.hist)
+
+    def changed(self, gray):
+        """
+        Return True if gray differs from the reference by a global
+        lighting change. The reference is then re-based to gray
+        """
+        if self.refMean is None:
+            self.reset(gray)
+            return False
+        sample, mean = self.measure(gray)
+        if abs(mean - self.refMean) >= self.meanDiff:
+            if self.scaled is None or self.scaled.shape != sample.shape:
+                self.scaled = np.empty(sample.shape, dtype=np.uint8)
+            # Remove the brightness change and compare histogram shapes
+            cv2.convertScaleAbs(
+                sample, dst=self.scaled, alpha=self.refMean / max(mean, 1.0)
+            )
+            cv2.calcHist(
+                [self.scaled], [0], None, [32], [0, 256], hist=self.scaledHist
+            )
+            correl = cv2.compareHist(self.scaledHist, self.refHist, cv2.HISTCMP_CORREL)
+            if correl >= self.histCorrel:
+                self.changeCount += 1
+                if self.verbose:
+                    logging.info(
+                        "Lighting Change Mean %i to %i Histogram Correl=%.2f."
+                        " Rebase Motion Reference",
+                        self.refMean,
+                        mean,
+                        correl,
+                    )
+                self.refMean = mean
+                np.copyto(self.refHist, self.hist)
+                return True
+        # Normal frame so the reference follows the detector reference
+        self.refMean += self.alpha * (mean - self.refMean)
+        cv2.accumulateWeighted(self.hist, self.refHist, self.alpha)
+        return False
+
+
+# ------------------------------------------------------------------------------
+def createLightingCheck(alpha=1.0, verbose=True):
+    """Return a LightingCheck if MOTION_LIGHT_CHECK_ON else None"""
+    if not MOTION_LIGHT_CHECK_ON:
+        return None
+    return LightingCheck(alpha=alpha, verbose=verbose)
+
+
+# ------------------------------------------------------------------------------
+class TemporalFilter:
+    """
+    Temporal median of the last depth stream luma ROI crops so rain,
+    snow and night sensor speckles are removed before differencing.
+    A speckle in fewer than half the frames is replaced by the pixel
+    value of the other frames while a moving object still covers its
+    pixels for most of them. Crops are copied into a preallocated
+    (depth, height, width) uint8 ring. The median is the min of max
+    compare-exchanges of a partial bubble sort done with numpy out=
+    buffers since np.median sorts a float copy of the whole ring.
+    Even depths return the lower median. depth is
+    MOTION_DENOISE_DAY_FRAMES or MOTION_DENOISE_NIGHT_FRAMES picked
+    from the stream luma average and NIGHT_TWILIGHT_THRESHOLD every
+    checkSec of frame time. Depth 0 or 1 returns the crop unchanged.
+    """
+
+    def __init__(self, dayFrames=None, nightFrames=None, checkSec=60, verbose=True):
+        self.dayFrames = MOTION_DENOISE_DAY_FRAMES if dayFrames is None else dayFrames
+        self.nightFrames = (
+            MOTION_DENOISE_NIGHT_FRAMES if nightFrames is None else nightFrames
+        )
+        self.checkSec = checkSec
+        self.verbose = verbose
+        self.depth = 1
+        self.shape = None
+        self.ring = None
+        self.work = None
+        self.head = 0
+        self.nextCheck = 0.0
+
+    def depthFor(self, gray):
+        """Return the configured depth for the day or night mode of gray"""
+        dayMode = cv2.mean(gray[::8, ::8])[0] > NIGHT_TWILIGHT_THRESHOLD
+        return max(1, int(self.dayFrames if dayMode else self.nightFrames))
+
+    def reset(self, crop, gray, timestamp=None):
+        """Fill the ring with crop and return it eg after the stream was stopped"""
+        depth = self.depthFor(gray)
+        timestamp = time.time() if timestamp is None else timestamp
+        self.nextCheck = timestamp + self.checkSec
+        if depth != self.depth or crop.shape != self.shape:
+            if self.verbose and depth != self.depth:
+                if depth > 1:
+                    logging.info("Temporal Denoise Median of %i Frames", depth)
+                else:
+                    logging.info("Temporal Denoise Off")
+            self.depth = depth
+            self.shape = crop.shape
+            if depth > 1:
+                self.ring = np.empty((depth,) + crop.shape, dtype=np.uint8)
+                # sort frames plus a spare for each compare-exchange
+                self.work = [
+                    np.empty(crop.shape, dtype=np.uint8) for i in range(depth + 1)
+                ]
+        if self.depth > 1:
+            self.ring[...] = crop
+            self.head = 0
+        return crop
+
+    def filter(self, crop, gray, timestamp=None):
+        """
+        Add crop seen at frame timestamp to the ring and return the
+        median image. It is only valid until the next call
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp >= self.nextCheck:
+            self.nextCheck = timestamp + self.checkSec
+            if self.depthFor(gray) != self.depth:
+                return self.reset(crop, gray, timestamp)
+        if self.depth < 2:
+            return crop
+        np.copyto(self.ring[self.head], crop)
+        self.head = (self.head + 1) % self.depth
+        work = self.work
+        for i in range(self.depth):
+            np.copyto(work[i], self.ring[i])
+        spare = work[self.depth]
+        middle = (self.depth - 1) // 2
+        # Each pass moves the largest value left below top up to top
+        for top in range(self.depth - 1, middle - 1, -1):
+            for i in range(top):
+                np.minimum(work[i], work[i + 1], out=spare)
+                np.maximum(work[i], work[i + 1], out=work[i + 1])
+                work[i], spare = spare, work[i]
+        work[self.depth] = spare
+        return work[middle]
+
+
+# ------------------------------------------------------------------------------
+def createTemporalFilter(verbose=True):
+    """
+    Return a TemporalFilter if MOTION_DENOISE_DAY_FRAMES or
+    MOTION_DENOISE_NIGHT_FRAMES is more than 1 else None
+    """
+    if max(MOTION_DENOISE_DAY_FRAMES, MOTION_DENOISE_NIGHT_FRAMES) < 2:
+        return None
+    return TemporalFilter(verbose=verbose)
+
+
+# ------------------------------------------------------------------------------
+class MotionHeatmap:
+    """
+    Per pixel motion activity of a detector binary motion image.
+    update() is a single cv2.accumulateWeighted per frame so heat is
+    the decayed fraction of recent frames each pixel was moving, with
+    a memory of about MOTION_HEATMAP_DECAY_SEC. Decay and the learn
+    timer use the frame timestamps so the memory is the same at the
+    idle governor rate and replays learn at the same frame on any
+    machine. Every MOTION_HEATMAP_SAVE_SEC pixels active more than the
+    MOTION_HEATMAP_NUISANCE fraction, eg trees or flags, are learned
+    as the nuisance mask. It is applied after the heat update when
+    MOTION_HEATMAP_MASK_ON so masked pixels keep their heat and are
+    released once they stop moving. rect (x, y, w, h) is where the
+    detector image lies in the frameSize stream image, used to save
+    and load the heatmap in stream coordinates. path None keeps it
+    in memory only eg for --tune and --bench replays.
+    """
+
+    def __init__(self, shape, frameSize, rect, full=255.0, path=None, verbose=True):
+        self.frameSize = frameSize
+        self.rect = rect
+        self.full = float(full)  # motion image value of a moving pixel
+        self.path = path
+        self.verbose = verbose
+        self.decaySec = float(MOTION_HEATMAP_DECAY_SEC)
+        fps = stream_framerate if stream_framerate > 0 else 1.0
+        # weight of the first frame. Later frames are weighted by frame time
+        self.alpha = 1.0 / max(1.0, self.decaySec * fps)
+        self.lastTime = None
+        self.saveSec = MOTION_HEATMAP_SAVE_SEC
+        self.maskOn = MOTION_HEATMAP_MASK_ON
+        self.heat = np.zeros(shape, dtype=np.float32)
+        # learn() work buffers so the mask update does not allocate
+        self.active = np.zeros(shape, dtype=np.bool_)
+        self.held = np.zeros(shape, dtype=np.bool_)  # nuisance before dilate
+        self.raw = np.zeros(shape, dtype=np.uint8)
+        self.kernel = np.ones((3, 3), dtype=np.uint8)
+        self.mask = np.zeros(shape, dtype=np.uint8)
+        self.keep = np.full(shape, 255, dtype=np.uint8)
+        self.masked = 0  # nuisance pixel count
+        self.nextLearn = None  # set from the first frame timestamp
+        if self.path is not None:
+            self.load()
+
+    def update(self, motionImage, timestamp=None):
+        """
+        Add motionImage seen at frame timestamp to the heat then clear
+        nuisance pixels in place
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.lastTime is not None and self.decaySec > 0:
+            # weight by the time since the last processed frame
+            self.alpha = min(max(timestamp - self.lastTime, 0.0) / self.decaySec, 1.0)
+        self.lastTime = timestamp
+        cv2.accumulateWeighted(motionImage, self.heat, self.alpha)
+        if self.masked and self.maskOn:
+            cv2.bitwise_and(motionImage, self.keep, dst=motionImage)
+        if self.nextLearn is None:
+            self.nextLearn = timestamp + self.saveSec
+        elif timestamp >= self.nextLearn:
+            self.nextLearn = timestamp + self.saveSec
+            self.learn()
+            if self.path is not None:
+                self.save()
+
+    def learn(self):
+        """Set the nuisance mask from the heat with on/off hysteresis"""
+        onLevel = MOTION_HEATMAP_NUISANCE * self.full
+        # stay masked until activity drops below half the on level
+        np.greater(self.heat, onLevel / 2.0, out=self.active)
+        np.logical_and(self.held, self.active, out=self.held)
+        np.greater(self.heat, onLevel, out=self.active)
+        np.logical_or(self.held, self.active, out=self.held)
+        np.multiply(self.held.view(np.uint8), np.uint8(255), out=self.raw)
+        cv2.dilate(self.raw, self.kernel, dst=self.mask)
+        cv2.bitwise_not(self.mask, dst=self.keep)
+        masked = cv2.countNonZero(self.mask)
+        # only log changes of 1% of the area or more
+        if self.verbose and abs(masked - self.masked) * 100 >= max(self.mask.size, 100):
+            if self.maskOn:
+                action = "Applied"
+            else:
+                action = "Suggested. Set MOTION_HEATMAP_MASK_ON=True to Apply"
+            logging.info(
+                "Heatmap Nuisance Mask %.1f%% of Motion Area %s",
+                100.0 * masked / self.mask.size,
+                action,
+            )
+        self.masked = masked
+
+    def toFrame(self, image, interpolation=cv2.INTER_NEAREST):
+        """Return detector image placed in a stream frame sized image"""
+        width, height = self.frameSize
+        x, y, w, h = self.rect
+        frame = np.zeros((max(height, y + h), max(width, x + w)), dtype=image.dtype)
+        frame[y : y + h, x : x + w] = cv2.resize(
+            image, (w, h), interpolation=interpolation
+        )
+        return frame[:height, :width]
+
+    def save(self):
+        """Save the heatmap .npy and .png and the nuisance mask .png"""
+        heat = self.toFrame(self.heat / self.full)
+        np.save(self.path + ".npy", heat)
+        cv2.imwrite(
+            self.path + ".png",
+            cv2.applyColorMap(cv2.convertScaleAbs(heat, alpha=255.0), cv2.COLORMAP_JET),
+        )
+        cv2.imwrite(self.path + "-nuisance.png", self.toFrame(self.mask))
+        if self.verbose:
+            logging.info("Saved Heatmap %s.npy .png and -nuisance.png", self.path)
+
+    def load(self):
+        """Continue from a heatmap saved for the same stream size"""
+        npyPath = self.path + ".npy"
+        if not os.path.isfile(npyPath):
+            return
+        try:
+            heat = np.load(npyPath)
+        except (IOError, OSError, ValueError) as err:
+            logging.warning("Could Not Load Heatmap %s - %s", npyPath, err)
+            return
+        width, height = self.frameSize
+        if heat.shape != (height, width):
+            logging.warning(
+                "Heatmap %s is Not %ix%i. Starting New", npyPath, width, height
+            )
+            return
+        x, y, w, h = self.rect
+        frame = np.zeros((max(height, y + h), max(width, x + w)), dtype=np.float32)
+        frame[:height, :width] = heat
+        region = frame[y : y + h, x : x + w]
+        rows, cols = self.heat.shape
+        self.heat[...] = cv2.resize(region, (cols, rows), interpolation=cv2.INTER_AREA)
+        self.heat *= self.full
+        self.learn()
+        if self.verbose:
+            logging.info("Loaded Heatmap %s", npyPath)
+
+
+# ------------------------------------------------------------------------------
+def createMotionHeatmap(shape, frameSize, rect, full=255.0, verbose=True):
+    """
+    Return a MotionHeatmap for a detector motion image shape if
+    MOTION_HEATMAP_ON else None. Only verbose live detection saves it
+    """
+    if not MOTION_HEATMAP_ON:
+        return None
+    path = HEATMAP_PATH if verbose else None
+    return MotionHeatmap(shape, frameSize, rect, full=full, path=path, verbose=verbose)
+
+
+# ------------------------------------------------------------------------------
+def createRoiHeatmap(roi, frameShape, verbose=True):
+    """Return createMotionHeatmap() for the MotionRoi crop of a stream frame"""
+    cropShape = (roi.rows.stop - roi.rows.start, roi.cols.stop - roi.cols.start)
+    return createMotionHeatmap(
+        cropShape,
+        (frameShape[1], frameShape[0]),
+        (roi.x, roi.y, cropShape[1], cropShape[0]),
+        verbose=verbose,
+    )
+
+
+# ------------------------------------------------------------------------------
+class DiffDetector:
+    """
+    Motion detector using the difference between consecutive stream
+    frames. detect() returns the motion center point or empty list
+    and detectBlobs() returns the blobs array of all motion blobs.
+    The previous frame ROI crop is copied into preallocated
+    MotionBuffers so the stream buffer holding gray can be reused.
+    """
+
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.frameShape = None
+        self.buffers = None
+        self.heatmap = None
+        self.autoThreshold = None
+        if MOTION_AUTO_THRESHOLD_ON:
+            self.autoThreshold = AutoThreshold(verbose=verbose)
+        self.lighting = createLightingCheck(verbose=verbose)
+        self.denoise = createTemporalFilter(verbose=verbose)
+
+    def reset(self, gray, timestamp=None):
+        """
+        Start again from gray seen at frame timestamp eg after the
+        stream was stopped
+        """
+        if self.frameShape != gray.shape:
+            self.roi = getMotionRoi(gray.shape)
+            self.frameShape = gray.shape
+            self.buffers = MotionBuffers(self.roi.crop(gray).shape)
+            self.heatmap = createRoiHeatmap(self.roi, gray.shape, self.verbose)
+        crop = self.roi.crop(gray)
+        if self.denoise is not None:
+            crop = self.denoise.reset(crop, gray, timestamp)
+        np.copyto(self.buffers.prev, crop)
+        if self.lighting is not None:
+            self.lighting.reset(gray)
+
+    def detectBlobs(self, gray, timestamp=None):
+        """Return motion blobs between the previous frame and gray"""
+        if self.frameShape != gray.shape:
+            self.reset(gray, timestamp)
+            return NO_BLOBS
+        crop = self.roi.crop(gray)
+        if self.lighting is not None and self.lighting.changed(gray):
+            blobs = NO_BLOBS  # gray is the new reference frame
+            if self.denoise is not None:
+                crop = self.denoise.reset(crop, gray, timestamp)
+        else:
+            if self.denoise is not None:
+                # difference the filtered frames
+                crop = self.denoise.filter(crop, gray, timestamp)
+            blobs = getMotionTrackBlobs(
+                self.buffers.prev,
+                crop,
+                self.roi.mask,
+                self.autoThreshold,
+                self.buffers,
+                self.heatmap,
+                timestamp,
+            )
+            blobs = self.roi.offsetBlobs(blobs)
+        np.copyto(self.buffers.prev, crop)
+        return blobs
+
+    def detect(self, gray, timestamp=None):
+        """Return motion point between the previous frame and gray"""
+        return getLargestBlobPoint(self.detectBlobs(gray, timestamp))
+
+    def skip(self, gray, timestamp=None):
+        """
+        Frame not processed. Keep it so the next frame is compared
+        with the frame just before it. With denoise it is added to
+        the median ring like any other frame
+        """
+        if self.frameShape != gray.shape:
+            self.reset(gray, timestamp)
+            return
+        crop = self.roi.crop(gray)
+        if self.denoise is not None:
+            crop = self.denoise.filter(crop, gray, timestamp)
+        np.copyto(self.buffers.prev, crop)
+
+
+# ------------------------------------------------------------------------------
+class BackgroundDetector:
+    """
+    Motion detector using a running average background model with a
+    per pixel variance. Pixels more than MOTION_BG_SIGMA standard
+    deviations from the background mean are motion so sensitivity
+    follows the learned sensor and scene noise rather than a fixed
+    threshold. Slow moving objects are detected since they differ
+    from the background rather than from the previous frame.
+    All buffers are preallocated and updated in place.
+    """
+
+    def __init__(self, alpha=None, sigma=None, minStd=None, verbose=True):
+        self.alpha = MOTION_BG_ALPHA if alpha is None else alpha
+        sigma = MOTION_BG_SIGMA if sigma is None else sigma
+        minStd = MOTION_BG_MIN_STD if minStd is None else minStd
+        self.sigma2 = float(sigma * sigma)
+        self.minVar = float(minStd * minStd)
+        self.verbose = verbose
+        self.mean = None
+        self.frameShape = None
+        self.heatmap = None
+        self.lighting = createLightingCheck(alpha=self.alpha, verbose=verbose)
+        self.denoise = createTemporalFilter(verbose=verbose)
+
+    def allocate(self, shape):
+        """Create the model and work buffers for frame shape"""
+        self.mean = np.zeros(shape, dtype=np.float32)
+        self.var = np.zeros(shape, dtype=np.float32)
+        self.grayF = np.zeros(shape, dtype=np.float32)
+        self.diff = np.zeros(shape, dtype=np.float32)
+        self.diffSq = np.zeros(shape, dtype=np.float32)
+        self.limit = np.zeros(shape, dtype=np.float32)
+        self.mask = np.zeros(shape, dtype=np.uint8)
+        self.bgMask = np.zeros(shape, dtype=np.uint8)
+        self.buffers = MotionBuffers(shape, diff=False)
+        self.var.fill(self.minVar)
+
+    def reset(self, gray, timestamp=None):
+        """
+        Seed the background mean from gray. Learned variance is kept
+        since sensor and scene noise do not change with a restart
+        """
+        if self.frameShape != gray.shape:
+            self.roi = getMotionRoi(gray.shape)
+            self.frameShape = gray.shape
+            self.allocate(self.roi.crop(gray).shape)
+            self.heatmap = createRoiHeatmap(self.roi, gray.shape, self.verbose)
+        crop = self.roi.crop(gray)
+        if self.denoise is not None:
+            crop = self.denoise.reset(crop, gray, timestamp)
+        self.mean[...] = crop
+        if self.lighting is not None:
+            self.lighting.reset(gray)
+
+    def detect(self, gray, timestamp=None):
+        """Return motion center point or empty list"""
+        return getLargestBlobPoint(self.detectBlobs(gray, timestamp))
+
+    def skip(self, gray, timestamp=None):
+        """Frame not processed. The background model is left unchanged"""
+        pass
+
+    def detectBlobs(self, gray, timestamp=None):
+        """
+        Compare gray seen at frame timestamp to the background model
+        then update the model. Return the blobs array of all motion blobs
+        """
+        if self.frameShape != gray.shape:
+            self.reset(gray, timestamp)
+            return NO_BLOBS
+        crop = self.roi.crop(gray)
+        if self.lighting is not None and self.lighting.changed(gray):
+            # Re-seed the background mean from the newly lit scene
+            if self.denoise is not None:
+                crop = self.denoise.reset(crop, gray, timestamp)
+            self.mean[...] = crop
+            return NO_BLOBS
+        if self.denoise is not None:
+            crop = self.denoise.filter(crop, gray, timestamp)
+        self.grayF[...] = crop
+        cv2.absdiff(self.grayF, self.mean, dst=self.diff)
+        # Blur difference image to join up parts of moving objects
+        cv2.blur(self.diff, (BLUR_SIZE, BLUR_SIZE), dst=self.diff)
+        cv2.multiply(self.diff, self.diff, dst=self.diffSq)
+        # motion where diff^2 > sigma^2 * max(var, minVar)
+        np.maximum(self.var, self.minVar, out=self.limit)
+        np.multiply(self.limit, self.sigma2, out=self.limit)
+        cv2.compare(self.diffSq, self.limit, cv2.CMP_GT, dst=self.mask)
+        self.roi.apply(self.mask)
+        if self.heatmap is not None:
+            self.heatmap.update(self.mask, timestamp)
+        # Learn mean everywhere so stopped objects are absorbed and
+        # variance only where there is no motion
+        cv2.accumulateWeighted(self.grayF, self.mean, self.alpha)
+        cv2.bitwise_not(self.mask, dst=self.bgMask)
+        cv2.accumulateWeighted(self.diffSq, self.var, self.alpha, mask=self.bgMask)
+        return self.roi.offsetBlobs(getMotionBlobs(self.mask, self.buffers))
+
+
+# ------------------------------------------------------------------------------
+class VectorDetector:
+    """
+    Motion detector using the macroblock motion vectors the h264
+    encoder already computes so almost no cpu is used. Blocks with a
+    vector length of at least MOTION_VECTOR_MAGNITUDE (and SAD block
+    match error not above MOTION_VECTOR_SAD_MAX if set) are moving.
+    The center of the largest connected group of moving blocks is
+    returned in stream coordinates. The stream frame passed to
+    detect() is not used.
+    """
+
+    def __init__(
+        self, source, magnitude=None, sadMax=None, minCells=None, verbose=True
+    ):
+        self.source = source
+        magnitude = MOTION_VECTOR_MAGNITUDE if magnitude is None else magnitude
+        self.mag2Min = int(magnitude * magnitude)
+        self.sadMax = MOTION_VECTOR_SAD_MAX if sadMax is None else sadMax
+        self.minCells = MOTION_VECTOR_MIN_CELLS if minCells is None else minCells
+        self.lastId = 0
+        ring = source.vectorRing
+        # last vector column is padding
+        shape = (ring.shape[0], ring.shape[1] - 1)
+        self.mag2 = np.zeros(shape, dtype=np.int32)
+        self.work = np.zeros(shape, dtype=np.int32)
+        self.moving = np.zeros(shape, dtype=np.bool_)
+        self.goodSad = np.zeros(shape, dtype=np.bool_)
+        self.buffers = MotionBuffers(shape, diff=False)
+        # stream pixels per macroblock
+        self.cellWidth = 16.0 * source.resolution[0] / source.vectorSize[0]
+        self.cellHeight = 16.0 * source.resolution[1] / source.vectorSize[1]
+        # macroblocks mostly inside the ROI
+        width, height = source.resolution
+        roi = getMotionRoi((height, width))
+        self.cellMask = None
+        if roi.coverage < 100.0:
+            # cells cover the padded vector frame so scale the padded mask
+            padded = np.zeros(
+                (
+                    int(round(shape[0] * self.cellHeight)),
+                    int(round(shape[1] * self.cellWidth)),
+                ),
+                dtype=np.uint8,
+            )
+            rows = min(height, padded.shape[0])
+            cols = min(width, padded.shape[1])
+            padded[:rows, :cols] = roi.frameMask[:rows, :cols]
+            cells = cv2.resize(
+                padded, (shape[1], shape[0]), interpolation=cv2.INTER_AREA
+            )
+            self.cellMask = cells >= 128
+        # one heatmap pixel per macroblock
+        self.heatmap = createMotionHeatmap(
+            shape,
+            (width, height),
+            (
+                0,
+                0,
+                int(round(shape[1] * self.cellWidth)),
+                int(round(shape[0] * self.cellHeight)),
+            ),
+            full=1.0,
+            verbose=verbose,
+        )
+
+    def reset(self, gray, timestamp=None):
+        """Ignore vectors from before a stream restart"""
+        self.lastId = self.source.vectorRing.latestId
+
+    def detect(self, gray, timestamp=None):
+        """Return motion point from the newest motion vector frame"""
+        return getLargestBlobPoint(self.detectBlobs(gray))
+
+    def skip(self, gray, timestamp=None):
+        """Frame not processed. detectBlobs always uses the newest vectors"""
+        pass
+
+    def detectBlobs(self, gray, timestamp=None):
+        """
+        Return the blobs array of moving block groups in the newest
+        motion vector frame scaled to stream coordinates
+        """
+        newFrame = self.source.vectorRing.read_next(self.lastId, 0)
+        if newFrame is None:
+            return NO_BLOBS
+        self.lastId, timestamp, vectors = newFrame
+        vectors = vectors[:, :-1]
+        np.multiply(vectors["x"], vectors["x"], out=self.mag2, dtype=np.int32)
+        np.multiply(vectors["y"], vectors["y"], out=self.work, dtype=np.int32)
+        np.add(self.mag2, self.work, out=self.mag2)
+        np.greater_equal(self.mag2, self.mag2Min, out=self.moving)
+        if self.sadMax > 0:
+            np.less_equal(vectors["sad"], self.sadMax, out=self.goodSad)
+            np.logical_and(self.moving, self.goodSad, out=self.moving)
+        if self.cellMask is not None:
+            np.logical_and(self.moving, self.cellMask, out=self.moving)
+        if self.heatmap is not None:
+            self.heatmap.update(self.moving.view(np.uint8), timestamp)
+        stats, centroids = self.buffers.components(self.moving.view(np.uint8))
+        stats = stats[1:]  # label 0 is the background
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= self.minCells]
+        blobs = np.empty((len(stats), 7), dtype=np.int32)
+        blobs[:, 0] = stats[:, 0] * self.cellWidth
+        blobs[:, 1] = stats[:, 1] * self.cellHeight
+        blobs[:, 2] = stats[:, 2] * self.cellWidth
+        blobs[:, 3] = stats[:, 3] * self.cellHeight
+        blobs[:, 4] = stats[:, 4] * self.cellWidth * self.cellHeight
+        # bounding box center same as the contours blobs
+        blobs[:, 5] = blobs[:, 0] + blobs[:, 2] // 2
+        blobs[:, 6] = blobs[:, 1] + blobs[:, 3] // 2
+        return blobs
+
+
+# ------------------------------------------------------------------------------
+def createMotionDetector(source=None, verbose=True):
+    """
+    Return the motion detector selected by MOTION_DETECTOR.
+    "vectors" needs the frame source to read motion vectors from
+    """
+    if MOTION_DETECTOR == "background":
+        return BackgroundDetector(verbose=verbose)
+    elif MOTION_DETECTOR == "vectors":
+        if source is None or source.vectorRing is None:
+            logging.error(
+                "MOTION_DETECTOR = vectors Requires STREAM_SOURCE = picamera or replay"
+            )
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            exit(1)
+        return VectorDetector(source, verbose=verbose)
+    return DiffDetector(verbose=verbose)
+
+
+# ------------------------------------------------------------------------------
+def trackMotionDistance(mPoint1, mPoint2):
+    """
+    Return the triangulated distance between two tracking locations
+    """
+    x1, y1 = mPoint1
+    x2, y2 = mPoint2
+    trackLen = abs(math.hypot(x2 - x1, y2 - y1))
+    return trackLen
+
+
+# ------------------------------------------------------------------------------
+class TrackState:
+    """
+    Motion track state machine. update() is called with the motion
+    point found in each stream frame and the frame timestamp and
+    returns True when the track length triggers a motion event.
+    Used by timolo() and the --tune footage replay.
+    """
+
+    def __init__(
+        self,
+        trigLen=None,
+        trigLenMin=None,
+        trigLenMax=None,
+        timeout=None,
+        verbose=True,
+    ):
+        # None uses the current track settings
+        self.trigLen = TRACK_TRIG_LEN if trigLen is None else trigLen
+        self.trigLenMin = TRACK_TRIG_LEN_MIN if trigLenMin is None else trigLenMin
+        self.trigLenMax = TRACK_TRIG_LEN_MAX if trigLenMax is None else trigLenMax
+        self.timeout = TRACK_TIMEOUT if timeout is None else timeout
+        self.verbose = verbose  # False suppresses logging eg for --tune
+        self.startTrack = False
+        self.startPos = []
+        self.trackTimeout = 0.0
+        self.trackLen = 0.0
+
+    def reset(self, timestamp=None):
+        """Abandon any track in progress"""
+        self.startTrack = False
+        self.startPos = []
+        self.trackLen = 0.0
+        self.trackTimeout = time.time() if timestamp is None else timestamp
+
+    def timeRemaining(self, timestamp):
+        """Return seconds until a started track times out or None"""
+        if not self.startTrack:
+            return None
+        return self.timeout - (timestamp - self.trackTimeout)
+
+    def updateBlobs(self, blobs, timestamp):
+        """
+        Track the largest of the blobs seen at timestamp.
+        Return True if motion triggered.
+        """
+        return self.update(getLargestBlobPoint(blobs), timestamp)
+
+    def update(self, movePoint, timestamp):
+        """
+        Add movePoint (empty list if no motion) seen at timestamp.
+        Return True if motion triggered.
+        """
+        motionFound = False
+        if movePoint and not self.startTrack:
+            self.startTrack = True
+            self.trackTimeout = timestamp
+            self.startPos = movePoint
+        elif movePoint and self.startTrack:  # Two sets of movement required
+            self.trackLen = trackMotionDistance(self.startPos, movePoint)
+            # wait until track well started
+            if self.trackLen > self.trigLenMin:
+                # Reset tracking timer object moved
+                self.trackTimeout = timestamp
+                if self.verbose and MOTION_TRACK_INFO_ON:
+                    logging.info(
+                        "Track Progress From(%i,%i) To(%i,%i) trackLen=%i/%i px",
+                        self.startPos[0],
+                        self.startPos[1],
+                        movePoint[0],
+                        movePoint[1],
+                        self.trackLen,
+                        self.trigLen,
+                    )
+            # Track length triggered
+            if self.trackLen >= self.trigLen:
+                # reduce chance of two objects at different positions
+                if self.trackLen >= self.trigLenMax:
+                    if self.verbose and MOTION_TRACK_INFO_ON:
+                        logging.info(
+                            "TrackLen %i px Exceeded %i px Max Trig Len Allowed.",
+                            self.trackLen,
+                            self.trigLenMax,
+                        )
+                else:
+                    motionFound = True
+                    if self.verbose:
+                        logging.info(
+                            "%sMotion Triggered Start(%i,%i)"
+                            "  End(%i,%i) trackLen=%i/%i px",
+                            PLUGIN_NAME + " " if PLUGIN_ON else "",
+                            self.startPos[0],
+                            self.startPos[1],
+                            movePoint[0],
+                            movePoint[1],
+                            self.trackLen,
+                            self.trigLen,
+                        )
+                        print("")
+                self.reset(timestamp)
+        # Track timed out
+        if self.startTrack and timestamp - self.trackTimeout > self.timeout:
+            if self.verbose and MOTION_TRACK_INFO_ON:
+                logging.info(
+                    "Track Timer %.2f sec Exceeded. Reset Track", self.timeout
+                )
+            self.reset(timestamp)
+        return motionFound
+
+
+# ------------------------------------------------------------------------------
+def createMotionTracker(verbose=True):
+    """
+    Return the motion tracker selected by MOTION_TRACKER.
+    Both have updateBlobs(blobs, timestamp), reset and timeRemaining.
+    Direction and speed triggers and crossing counts need the multi
+    tracker Kalman filter velocity so they turn it on.
+    """
+    # Trigger rules only the multi tracker supports
+    kalmanOn = (
+        MOTION_TRACK_KALMAN_ON
+        or MOTION_TRIGGER_DIRECTION is not None
+        or MOTION_TRIGGER_SPEED_MIN > 0
+        or MOTION_COUNT_ON
+    )
+    if MOTION_TRACKER != "multi" and (
+        kalmanOn or MOTION_TRIGGER_LINE or MOTION_SPEED_ON
+    ):
+        logging.error(
+            "MOTION_TRACK_KALMAN_ON, MOTION_TRIGGER_LINE, MOTION_TRIGGER_DIRECTION,"
+            " MOTION_TRIGGER_SPEED_MIN, MOTION_COUNT_ON and MOTION_SPEED_ON"
+            " Require MOTION_TRACKER = multi"
+        )
+        logging.error("Exiting %s Due to Error", PROG_NAME)
+        exit(1)
+    if MOTION_SPEED_ON and (
+        MOTION_SPEED_UNITS not in SPEED_UNIT_FACTORS or MOTION_SPEED_PX_PER_M <= 0
+    ):
+        logging.error(
+            "MOTION_SPEED_UNITS=%s Must be one of %s and MOTION_SPEED_PX_PER_M=%s"
+            " Must be greater than 0",
+            MOTION_SPEED_UNITS,
+            ", ".join(sorted(SPEED_UNIT_FACTORS)),
+            MOTION_SPEED_PX_PER_M,
+        )
+        logging.error("Exiting %s Due to Error", PROG_NAME)
+        exit(1)
+    if MOTION_TRACKER == "multi":
+        if motion_tracker is None:
+            logging.error("MOTION_TRACKER = multi Requires File motion_tracker.py")
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            exit(1)
+        return motion_tracker.MultiTracker(
+            TRACK_TRIG_LEN,
+            TRACK_TRIG_LEN_MIN,
+            TRACK_TIMEOUT,
+            TRACK_MATCH_DIST,
+            maxTracks=MOTION_TRACK_MAX_OBJECTS,
+            verbose=verbose,
+            infoOn=MOTION_TRACK_INFO_ON,
+            prefix=PLUGIN_NAME + " " if PLUGIN_ON else "",
+            kalmanOn=kalmanOn,
+            measureStd=MOTION_TRACK_KALMAN_MEASURE_STD,
+            accelStd=MOTION_TRACK_KALMAN_ACCEL_STD,
+            line=MOTION_TRIGGER_LINE,
+            lineFrom=MOTION_TRIGGER_LINE_FROM,
+            lineGap=MOTION_TRIGGER_LINE_GAP,
+            direction=MOTION_TRIGGER_DIRECTION,
+            directionTol=MOTION_TRIGGER_DIRECTION_TOL,
+            speedMin=MOTION_TRIGGER_SPEED_MIN,
+            speedWindow=MOTION_SPEED_WINDOW if MOTION_SPEED_ON else None,
+        )
+    return TrackState(verbose=verbose)
+
+
+# ------------------------------------------------------------------------------
+def createMotionCounter(verbose=True):
+    """
+    Return the motion_counts.CountStore line crossings are recorded in
+    when MOTION_COUNT_ON otherwise None
+    """
+    if not MOTION_COUNT_ON:
+        return None
+    if motion_counts is None:
+        logging.error("MOTION_COUNT_ON = True Requires File motion_counts.py")
+        logging.error("Exiting %s Due to Error", PROG_NAME)
+        exit(1)
+    if not MOTION_TRIGGER_LINE:
+        logging.error("MOTION_COUNT_ON = True Requires a MOTION_TRIGGER_LINE to count")
+        logging.error("Exiting %s Due to Error", PROG_NAME)
+        exit(1)
+    return motion_counts.CountStore(COUNT_PATH, COUNT_NAME, verbose=verbose)
+
+
+# ------------------------------------------------------------------------------
+def getMotionSpeed(track, verbose=True):
+    """
+    Return the fastest MOTION_SPEED_ON speed in MOTION_SPEED_UNITS the
+    multi tracker measured in its last updateBlobs() call or None if
+    none or all were below MOTION_SPEED_MIN
+    """
+    factor = SPEED_UNIT_FACTORS[MOTION_SPEED_UNITS] / MOTION_SPEED_PX_PER_M
+    fastest = None
+    for stamp, trackId, pxSpeed, box in track.speeds:
+        speed = abs(pxSpeed) * factor
+        if verbose:
+            logging.info(
+                "Speed %.1f %s Track %i Moving %s",
+                speed,
+                MOTION_SPEED_UNITS,
+                trackId,
+                "Right" if pxSpeed > 0 else "Left",
+            )
+        if speed >= MOTION_SPEED_MIN and speed > (fastest or 0.0):
+            fastest = speed
+    return fastest
+
+
+# ------------------------------------------------------------------------------
+def motionWorkerRun(source, conn, verbose=True, publishSec=None):
+    """
+    Motion detection worker process started by MotionWorker.
+    Reads frames from the source shared memory ring and runs motion
+    detection, tracking, crossing counts, the idle governor and stream
+    stats. Sends a compact (reset count, frame id, frame time,
+    motionFound, motionSpeed) record to the main process for each
+    frame processed. A pause command stops reading frames until the
+    next reset so no records pile up while motion is not active.
+    """
+    ring = source.ring
+    # own held frames and read state in the shared rings
+    ring.reader = 1
+    if source.vectorRing is not None:
+        source.vectorRing.reader = 1
+    detector = createMotionDetector(source, verbose=verbose)
+    track = createMotionTracker(verbose=verbose)
+    counter = createMotionCounter(verbose=verbose)
+    governor = StreamGovernor()
+    stats = StreamStats(source, publishSec=publishSec, governor=governor)
+    resetCount = 0
+    needReset = True
+    paused = False
+    frameId = 0
+    gray = None  # bgr stream frames are converted into this buffer
+    while True:
+        while conn.poll():
+            command = conn.recv()
+            if command[0] == "stop":
+                if stats.publishSec > 0:
+                    stats.publish()
+                conn.close()
+                return
+            elif command[0] == "reset":
+                resetCount = command[1]
+                needReset = True
+                paused = False
+            elif command[0] == "pause":
+                resetCount = command[1]
+                paused = True
+        if paused:
+            conn.poll(0.5)  # wait for the next command
+            continue
+        waitSec = 0.5  # check for commands at least this often
+        if track.startTrack:
+            waitSec = min(waitSec, max(track.timeRemaining(source.now()), 0.0))
+        holdSec = min(governor.holdRemaining(source.now()), waitSec)
+        if holdSec > 0 and source.realtime:
+            # Replay not in real time only gets to the next frame time by reading
+            time.sleep(holdSec)
+            waitSec -= holdSec
+        newFrame = ring.read_next(frameId, waitSec, governor.idle)
+        if newFrame is None:
+            # No new frame so only check for track timeout
+            track.updateBlobs(NO_BLOBS, source.now())
+            continue
+        frameId, frameTime, frame = newFrame
+        gray = getStreamGray(frame, gray)
+        if needReset:
+            detector.reset(gray, frameTime)
+            track.reset(frameTime)
+            needReset = False
+            continue
+        if governor.skipFrame(frameTime):
+            detector.skip(gray, frameTime)
+            continue
+        blobs = detector.detectBlobs(gray, frameTime)
+        governor.update(blobs, frameTime)
+        motionFound = track.updateBlobs(blobs, frameTime)
+        if counter is not None:
+            counter.append(track.crossings)
+            motionFound = motionFound and MOTION_COUNT_CAPTURE_ON
+        motionSpeed = None
+        if MOTION_SPEED_ON:
+            motionSpeed = getMotionSpeed(track, verbose=verbose)
+            motionFound = motionSpeed is not None
+        stats.addFrame()
+        stats.checkPublish()
+        conn.send((resetCount, frameId, frameTime, motionFound, motionSpeed))
+
+
+# ------------------------------------------------------------------------------
+class MotionWorker:
     """
-    Process two cropped grayscale images.
-    check for motion and return center point
-    of motion for largest contour.
+    Run motion detection in a separate process so slow image saving,
+    text overlay and file pruning in the main process do not stall
+    it. Frames are shared through the frame source SharedFrameRing
+    and only compact records come back through a pipe. Has the
+    detector reset() so timolo() can use it in place of a detector.
+    Start it before the frame source so the fork has a single thread.
     """
-    movementCenterPoint = []  # initialize list of movementCenterPoints
-    biggestArea = MIN_AREA
-    # Get differences between the two greyed images
-    differenceimage = cv2.absdiff(grayimage1, grayimage2)
-    # Blur difference image to enhance motion vectors
-    differenceimage = cv2.blur(differenceimage, (BLUR_SIZE, BLUR_SIZE))
-    # Get threshold of blurred difference image
-    # based on THRESHOLD_SENSITIVITY variable
-    retval, thresholdimage = cv2.threshold(
-        differenceimage, THRESHOLD_SENSITIVITY, 255, cv2.THRESH_BINARY
-    )
-    try:
-        # opencv2 syntax default
-        contours, hierarchy = cv2.findContours(
-            thresholdimage, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-        )
-    except ValueError:
-        # opencv 3 syntax
-        thresholdimage, contours, hierarchy = cv2.findContours(
-            thresholdimage, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+
+    def __init__(self, source, verbose=True, publishSec=None):
+        if not isinstance(source.ring, SharedFrameRing):
+            logging.error("MotionWorker Requires a SharedFrameRing. Set MOTION_WORKER_ON = True")
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            exit(1)
+        self.source = source
+        self.conn, childConn = multiprocessing.Pipe()
+        # fork so the worker inherits the shared memory and Condition
+        self.process = multiprocessing.get_context("fork").Process(
+            target=motionWorkerRun,
+            args=(source, childConn, verbose, publishSec),
+            name="motion-worker",
         )
-    if contours:
-        for c in contours:
-            cArea = cv2.contourArea(c)
-            if cArea > biggestArea:
-                biggestArea = cArea
-                (x, y, w, h) = cv2.boundingRect(c)
-                cx = int(x + w / 2)  # x center point of contour
-                cy = int(y + h / 2)  # y center point of contour
-                movementCenterPoint = [cx, cy]
-    return movementCenterPoint
+        self.process.daemon = True
+        self.resetCount = 0
+        self.paused = False
+        self.motionFound = False
+        self.motionSpeed = None  # fastest MOTION_SPEED_ON speed since last call
+        self.frameBuf = np.empty_like(source.ring.frames[0])
+        self.processed = 0  # frames processed by the worker
+        self.lastFrameTime = None
+        self.maxGap = 0.0  # longest time between processed frames
+
+    def start(self):
+        """Start the worker process"""
+        self.process.start()
+        logging.info("Motion Detection Worker Process pid=%i", self.process.pid)
+        return self
+
+    def read_next(self, timeout=None):
+        """
+        Wait up to timeout seconds for the worker to process a frame.
+        Return (frame_id, timestamp, frame) for the newest processed
+        frame or None. frame is a copy of that frame or, if its ring
+        slot was already reused, of the newest stream frame and the
+        id and timestamp are those of the frame returned
+        """
+        newest = None
+        if self.conn.poll(timeout):
+            while self.conn.poll():
+                record = self.conn.recv()
+                resetCount, frameId, frameTime, motionFound, motionSpeed = record
+                if resetCount != self.resetCount:
+                    continue  # processed before the last reset
+                if self.lastFrameTime is not None:
+                    self.maxGap = max(self.maxGap, frameTime - self.lastFrameTime)
+                self.lastFrameTime = frameTime
+                self.processed += 1
+                if motionFound:
+                    self.motionFound = True
+                if motionSpeed is not None:
+                    self.motionSpeed = max(motionSpeed, self.motionSpeed or 0.0)
+                newest = (frameId, frameTime)
+        if newest is None:
+            return None
+        ring = self.source.ring
+        frameId = newest[0]
+        frameTime = ring.copyFrame(frameId, self.frameBuf)
+        while frameTime is None:
+            frameId = ring.latestId
+            frameTime = ring.copyFrame(frameId, self.frameBuf)
+        return frameId, frameTime, self.frameBuf
+
+    def getMotionFound(self):
+        """Return True if the worker triggered motion since the last call"""
+        motionFound = self.motionFound
+        self.motionFound = False
+        return motionFound
+
+    def getMotionSpeed(self):
+        """Return the fastest speed the worker measured since the last call"""
+        motionSpeed = self.motionSpeed
+        self.motionSpeed = None
+        return motionSpeed
+
+    def reset(self, gray=None, timestamp=None):
+        """
+        Reset worker detection and tracking from its next frame eg
+        after an image capture. Results from before are ignored
+        """
+        self.resetCount += 1
+        self.paused = False
+        self.motionFound = False
+        self.motionSpeed = None
+        self.lastFrameTime = None
+        self.conn.send(("reset", self.resetCount))
+
+    def pause(self):
+        """
+        Stop worker detection while motion is not active eg night sleep
+        or a schedule wait. Records already sent are from before the
+        pause so are ignored. reset() resumes detection
+        """
+        if self.paused:
+            return
+        self.resetCount += 1
+        self.paused = True
+        self.motionFound = False
+        self.motionSpeed = None
+        self.conn.send(("pause", self.resetCount))
+        self.read_next(timeout=0)  # discard records already sent
+
+    def stop(self):
+        """Stop the worker process"""
+        if self.process.is_alive():
+            self.conn.send(("stop",))
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.terminate()
 
 
 # ------------------------------------------------------------------------------
-def trackMotionDistance(mPoint1, mPoint2):
+def readSettledFrame(vs, warmupSec=0.5):
     """
-    Return the triangulated distance between two tracking locations
+    Start stopped frame source vs and return (frame_id, timestamp, frame)
+    of its newest frame after warmupSec so the camera auto exposure and
+    gain have settled eg before checking daymode. Frames left in the
+    ring from before a stop are never returned
     """
-    x1, y1 = mPoint1
-    x2, y2 = mPoint2
-    trackLen = abs(math.hypot(x2 - x1, y2 - y1))
-    return trackLen
+    startId = vs.ring.latestId
+    vs.start()
+    time.sleep(warmupSec)  # first frames after a cold start are not settled
+    return vs.read_next(startId)
 
 
 # ------------------------------------------------------------------------------
@@ -1798,7 +4834,11 @@ def getStreamPixAve(streamData):
     Calculate the average pixel values for the specified stream
     used for determining day/night or twilight conditions
     """
-    pixAverage = int(np.average(streamData[..., 1]))  # Use 0=red 1=green 2=blue
+    if streamData.ndim == 2:
+        # yuv stream so use luma Y plane view. No conversion required
+        pixAverage = int(np.average(getStreamGray(streamData)))
+    else:
+        pixAverage = int(np.average(streamData[..., 1]))  # Use 0=red 1=green 2=blue
     return pixAverage
 
 
@@ -1907,6 +4947,16 @@ def checkTimer(timer_start, timer_sec):
     return timer_start, timer_expired
 
 
+# ------------------------------------------------------------------------------
+def getTimerRemaining(timer_start, timer_sec):
+    """
+    Return seconds remaining until checkTimer reports the timer expired.
+    Used to sleep the main loop until the next timer is due.
+    """
+    timeDiff = (datetime.datetime.now() - timer_start).total_seconds()
+    return max(timer_sec - timeDiff, 0.0)
+
+
 # ------------------------------------------------------------------------------
 def takeMiniTimelapse(moPath, prefix, NumOn, motionNumCount, currentDayMode, NumPath):
     """
@@ -1953,8 +5003,18 @@ def takeMiniTimelapse(moPath, prefix, NumOn, motionNumCount, currentDayMode, Num
 
 
 # ------------------------------------------------------------------------------
-def takeVideo(filename, duration, vidW=1280, vidH=720, fps=25):
-    """Take a short motion video if required"""
+def takeVideo(filename, duration, vidW=1280, vidH=720, fps=25, stream=None):
+    """
+    Take a short motion video if required.
+    If stream is buffering pre trigger video then save the buffered
+    video plus duration seconds without stopping the stream.
+    """
+    preTrigger = stream is not None and stream.canSaveVideoClip()
+    if not preTrigger and STREAM_SOURCE != "picamera":
+        logging.error("Video Recording Requires STREAM_SOURCE = picamera")
+        return
+    if preTrigger:
+        fps = stream.framerate  # buffer is recorded at stream framerate
     # Working folder for h264 videos
     h264_work = os.path.join(BASE_DIR, "h264_work")
     if not os.path.isdir(h264_work):
@@ -1979,31 +5039,36 @@ def takeVideo(filename, duration, vidW=1280, vidH=720, fps=25):
     logging.info("File : %s", filePath264)
     logging.info("Start: Size %ix%i for %i sec at %i fps", vidW, vidH, duration, fps)
     if MOTION_VIDEO_ON or VIDEO_REPEAT_ON:
-        with picamera.PiCamera() as camera:
-            camera.resolution = (vidW, vidH)
-            camera.vflip = IMAGE_VFLIP
-            camera.hflip = IMAGE_HFLIP
-            # rotation can be used if camera is on side
-            camera.rotation = IMAGE_ROTATION
-            camera.framerate = fps
-            if SHOW_DATE_ON_IMAGE:
-                rightNow = datetime.datetime.now()
-                dateTimeText = " Started at %04d-%02d-%02d %02d:%02d:%02d " % (
-                    rightNow.year,
-                    rightNow.month,
-                    rightNow.day,
-                    rightNow.hour,
-                    rightNow.minute,
-                    rightNow.second,
-                )
-                camera.annotate_text_size = SHOW_TEXT_FONT_SIZE
-                camera.annotate_foreground = picamera.Color("black")
-                camera.annotate_background = picamera.Color("white")
-                camera.annotate_text = dateTimeText
-            camera.start_recording(filePath264)
-            camera.wait_recording(duration)
-            camera.stop_recording()
-            camera.close()
+        if preTrigger:
+            logging.info("Includes %i sec Pre Trigger Video", stream.preTriggerSec)
+            stream.saveVideoClip(filePath264, duration)
+        else:
+            cameraSession.close()
+            with picamera.PiCamera(camera_num=STREAM_CAMERA_NUM) as camera:
+                camera.resolution = (vidW, vidH)
+                camera.vflip = IMAGE_VFLIP
+                camera.hflip = IMAGE_HFLIP
+                # rotation can be used if camera is on side
+                camera.rotation = IMAGE_ROTATION
+                camera.framerate = fps
+                if SHOW_DATE_ON_IMAGE:
+                    rightNow = datetime.datetime.now()
+                    dateTimeText = " Started at %04d-%02d-%02d %02d:%02d:%02d " % (
+                        rightNow.year,
+                        rightNow.month,
+                        rightNow.day,
+                        rightNow.hour,
+                        rightNow.minute,
+                        rightNow.second,
+                    )
+                    camera.annotate_text_size = SHOW_TEXT_FONT_SIZE
+                    camera.annotate_foreground = picamera.Color("black")
+                    camera.annotate_background = picamera.Color("white")
+                    camera.annotate_text = dateTimeText
+                camera.start_recording(filePath264)
+                camera.wait_recording(duration)
+                camera.stop_recording()
+                camera.close()
         # This creates a subprocess that runs MP4Box to convert h264 file
         # to MP4 with the filename as a parameter.  Note this will take
         # some time so MP4Box logging info will be delayed.
@@ -2048,7 +5113,7 @@ def addFilepathSeq(filepath, seq_num):
 
 
 # ------------------------------------------------------------------------------
-def takePantiltSequence(filename, daymode, pix_ave, num_count, num_path):
+def takePantiltSequence(filename, daymode, pix_ave, num_count, num_path, stream=None):
     """
     Take a sequence of images based on a list of pantilt positions and save with
     a sequence number appended to the filename
@@ -2085,9 +5150,9 @@ def takePantiltSequence(filename, daymode, pix_ave, num_count, num_path):
         logging.info("pan_x=%i tilt_y=%i", pan_x, tilt_y)
         time.sleep(PANTILT_SLEEP_SEC)
         if daymode:
-            takeDayImage(seq_filepath, TIMELAPSE_CAM_SLEEP_SEC)
+            takeDayImage(seq_filepath, TIMELAPSE_CAM_SLEEP_SEC, stream)
         else:
-            takeNightImage(seq_filepath, pix_ave)
+            takeNightImage(seq_filepath, pix_ave, stream)
 
         if MOTION_TRACK_PANTILT_SEQ_ON:
             postImageProcessing(
@@ -2139,7 +5204,7 @@ def takePantiltSequence(filename, daymode, pix_ave, num_count, num_path):
 
 
 # ------------------------------------------------------------------------------
-def takePano(pano_seq_num, daymode, pix_ave):
+def takePano(pano_seq_num, daymode, pix_ave, stream=None):
     """
     Take a series of overlapping images using pantilt at specified PANO_CAM_STOPS
     then attempt to stitch the images into one panoramic image. Note this
@@ -2188,9 +5253,9 @@ def takePano(pano_seq_num, daymode, pix_ave):
             time.sleep(0.3)
         time.sleep(PANTILT_SLEEP_SEC)
         if daymode:
-            takeDayImage(pano_filename, TIMELAPSE_CAM_SLEEP_SEC)
+            takeDayImage(pano_filename, TIMELAPSE_CAM_SLEEP_SEC, stream)
         else:
-            takeNightImage(pano_filename, pix_ave)
+            takeNightImage(pano_filename, pix_ave, stream)
         logging.info(
             "Size %ix%i Saved %s at cam_pos(%i, %i)",
             image_width,
@@ -2284,7 +5349,7 @@ def videoRepeat():
             "Video Repeat: Sched Start Set For %s  Please Wait ...", startVideoRepeat
         )
         while not checkSchedStart(startVideoRepeat):
-            pass
+            time.sleep(1)
     videoStartTime = datetime.datetime.now()
     lastSpaceCheck = datetime.datetime.now()
     videoCount = 0
@@ -2355,6 +5420,509 @@ def videoRepeat():
     logging.info("Exit: %i Videos Recorded in Folder %s", videoCount, VIDEO_DIR)
 
 
+# ------------------------------------------------------------------------------
+MOTION_TUNE_PARAMS = (
+    "MOTION_TRACK_TRIG_LEN",
+    "MOTION_TRACK_MIN_AREA",
+    "MOTION_TRACK_TIMEOUT_SEC",
+    "MOTION_DETECTOR",
+    "MOTION_BLOB_METHOD",
+    "MOTION_TRACKER",
+    "MOTION_TRACK_MATCH_DIST",
+    "MOTION_TRACK_KALMAN_ON",
+    "MOTION_TRACK_KALMAN_MEASURE_STD",
+    "MOTION_TRACK_KALMAN_ACCEL_STD",
+    "MOTION_TRIGGER_DIRECTION",
+    "MOTION_TRIGGER_SPEED_MIN",
+    "MOTION_BG_ALPHA",
+    "MOTION_BG_SIGMA",
+    "MOTION_BG_MIN_STD",
+    "MOTION_VECTOR_MAGNITUDE",
+    "MOTION_VECTOR_SAD_MAX",
+    "MOTION_VECTOR_MIN_CELLS",
+    "BLUR_SIZE",
+    "THRESHOLD_SENSITIVITY",
+    "MOTION_AUTO_THRESHOLD_ON",
+    "MOTION_AUTO_THRESHOLD_K",
+    "MOTION_LIGHT_CHECK_ON",
+    "MOTION_LIGHT_MEAN_DIFF",
+    "MOTION_LIGHT_HIST_CORREL",
+    "MOTION_DENOISE_DAY_FRAMES",
+    "MOTION_DENOISE_NIGHT_FRAMES",
+)
+
+
+def motionTuneRun(job):
+    """
+    Worker process for motionTune. Replay footage as fast as possible
+    through motion tracking using one parameter set and return a dict
+    of trigger count, frame count and seconds spent in each stage.
+    """
+    path, params = job
+    # Each worker is a separate process so module settings can be changed
+    globals().update(params)
+    setDerivedSettings()
+    track = createMotionTracker(verbose=False)
+    source = ReplayStream(path=path, realtime=False)
+    source.openSource()
+    detector = createMotionDetector(source, verbose=False)
+    stageSec = {"decode": 0.0, "convert": 0.0, "detect": 0.0, "track": 0.0}
+    triggers = 0
+    gray = None  # bgr stream frames are converted into this buffer
+    startTime = time.time()
+    while True:
+        t0 = time.time()
+        image = source.readImage()
+        t1 = time.time()
+        stageSec["decode"] += t1 - t0
+        if image is None:
+            break
+        # Same stream size and format conversion as a live stream
+        frameTime = source.frameNum / source.replayFps
+        source.readVectors(frameTime)
+        source.putImage(image, frameTime)
+        gray = getStreamGray(source.ring.latest(), gray)
+        t2 = time.time()
+        stageSec["convert"] += t2 - t1
+        if source.frameNum == 1:
+            detector.reset(gray, frameTime)
+            blobs = NO_BLOBS
+        else:
+            blobs = detector.detectBlobs(gray, frameTime)
+        t3 = time.time()
+        stageSec["detect"] += t3 - t2
+        if track.updateBlobs(blobs, frameTime):
+            triggers += 1
+        stageSec["track"] += time.time() - t3
+    return {
+        "params": params,
+        "frames": source.frameNum,
+        "footageSec": source.frameNum / source.replayFps,
+        "triggers": triggers,
+        "seconds": time.time() - startTime,
+        "stageSec": stageSec,
+    }
+
+
+# ------------------------------------------------------------------------------
+def motionTune(path, workers=MOTION_TUNE_WORKERS):
+    """
+    Replay recorded footage through motion tracking once for every
+    combination of MOTION_TUNE_GRID values using parallel worker
+    processes. Report triggers, fps and per stage time for each set.
+    """
+    for key in MOTION_TUNE_GRID:
+        if key not in MOTION_TUNE_PARAMS:
+            logging.error("Invalid MOTION_TUNE_GRID key %s", key)
+            logging.error("Valid keys are %s", ", ".join(MOTION_TUNE_PARAMS))
+            logging.error("Exiting %s Due to Error", PROG_NAME)
+            sys.exit(1)
+    keys = sorted(MOTION_TUNE_GRID.keys())
+    paramSets = [
+        dict(zip(keys, values))
+        for values in itertools.product(*[MOTION_TUNE_GRID[key] for key in keys])
+    ]
+    if workers < 1:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(paramSets))
+    logging.info(
+        "Tune %i Parameter Sets with %s Using %i Worker Processes",
+        len(paramSets),
+        path,
+        workers,
+    )
+    startTime = time.time()
+    jobs = [(path, params) for params in paramSets]
+    if workers > 1:
+        pool = multiprocessing.Pool(processes=workers)
+        try:
+            results = pool.map(motionTuneRun, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [motionTuneRun(job) for job in jobs]
+    print(HORIZ_LINE)
+    print("Set Triggers    fps  ms/frame decode convert detect track  Parameters")
+    for setNum, result in enumerate(results, 1):
+        frames = max(result["frames"], 1)
+        stageMs = result["stageSec"]
+        print(
+            "%3i %8i %6.1f  %8.2f %6.2f %7.2f %6.2f %5.2f  %s"
+            % (
+                setNum,
+                result["triggers"],
+                result["frames"] / max(result["seconds"], 0.001),
+                result["seconds"] * 1000.0 / frames,
+                stageMs["decode"] * 1000.0 / frames,
+                stageMs["convert"] * 1000.0 / frames,
+                stageMs["detect"] * 1000.0 / frames,
+                stageMs["track"] * 1000.0 / frames,
+                " ".join(
+                    "%s=%s" % (key, result["params"][key]) for key in keys
+                ),
+            )
+        )
+    print(HORIZ_LINE)
+    totalSec = time.time() - startTime
+    footageSec = results[0]["footageSec"] if results else 0.0
+    logging.info(
+        "Tuned %i Frames (%.1f sec of footage) x %i Sets in %.1f sec (%.1fx real time overall)",
+        results[0]["frames"] if results else 0,
+        footageSec,
+        len(results),
+        totalSec,
+        footageSec * len(results) / max(totalSec, 0.001),
+    )
+
+
+# ------------------------------------------------------------------------------
+def motionBenchPost(source, filename):
+    """
+    Heavy post processing like a motion image capture. Save a max
+    camera resolution still from the stream then add a text overlay
+    the same way as writeTextToImage
+    """
+    image = cv2.resize(
+        getStreamBGR(source.ring.latest()), (imageWidthMax, imageHeightMax)
+    )
+    cv2.imwrite(filename, image)
+    img = Image.open(filename)
+    ImageDraw.Draw(img).text((10, 10), filename, (255, 255, 255))
+    img.save(filename)
+
+
+# ------------------------------------------------------------------------------
+def generateTestFootage(source, count=300):
+    """
+    Return count stream frames of generated footage in the format of
+    source. Fixed seed sensor noise over a textured scene with two
+    boxes crossing in opposite directions and a flickering patch like
+    a tree in the wind. Needs no camera or footage file
+    """
+    width, height = source.resolution
+    rng = np.random.RandomState(1)
+    scene = rng.randint(60, 200, (height, width, 3)).astype(np.float32)
+    boxWidth, boxHeight = max(8, width // 10), max(8, height // 8)
+    footage = []
+    for frameNum in range(count):
+        image = np.clip(scene + rng.normal(0, 3, scene.shape), 0, 255)
+        image = image.astype(np.uint8)
+        x = frameNum * (width + boxWidth) // count - boxWidth
+        y = height // 4
+        cv2.rectangle(image, (x, y), (x + boxWidth, y + boxHeight), (240, 240, 240), -1)
+        x = width - x - boxWidth
+        y = height // 2
+        cv2.rectangle(image, (x, y), (x + boxWidth, y + boxHeight), (20, 20, 20), -1)
+        if frameNum % 3:
+            center = (width * 3 // 4, height * 3 // 4)
+            cv2.circle(image, center, max(4, height // 10), (30, 120, 30), -1)
+        source.putImage(image)
+        footage.append(source.ring.latest().copy())
+    return footage
+
+
+# ------------------------------------------------------------------------------
+def motionAllocCheck(path=None, frames=10000, maxFootage=300):
+    """
+    Loop stream frames through gray conversion, motion detection and
+    tracking for frames frames with tracemalloc running. Frames are
+    up to maxFootage frames of the path footage or, with no path,
+    generateTestFootage(). Return True if memory did not grow and no
+    frame sized array was allocated.
+    Growth under 1 KB is allowed. Exact zero is not possible since the
+    trackers keep positions as python ints and floats, which only use
+    memory outside the -5 to 256 small int cache, and numpy keeps small
+    freed arrays eg findContours results for reuse. Both change by a
+    few dozen bytes with the values and blob counts of the last frames
+    while a leak of one byte per frame would exceed 1 KB.
+    """
+    if tracemalloc is None or not hasattr(tracemalloc, "reset_peak"):
+        logging.warning("Allocation Check Skipped. Requires python3.9+ tracemalloc")
+        return True
+    if path is None:
+        if MOTION_DETECTOR == "vectors":
+            logging.warning(
+                "Allocation Check Skipped. MOTION_DETECTOR = vectors needs"
+                " --bench footage with motion vectors"
+            )
+            return True
+        source = FrameSource()
+        footage = generateTestFootage(source, maxFootage)
+        path = "Generated Footage"
+    else:
+        source = ReplayStream(path=path, realtime=False)
+        source.openSource()
+        footage = []
+        while len(footage) < maxFootage:
+            image = source.readImage()
+            if image is None:
+                break
+            source.putImage(image)
+            footage.append(source.ring.latest().copy())
+        source.stop()
+    if len(footage) < 2:
+        logging.error("Need at least 2 Frames for Allocation Check of %s", path)
+        return False
+    detector = createMotionDetector(source, verbose=False)
+    track = createMotionTracker(verbose=False)
+    # Whole footage loops so the check ends at the same frame it starts
+    loops = max(1, int(math.ceil(frames / float(len(footage)))))
+    frames = loops * len(footage)
+
+    def runFrames(count, startNum, gray):
+        for frameNum in range(startNum, startNum + count):
+            gray = getStreamGray(footage[frameNum % len(footage)], gray)
+            frameTime = frameNum * 0.05
+            if frameNum == 0:
+                detector.reset(gray, frameTime)
+            else:
+                track.updateBlobs(detector.detectBlobs(gray, frameTime), frameTime)
+        return gray
+
+    # First pass allocates buffers and lets opencv size its outputs
+    gray = runFrames(len(footage), 0, None)
+    tracemalloc.start()
+    try:
+        gray = runFrames(len(footage), len(footage), gray)  # warm up with tracing
+        startBytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        gray = runFrames(frames, 2 * len(footage), gray)
+        endBytes, peakBytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    growth = endBytes - startBytes
+    peak = peakBytes - startBytes
+    frameBytes = gray.size
+    passed = growth < 1024 and peak < frameBytes
+    logging.info(
+        "Allocation Check %s: %i Frames  Growth=%i bytes  Peak=%i bytes"
+        " (Frame %ix%i is %i bytes)",
+        "Passed" if passed else "FAILED",
+        frames,
+        growth,
+        peak,
+        gray.shape[1],
+        gray.shape[0],
+        frameBytes,
+    )
+    return passed
+
+
+# ------------------------------------------------------------------------------
+def motionDenoiseBench(path, loops=3, maxFootage=300):
+    """
+    Print the per frame cost of the existing BLUR_SIZE difference
+    image blur and of a TemporalFilter median of 3, 5, 7 and the
+    configured MOTION_DENOISE frames on the footage ROI crops.
+    Up to maxFootage frames are held in memory.
+    """
+    source = ReplayStream(path=path, realtime=False)
+    source.openSource()
+    crops = []
+    gray = None
+    roi = None
+    while len(crops) < maxFootage:
+        image = source.readImage()
+        if image is None:
+            break
+        source.putImage(image)
+        gray = getStreamGray(source.ring.latest(), gray)
+        if roi is None:
+            roi = getMotionRoi(gray.shape)
+        crops.append((roi.crop(gray).copy(), gray.copy()))
+    source.stop()
+    if len(crops) < 2:
+        logging.error("Need at least 2 Frames for Denoise Bench of %s", path)
+        return
+    difference = np.empty(crops[0][0].shape, dtype=np.uint8)
+    blurred = np.empty(crops[0][0].shape, dtype=np.uint8)
+    blurSec = 0.0
+    for loop in range(loops):
+        for i in range(1, len(crops)):
+            cv2.absdiff(crops[i - 1][0], crops[i][0], dst=difference)
+            startTime = time.time()
+            cv2.blur(difference, (BLUR_SIZE, BLUR_SIZE), dst=blurred)
+            blurSec += time.time() - startTime
+    blurUs = blurSec * 1000000.0 / (loops * (len(crops) - 1))
+    depths = set((3, 5, 7, MOTION_DENOISE_DAY_FRAMES, MOTION_DENOISE_NIGHT_FRAMES))
+    print(HORIZ_LINE)
+    print("Denoise %ix%i Crops        us/frame  x Blur" % crops[0][0].shape[::-1])
+    print("Blur BLUR_SIZE=%-2i        %10.0f %7.1f" % (BLUR_SIZE, blurUs, 1.0))
+    for depth in sorted(d for d in depths if d > 1):
+        denoise = TemporalFilter(dayFrames=depth, nightFrames=depth, verbose=False)
+        denoise.reset(crops[0][0], crops[0][1])
+        startTime = time.time()
+        for loop in range(loops):
+            for crop, gray in crops:
+                denoise.filter(crop, gray)
+        medianUs = (time.time() - startTime) * 1000000.0 / (loops * len(crops))
+        print(
+            "Temporal Median %2i Frames %10.0f %7.1f"
+            % (depth, medianUs, medianUs / max(blurUs, 0.001))
+        )
+    print(HORIZ_LINE)
+
+
+# ------------------------------------------------------------------------------
+def motionBench(path):
+    """
+    Replay footage in real time with motion detection in the main
+    process and then in a MotionWorker process while the main process
+    runs heavy post processing back to back. Report processed fps,
+    dropped frames and the longest detection stall for each.
+    Then compare the temporal denoise cost with the blur and check
+    the detection loop does not allocate memory.
+    Return True if the allocation check passed.
+    """
+    global MOTION_WORKER_ON
+    makeMediaDir(DATA_DIR)
+    benchFile = os.path.join(DATA_DIR, "bench.jpg")
+    results = []
+    for workerOn in (False, True):
+        MOTION_WORKER_ON = workerOn
+        source = ReplayStream(path=path, realtime=True)
+        worker = None
+        if workerOn:
+            # Start before the source thread so the fork has a single thread
+            worker = MotionWorker(source, verbose=False, publishSec=0).start()
+        else:
+            detector = createMotionDetector(source, verbose=False)
+            track = createMotionTracker(verbose=False)
+        logging.info(
+            "Bench Detection in %s Process with %s",
+            "Worker" if workerOn else "Main",
+            path,
+        )
+        source.start()
+        frameId = 0
+        processed = 0
+        posts = 0
+        gray = None
+        lastFrameTime = None
+        maxGap = 0.0
+        startTime = time.time()
+        while not source.finished:
+            if not source.canTakeStill(True):
+                time.sleep(0.05)  # wait for the first frame
+                continue
+            if worker is not None:
+                worker.read_next(timeout=0)  # collect worker records
+            else:
+                newFrame = source.read_next(frameId, timeout=0.5)
+                if newFrame is None:
+                    continue
+                frameId, frameTime, frame = newFrame
+                gray = getStreamGray(frame, gray)
+                if lastFrameTime is None:
+                    detector.reset(gray, frameTime)
+                else:
+                    track.updateBlobs(detector.detectBlobs(gray, frameTime), frameTime)
+                    maxGap = max(maxGap, frameTime - lastFrameTime)
+                lastFrameTime = frameTime
+                processed += 1
+            motionBenchPost(source, benchFile)
+            posts += 1
+        benchSec = time.time() - startTime
+        if worker is not None:
+            worker.read_next(timeout=0.5)  # last records
+            worker.stop()
+            processed = worker.processed
+            maxGap = worker.maxGap
+        source.stop()
+        results.append(
+            (
+                "worker" if workerOn else "main",
+                source.ring.latestId,
+                processed,
+                processed / max(benchSec, 0.001),
+                source.ring.dropped,
+                maxGap * 1000.0,
+                posts,
+            )
+        )
+    if os.path.isfile(benchFile):
+        os.remove(benchFile)
+    print(HORIZ_LINE)
+    print("Detection  Frames  Processed    fps  Dropped  Max Gap ms  Posts")
+    for result in results:
+        print("%-9s %7i %10i %6.1f %8i %11.0f %6i" % result)
+    print(HORIZ_LINE)
+    logging.info(
+        "Posts are back to back %ix%i still saves with text overlay in the main process",
+        imageWidthMax,
+        imageHeightMax,
+    )
+    MOTION_WORKER_ON = False
+    motionDenoiseBench(path)
+    return motionAllocCheck(path)
+
+
+# ------------------------------------------------------------------------------
+def motionCountReport(period):
+    """
+    Print MOTION_COUNT_ON line crossing totals for each day of period
+    YYYY-MM or YYYY-MM-DD and the crossings per hour of day summed
+    over the period. One report per CAMERAS entry.
+    Return False if period is not valid.
+    """
+    try:
+        if len(period) == 7:
+            firstDay = datetime.datetime.strptime(period, "%Y-%m").date()
+            nextMonth = (firstDay + datetime.timedelta(days=31)).replace(day=1)
+            lastDay = nextMonth - datetime.timedelta(days=1)
+        else:
+            firstDay = lastDay = datetime.datetime.strptime(period, "%Y-%m-%d").date()
+    except ValueError:
+        logging.error("--counts %s Must be YYYY-MM or YYYY-MM-DD", period)
+        return False
+    if motion_counts is None:
+        logging.error("--counts Requires File motion_counts.py")
+        return False
+    names = [COUNT_NAME]
+    if CAMERAS:
+        names = [
+            BASE_FILENAME + "-" + getCameraName(cameraNum, cameraSettings)
+            for cameraNum, cameraSettings in enumerate(CAMERAS)
+        ]
+    if not os.path.isdir(COUNT_PATH):
+        logging.warning("No Count Files Found. Folder %s Does Not Exist", COUNT_PATH)
+        return True
+    for name in names:
+        store = motion_counts.CountStore(COUNT_PATH, name, verbose=False)
+        startTime = time.time()
+        counts = store.hourlyCounts(firstDay, lastDay)
+        queryMs = (time.time() - startTime) * 1000.0
+        days = motion_counts.dayRange(firstDay, lastDay)
+        print(HORIZ_LINE)
+        print(
+            "%s Line Crossings %s to %s  Query %.1f ms"
+            % (name, firstDay, lastDay, queryMs)
+        )
+        print("Day            A-B     B-A   Total  Busiest Hour")
+        for day, dayCounts in zip(days, counts):
+            dayTotals = dayCounts.sum(axis=0)
+            if dayTotals.sum():
+                busiest = "%02i:00" % dayCounts.sum(axis=1).argmax()
+            else:
+                busiest = "-"
+            print(
+                "%s %7i %7i %7i  %s"
+                % (day, dayTotals[0], dayTotals[1], dayTotals.sum(), busiest)
+            )
+        totals = counts.sum(axis=(0, 1))
+        print("Total      %7i %7i %7i" % (totals[0], totals[1], totals.sum()))
+        print("")
+        print("Hour           A-B     B-A   Total")
+        for hour, hourCounts in enumerate(counts.sum(axis=0)):
+            print(
+                "%02i:00      %7i %7i %7i"
+                % (hour, hourCounts[0], hourCounts[1], hourCounts.sum())
+            )
+    print(HORIZ_LINE)
+    return True
+
+
 # ------------------------------------------------------------------------------
 def timolo():
     """
@@ -2391,7 +5959,6 @@ def timolo():
     timelapseExitStart = datetime.datetime.now()
     startTL = getSchedStart(TIMELAPSE_START_AT)
     startMO = getSchedStart(MOTION_START_AT)
-    trackLen = 0.0
     if SPACE_TIMER_HOURS > 0:
         lastSpaceCheck = datetime.datetime.now()
     if TIMELAPSE_ON:
@@ -2409,12 +5976,22 @@ def timolo():
     else:
         logging.warning("Timelapse is Suppressed per TIMELAPSE_ON=%s", TIMELAPSE_ON)
         stop_timelapse = True
+    worker = None  # MotionWorker process if MOTION_WORKER_ON
     if MOTION_TRACK_ON:
-        logging.info("Start PiVideoStream ....")
-        vs = PiVideoStream().start()
-        vs.camera.rotation = IMAGE_ROTATION
-        vs.camera.hflip = IMAGE_HFLIP
-        vs.camera.vflip = IMAGE_VFLIP
+        logging.info("Start %s Video Stream ....", STREAM_SOURCE)
+        if MOTION_VIDEO_ON and MOTION_VIDEO_PRETRIGGER_SEC > 0:
+            preTriggerSec = MOTION_VIDEO_PRETRIGGER_SEC
+        else:
+            preTriggerSec = 0
+        vs = createFrameSource(
+            rotation=IMAGE_ROTATION,
+            hflip=IMAGE_HFLIP,
+            vflip=IMAGE_VFLIP,
+            preTriggerSec=preTriggerSec,
+        )
+        if MOTION_WORKER_ON:
+            worker = MotionWorker(vs).start()
+        vs.start()
         time.sleep(2)
         mostr = "Motion Tracking"
         # Check if motion subDirs required and
@@ -2425,19 +6002,25 @@ def timolo():
         if MOTION_NUM_ON:
             motionNumCount = getCurrentCount(NUM_PATH_MOTION, MOTION_NUM_START)
             moCnt = str(motionNumCount)
-        trackTimeout = time.time()
-        trackTimer = TRACK_TIMEOUT
-        startPos = []
-        startTrack = False
-        image1 = vs.read()
-        image2 = vs.read()
+        track = createMotionTracker()
+        # Worker process records the crossing counts if MOTION_WORKER_ON
+        counter = createMotionCounter()
+        detector = createMotionDetector(vs)
+        governor = StreamGovernor()
+        stats = StreamStats(vs, governor=governor)
+        if worker is not None:
+            # Detection and tracking run in the worker process
+            detector = worker
+        frameId, frameTime, image2 = vs.read_next(0)
         pixAve = getStreamPixAve(image2)
-        grayimage1 = cv2.cvtColor(image1, cv2.COLOR_BGR2GRAY)
+        # bgr stream frames are converted into this buffer each frame
+        gray = getStreamGray(image2)
+        detector.reset(gray, frameTime)
         daymode = checkIfDayStream(daymode, image2)
     else:
-        vs = PiVideoStream().start()
-        time.sleep(0.5)
-        image2 = vs.read()  # use video stream to check for pixAve & daymode
+        vs = createFrameSource()
+        # use video stream to check for pixAve & daymode
+        frameId, frameTime, image2 = readSettledFrame(vs)
         pixAve = getStreamPixAve(image2)
         daymode = checkIfDayStream(daymode, image2)
         vs.stop()
@@ -2484,6 +6067,7 @@ def timolo():
     firstTimeLapse = True  # Force a timelapse on startup
     while True:  # Start main program Loop.
         motionFound = False
+        motionSpeed = None  # MOTION_SPEED_ON speed measured this loop
         if (
             MOTION_TRACK_ON
             and (not MOTION_NUM_RECYCLE_ON)
@@ -2519,33 +6103,96 @@ def timolo():
             logging.warning("Delete appropriate .dat File(s) to Reset Counter(s)")
             logging.warning("Exiting %s %s \n", PROG_NAME, PROG_VER)
             sys.exit(1)
+        # Block until a new stream frame arrives or the next timer is due
+        # rather than spinning the cpu.  Only timers that can fire are used.
+        motionActive = (
+            MOTION_TRACK_ON
+            and takeMotion
+            and (not stopMotion)
+            and checkSchedStart(startMO)
+            and not timeToSleep(daymode)
+        )
+        waitList = [getTimerRemaining(pix_ave_timer, IMAGE_PIX_AVE_TIMER_SEC)]
+        if SPACE_TIMER_HOURS > 0:
+            waitList.append(
+                getTimerRemaining(lastSpaceCheck, SPACE_TIMER_HOURS * 3600)
+            )
+        if not timeToSleep(daymode):
+            if TIMELAPSE_ON and not stop_timelapse:
+                if not checkSchedStart(startTL):
+                    waitList.append(
+                        (startTL - datetime.datetime.now()).total_seconds()
+                    )
+                elif firstTimeLapse:
+                    waitList.append(0.0)
+                else:
+                    waitList.append(
+                        getTimerRemaining(timelapse_timer, TIMELAPSE_TIMER_SEC)
+                    )
+            if PANTILT_ON and PANTILT_SEQ_ON:
+                waitList.append(
+                    getTimerRemaining(pantilt_seq_timer, PANTILT_SEQ_TIMER_SEC)
+                )
+            if PANTILT_ON and PANO_ON:
+                if first_pano:
+                    waitList.append(0.0)
+                else:
+                    waitList.append(getTimerRemaining(pano_timer, PANO_TIMER_SEC))
+            if MOTION_TRACK_ON and not checkSchedStart(startMO):
+                waitList.append((startMO - datetime.datetime.now()).total_seconds())
+        if motionActive:
+            if MOTION_FORCE_SEC > 0:
+                waitList.append(
+                    getTimerRemaining(motion_force_timer, MOTION_FORCE_SEC)
+                )
+            if track.startTrack:
+                waitList.append(track.timeRemaining(vs.now()))
+        waitSec = max(min(waitList), 0.0)
+        if worker is not None:
+            if not motionActive:
+                worker.pause()
+            elif worker.paused:
+                # Resume from the newest frame. Older records are ignored
+                worker.reset()
+        if motionActive and worker is not None:
+            newFrame = worker.read_next(timeout=waitSec)
+        elif motionActive:
+            # Idle stream governor waits until its next frame is due
+            holdSec = min(governor.holdRemaining(vs.now()), waitSec)
+            if holdSec > 0 and vs.realtime:
+                time.sleep(holdSec)
+                waitSec -= holdSec
+            newFrame = vs.read_next(frameId, timeout=waitSec, skip=governor.idle)
+        else:
+            newFrame = None
+            time.sleep(waitSec)
+        if vs.finished:
+            logging.info("%s Frame Source Finished.", STREAM_SOURCE)
+            if worker is not None:
+                worker.stop()  # worker publishes its stats
+            elif MOTION_TRACK_ON:
+                stats.publish()
+            logging.info("Exiting %s %s", PROG_NAME, PROG_VER)
+            break
         # if required check free disk space and delete older files (jpg)
         if SPACE_TIMER_HOURS > 0:
             lastSpaceCheck = freeDiskSpaceCheck(lastSpaceCheck)
         # check the timer for measuring pixel average of stream image frame
         pix_ave_timer, take_pix_ave = checkTimer(pix_ave_timer, IMAGE_PIX_AVE_TIMER_SEC)
-        # use image2 to check daymode as image1 may be average
-        # that changes slowly, and image1 may not be updated
+        # use most recent stream frame image2 to check daymode.
+        # Note daymode is only updated when the pix ave timer expires.
         if take_pix_ave:
+            if not MOTION_TRACK_ON:
+                if cameraSession.profile == "day":
+                    # Still camera is open in auto exposure so use it
+                    # rather than closing it to restart the stream
+                    image2 = cameraSession.readStreamFrame()
+                else:
+                    # No motion stream running so grab a frame to check daymode
+                    frameId, frameTime, image2 = readSettledFrame(vs)
+                    vs.stop()
             pixAve = getStreamPixAve(image2)
             daymode = checkIfDayStream(daymode, image2)
-            if daymode != checkIfDayStream(daymode, image2):
-                daymode = not daymode
-        if MOTION_TRACK_ON:
-            if daymode != checkIfDayStream(daymode, image2):
-                daymode = not daymode
-                image2 = vs.read()
-                image1 = image2
-            else:
-                image2 = vs.read()
-        elif TIMELAPSE_ON:
-            vs = PiVideoStream().start()
-            time.sleep(0.5)
-            image2 = vs.read()  # use video stream to check for daymode
-            vs.stop()
-
-        if not daymode and TIMELAPSE_ON:
-            time.sleep(0.02)  # short delay to aviod high cpu usage at night
         # Don't take images if IMAGE_NO_NIGHT_SHOTS
         # or IMAGE_NO_DAY_SHOTS settings are True
         if not timeToSleep(daymode):
@@ -2555,7 +6202,7 @@ def timolo():
                     pantilt_seq_timer, PANTILT_SEQ_TIMER_SEC
                 )
                 if take_pantilt_sequence:
-                    if MOTION_TRACK_ON:
+                    if MOTION_TRACK_ON and not vs.canTakeStill(daymode):
                         vs.stop()
                         time.sleep(STREAM_STOP_SEC)
                     seq_prefix = PANTILT_SEQ_IMAGE_PREFIX + IMAGE_NAME_PREFIX
@@ -2569,14 +6216,22 @@ def timolo():
                         seq_num_count,
                     )
                     seq_num_count = takePantiltSequence(
-                        filename, daymode, pixAve, seq_num_count, NUM_PATH_PANTILT_SEQ
+                        filename,
+                        daymode,
+                        pixAve,
+                        seq_num_count,
+                        NUM_PATH_PANTILT_SEQ,
+                        vs,
                     )
                     if MOTION_TRACK_ON:
-                        vs = PiVideoStream().start()
-                        vs.camera.rotation = IMAGE_ROTATION
-                        vs.camera.hflip = IMAGE_HFLIP
-                        vs.camera.vflip = IMAGE_VFLIP
-                        time.sleep(1)  # Allow camera to warm up and stream to start
+                        if vs.stopped:
+                            vs.start()
+                            time.sleep(1)  # Allow camera to warm up and stream to start
+                        # camera has moved so get a new motion reference frame
+                        frameId, frameTime, image2 = vs.read_next(frameId)
+                        gray = getStreamGray(image2, gray)
+                        detector.reset(gray, frameTime)
+                        newFrame = None
                     next_seq_time = pantilt_seq_timer + datetime.timedelta(
                         seconds=PANTILT_SEQ_TIMER_SEC
                     )
@@ -2699,16 +6354,16 @@ def timolo():
                         tlPath, tl_prefix, TIMELAPSE_NUM_ON, timelapseNumCount
                     )
 
-                    if MOTION_TRACK_ON:
+                    if MOTION_TRACK_ON and not vs.canTakeStill(daymode):
                         logging.info("Stop Motion Tracking PiVideoStream ...")
                         vs.stop()
                         time.sleep(STREAM_STOP_SEC)
                     # Time to take a Day or Night Time Lapse Image
 
                     if daymode:
-                        takeDayImage(filename, TIMELAPSE_CAM_SLEEP_SEC)
+                        takeDayImage(filename, TIMELAPSE_CAM_SLEEP_SEC, vs)
                     else:
-                        takeNightImage(filename, pixAve)
+                        takeNightImage(filename, pixAve, vs)
                     timelapseNumCount = postImageProcessing(
                         TIMELAPSE_NUM_ON,
                         TIMELAPSE_NUM_START,
@@ -2724,12 +6379,14 @@ def timolo():
                     )
 
                     if MOTION_TRACK_ON:
-                        logging.info("Restart Motion Tracking PiVideoStream ....")
-                        vs = PiVideoStream().start()
-                        vs.camera.rotation = IMAGE_ROTATION
-                        vs.camera.hflip = IMAGE_HFLIP
-                        vs.camera.vflip = IMAGE_VFLIP
-                        time.sleep(1)  # Allow camera to warm up and stream to start
+                        if vs.stopped:
+                            logging.info("Restart Motion Tracking PiVideoStream ....")
+                            vs.start()
+                            time.sleep(1)  # Allow camera to warm up and stream to start
+                        frameId, frameTime, image2 = vs.read_next(frameId)
+                        gray = getStreamGray(image2, gray)
+                        detector.reset(gray, frameTime)
+                        newFrame = None
                     if TIMELAPSE_MAX_FILES > 0:
                         deleteOldFiles(TIMELAPSE_MAX_FILES, TIMELAPSE_DIR, tl_prefix)
                     dotCount = showDots(MOTION_DOTS_MAX)
@@ -2760,90 +6417,44 @@ def timolo():
             ):
                 # IMPORTANT - Night motion tracking may not work very well
                 #             due to long exposure times and low light
-                image2 = vs.read()
-                grayimage2 = cv2.cvtColor(image2, cv2.COLOR_BGR2GRAY)
-                movePoint1 = getMotionTrackPoint(grayimage1, grayimage2)
-                grayimage1 = grayimage2
-                if movePoint1 and not startTrack:
-                    startTrack = True
-                    trackTimeout = time.time()
-                    startPos = movePoint1
-                image2 = vs.read()
-                grayimage2 = cv2.cvtColor(image2, cv2.COLOR_BGR2GRAY)
-                movePoint2 = getMotionTrackPoint(grayimage1, grayimage2)
-                if movePoint2 and startTrack:  # Two sets of movement required
-                    trackLen = trackMotionDistance(startPos, movePoint2)
-                    # wait until track well started
-                    if trackLen > TRACK_TRIG_LEN_MIN:
-                        # Reset tracking timer object moved
-                        trackTimeout = time.time()
-                        if MOTION_TRACK_INFO_ON:
-                            logging.info(
-                                "Track Progress From(%i,%i) To(%i,%i) trackLen=%i/%i px",
-                                startPos[0],
-                                startPos[1],
-                                movePoint2[0],
-                                movePoint2[1],
-                                trackLen,
-                                TRACK_TRIG_LEN,
-                            )
-                    # Track length triggered
-                    if trackLen >= TRACK_TRIG_LEN:
-                        # reduce chance of two objects at different positions
-                        if trackLen >= TRACK_TRIG_LEN_MAX:
-                            motionFound = False
-                            if MOTION_TRACK_INFO_ON:
-                                logging.info(
-                                    "TrackLen %i px Exceeded %i px Max Trig Len Allowed.",
-                                    trackLen,
-                                    TRACK_TRIG_LEN_MAX,
-                                )
+                # Only process a frame newer than the last one processed
+                if worker is not None:
+                    # Worker process did detection and tracking
+                    if newFrame is not None:
+                        frameId, frameTime, image2 = newFrame
+                    motionFound = worker.getMotionFound()
+                    motionSpeed = worker.getMotionSpeed()
+                else:
+                    frameProcessed = False
+                    if newFrame is not None:
+                        frameId, frameTime, image2 = newFrame
+                        if governor.skipFrame(frameTime):
+                            # Idle rate so frame only kept for the next compare
+                            gray = getStreamGray(image2, gray)
+                            detector.skip(gray, frameTime)
+                            blobs = NO_BLOBS
                         else:
-                            motionFound = True
-                            if PLUGIN_ON:
-                                logging.info(
-                                    "%s Motion Triggered Start(%i,%i)"
-                                    "  End(%i,%i) trackLen=%.i/%i px",
-                                    PLUGIN_NAME,
-                                    startPos[0],
-                                    startPos[1],
-                                    movePoint2[0],
-                                    movePoint2[1],
-                                    trackLen,
-                                    TRACK_TRIG_LEN,
-                                )
-                            else:
-                                logging.info(
-                                    "Motion Triggered Start(%i,%i)"
-                                    "  End(%i,%i) trackLen=%i/%i px",
-                                    startPos[0],
-                                    startPos[1],
-                                    movePoint2[0],
-                                    movePoint2[1],
-                                    trackLen,
-                                    TRACK_TRIG_LEN,
-                                )
-                            print("")
-                        image1 = vs.read()
-                        image2 = image1
-                        grayimage1 = cv2.cvtColor(image1, cv2.COLOR_BGR2GRAY)
-                        grayimage2 = grayimage1
-                        startTrack = False
-                        startPos = []
-                        trackLen = 0.0
-                # Track timed out
-                if (time.time() - trackTimeout > trackTimer) and startTrack:
-                    image1 = vs.read()
-                    image2 = image1
-                    grayimage1 = cv2.cvtColor(image1, cv2.COLOR_BGR2GRAY)
-                    grayimage2 = grayimage1
-                    if MOTION_TRACK_ON and MOTION_TRACK_INFO_ON:
-                        logging.info(
-                            "Track Timer %.2f sec Exceeded. Reset Track", trackTimer
-                        )
-                    startTrack = False
-                    startPos = []
-                    trackLen = 0.0
+                            gray = getStreamGray(image2, gray)
+                            blobs = detector.detectBlobs(gray, frameTime)
+                            governor.update(blobs, frameTime)
+                            frameProcessed = True
+                    else:
+                        # No new frame so only check for track timeout
+                        frameTime = vs.now()
+                        blobs = NO_BLOBS
+                    # Track timing uses frame timestamps so replayed footage
+                    # behaves the same at any speed
+                    motionFound = track.updateBlobs(blobs, frameTime)
+                    if counter is not None:
+                        # Count each line crossing instead of taking an image
+                        counter.append(track.crossings)
+                        motionFound = motionFound and MOTION_COUNT_CAPTURE_ON
+                    if MOTION_SPEED_ON:
+                        motionSpeed = getMotionSpeed(track)
+                        motionFound = motionSpeed is not None
+                    if frameProcessed:
+                        stats.addFrame()
+                    stats.checkPublish()
                 if MOTION_FORCE_SEC > 0:
                     motion_force_timer, motion_force_start = checkTimer(
                         motion_force_timer, MOTION_FORCE_SEC
@@ -2851,10 +6462,6 @@ def timolo():
                 else:
                     motion_force_start = False
                 if motion_force_start:
-                    image1 = vs.read()
-                    image2 = image1
-                    grayimage1 = cv2.cvtColor(image1, cv2.COLOR_BGR2GRAY)
-                    grayimage2 = grayimage1
                     dotCount = showDots(MOTION_DOTS_MAX + 2)  # New Line
                     logging.info(
                         "No Motion Detected for %s minutes. "
@@ -2866,11 +6473,51 @@ def timolo():
                     filename = getImageFilename(
                         moPath, motion_prefix, MOTION_NUM_ON, motionNumCount
                     )
-                    vs.stop()
-                    time.sleep(STREAM_STOP_SEC)
+                    # Only stop the stream if the camera is needed for the capture.
+                    # Quick pic uses the stream frame and day stills can use
+                    # the still splitter port so motion tracking keeps running.
+                    if MOTION_TRACK_QUICK_PIC_ON or MOTION_SPEED_ON:
+                        stopStream = False
+                    elif MOTION_TRACK_MINI_TL_ON and daymode:
+                        stopStream = STREAM_SOURCE == "picamera"
+                    elif MOTION_VIDEO_ON and not (
+                        PANTILT_ON and MOTION_TRACK_PANTILT_SEQ_ON
+                    ):
+                        # pre trigger video is saved from the running stream
+                        stopStream = not vs.canSaveVideoClip()
+                    else:
+                        stopStream = not vs.canTakeStill(daymode)
+                    if stopStream:
+                        vs.stop()
+                        time.sleep(STREAM_STOP_SEC)
 
+                    # Save the stream image frame with the speed measured
+                    if MOTION_SPEED_ON and motionSpeed is not None:
+                        speedText = "%.1f %s  %s" % (
+                            motionSpeed,
+                            MOTION_SPEED_UNITS,
+                            datetime.datetime.now().strftime("%Y%m%d_%H:%M:%S"),
+                        )
+                        takeMotionQuickImage(image2, filename, speedText)
+                        motionNumCount = postImageProcessing(
+                            MOTION_NUM_ON,
+                            MOTION_NUM_START,
+                            MOTION_NUM_MAX,
+                            motionNumCount,
+                            MOTION_NUM_RECYCLE_ON,
+                            NUM_PATH_MOTION,
+                            filename,
+                            daymode,
+                            showText=False,
+                        )
+                        saveRecent(
+                            MOTION_RECENT_MAX,
+                            MOTION_RECENT_DIR,
+                            filename,
+                            motion_prefix,
+                        )
                     # Save stream image frame to capture movement quickly
-                    if MOTION_TRACK_QUICK_PIC_ON:
+                    elif MOTION_TRACK_QUICK_PIC_ON or MOTION_SPEED_ON:
                         takeMotionQuickImage(image2, filename)
                         motionNumCount = postImageProcessing(
                             MOTION_NUM_ON,
@@ -2889,8 +6536,23 @@ def timolo():
                             motion_prefix,
                         )
                     # Save a series of images per settings (no pantilt)
+                    elif MOTION_TRACK_MINI_TL_ON and daymode and not stopStream:
+                        # No picamera so save stream frames as the sequence
+                        for seqFilename in takeMiniTimelapse(
+                            moPath,
+                            motion_prefix,
+                            MOTION_NUM_ON,
+                            motionNumCount,
+                            daymode,
+                            NUM_PATH_MOTION,
+                        ):
+                            vs.takeStill(seqFilename)
+                        motionNumCount = getCurrentCount(
+                            NUM_PATH_MOTION, MOTION_NUM_START
+                        )
                     elif MOTION_TRACK_MINI_TL_ON and daymode:
-                        with picamera.PiCamera() as camera:
+                        cameraSession.close()
+                        with picamera.PiCamera(camera_num=STREAM_CAMERA_NUM) as camera:
                             camera.resolution = (image_width, image_height)
                             camera.vflip = IMAGE_VFLIP
                             camera.hflip = IMAGE_HFLIP
@@ -2917,7 +6579,12 @@ def timolo():
                     # Move camera pantilt through specified positions and take images
                     elif MOTION_TRACK_ON and PANTILT_ON and MOTION_TRACK_PANTILT_SEQ_ON:
                         motionNumCount = takePantiltSequence(
-                            filename, daymode, pixAve, motionNumCount, NUM_PATH_MOTION
+                            filename,
+                            daymode,
+                            pixAve,
+                            motionNumCount,
+                            NUM_PATH_MOTION,
+                            vs,
                         )
                         pantiltGoHome()
                     elif MOTION_VIDEO_ON:
@@ -2930,15 +6597,16 @@ def timolo():
                             MOTION_VIDEO_WIDTH,
                             MOTION_VIDEO_HEIGHT,
                             MOTION_VIDEO_FPS,
+                            vs,
                         )
                         if MOTION_NUM_ON:
                             motionNumCount += 1
                             writeCounter(motionNumCount, NUM_PATH_MOTION)
                     else:
                         if daymode:
-                            takeDayImage(filename, MOTION_CAM_SLEEP)
+                            takeDayImage(filename, MOTION_CAM_SLEEP, vs)
                         else:
-                            takeNightImage(filename, pixAve)
+                            takeNightImage(filename, pixAve, vs)
                         motionNumCount = postImageProcessing(
                             MOTION_NUM_ON,
                             MOTION_NUM_START,
@@ -2956,19 +6624,16 @@ def timolo():
                             filename,
                             motion_prefix,
                         )
-                    vs = PiVideoStream().start()
-                    vs.camera.rotation = IMAGE_ROTATION
-                    vs.camera.hflip = IMAGE_HFLIP
-                    vs.camera.vflip = IMAGE_VFLIP
-                    time.sleep(1)
-                    image1 = vs.read()
-                    image2 = image1
-                    grayimage1 = cv2.cvtColor(image1, cv2.COLOR_BGR2GRAY)
-                    grayimage2 = grayimage1
-                    trackLen = 0.0
-                    trackTimeout = time.time()
-                    startPos = []
-                    startTrack = False
+                    if vs.stopped:
+                        vs.start()
+                        time.sleep(1)
+                    # Speed mode keeps tracking other objects while the
+                    # stream runs rather than restart after each image
+                    if stopStream or not MOTION_SPEED_ON:
+                        frameId, frameTime, image2 = vs.read_next(frameId)
+                        gray = getStreamGray(image2, gray)
+                        detector.reset(gray, frameTime)
+                        track.reset(frameTime)
                     moPath = subDirChecks(
                         MOTION_SUBDIR_MAX_HOURS,
                         MOTION_SUBDIR_MAX_FILES,
@@ -2988,18 +6653,20 @@ def timolo():
                     # Check if pano timer expired and if so start a pano sequence
                     pano_timer, start_pano = checkTimer(pano_timer, PANO_TIMER_SEC)
                 if start_pano:
-                    if MOTION_TRACK_ON:
+                    if MOTION_TRACK_ON and not vs.canTakeStill(daymode):
                         logging.info("Stop Motion Tracking PiVideoStream ...")
                         vs.stop()
                         time.sleep(STREAM_STOP_SEC)
-                    pano_seq_num = takePano(pano_seq_num, daymode, pixAve)
+                    pano_seq_num = takePano(pano_seq_num, daymode, pixAve, vs)
                     if MOTION_TRACK_ON:
-                        logging.info("Restart Motion Tracking PiVideoStream ....")
-                        vs = PiVideoStream().start()
-                        vs.camera.rotation = IMAGE_ROTATION
-                        vs.camera.hflip = IMAGE_HFLIP
-                        vs.camera.vflip = IMAGE_VFLIP
-                        time.sleep(1)
+                        if vs.stopped:
+                            logging.info("Restart Motion Tracking PiVideoStream ....")
+                            vs.start()
+                            time.sleep(1)
+                        frameId, frameTime, image2 = vs.read_next(frameId)
+                        gray = getStreamGray(image2, gray)
+                        detector.reset(gray, frameTime)
+                        newFrame = None
                     next_pano_time = pano_timer + datetime.timedelta(
                         seconds=PANO_TIMER_SEC
                     )
@@ -3028,19 +6695,138 @@ def timolo():
                 dotCount = showDots(dotCount)
 
 
+# ------------------------------------------------------------------------------
+def checkStreamSource():
+    """Make sure the camera is available before starting"""
+    if STREAM_SOURCE == "picamera":
+        logging.info("Testing if Pi Camera is in Use")
+        # Test if the pi camera is already in use
+        ts = PiVideoStream().start()
+        time.sleep(1)
+        ts.stop()
+        time.sleep(STREAM_STOP_SEC)
+        logging.info("Pi Camera is Available.")
+    elif VIDEO_REPEAT_ON:
+        logging.error("VIDEO_REPEAT_ON=True Requires STREAM_SOURCE = picamera")
+        logging.error("Exiting %s Due to Error", PROG_NAME)
+        sys.exit(1)
+
+
+# ------------------------------------------------------------------------------
+# Media folder settings that default to a CAMERA_NAME sub folder per camera
+CAMERA_DIR_SETTINGS = (
+    "MOTION_DIR",
+    "MOTION_RECENT_DIR",
+    "TIMELAPSE_DIR",
+    "TIMELAPSE_RECENT_DIR",
+    "VIDEO_DIR",
+    "PANTILT_SEQ_IMAGES_DIR",
+    "PANTILT_SEQ_RECENT_DIR",
+    "PANO_DIR",
+    "PANO_IMAGES_DIR",
+)
+
+
+
+# ------------------------------------------------------------------------------
+def getCameraName(cameraNum, cameraSettings):
+    """Return CAMERA_NAME of a CAMERAS entry. Default cam1, cam2 Etc"""
+    return cameraSettings.get("CAMERA_NAME", "cam%i" % (cameraNum + 1))
+
+
+# ------------------------------------------------------------------------------
+def cameraProcess(cameraNum, cameraSettings):
+    """
+    Run one CAMERAS entry in its own process. The camera settings
+    are applied to this process copy of the module variables
+    then the motion tracking and timelapse loop is started.
+    """
+    global cameraName
+    cameraName = getCameraName(cameraNum, cameraSettings)
+    settings = dict(cameraSettings)
+    settings.pop("CAMERA_NAME", None)
+    if "IMAGE_NAME_PREFIX" not in settings:
+        settings["IMAGE_NAME_PREFIX"] = cameraName + "-"
+    for key in CAMERA_DIR_SETTINGS:
+        if key not in settings:
+            settings[key] = os.path.join(globals()[key], cameraName)
+    globals().update(settings)
+    setDerivedSettings()
+    # Show camera name in log messages
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(
+            logging.Formatter(
+                "%(asctime)s %(levelname)-8s " + cameraName
+                + " %(funcName)-10s %(message)s",
+                "%Y-%m-%d %H:%M:%S",
+            )
+        )
+    logging.info("Start Camera %i %s STREAM_SOURCE=%s", cameraNum, cameraName, STREAM_SOURCE)
+    checkStreamSource()
+    try:
+        if VIDEO_REPEAT_ON:
+            videoRepeat()
+        else:
+            timolo()
+    except KeyboardInterrupt:
+        pass  # parent process reports ctrl-c
+
+
+# ------------------------------------------------------------------------------
+def runCameras():
+    """
+    Start one process per CAMERAS entry so each camera has its own
+    motion pipeline on its own cpu core. Wait for all to finish.
+    """
+    validKeys = set(default_settings.keys())
+    validKeys.update(("CAMERA_NAME", "BLUR_SIZE", "THRESHOLD_SENSITIVITY"))
+    names = []
+    for cameraNum, cameraSettings in enumerate(CAMERAS):
+        for key in cameraSettings:
+            if key not in validKeys:
+                logging.error("CAMERAS entry %i Has Invalid Setting %s", cameraNum, key)
+                logging.error("Exiting %s Due to Error", PROG_NAME)
+                sys.exit(1)
+        names.append(getCameraName(cameraNum, cameraSettings))
+    if len(set(names)) != len(names):
+        logging.error("CAMERAS Need a Unique CAMERA_NAME. Found %s", ", ".join(names))
+        logging.error("Exiting %s Due to Error", PROG_NAME)
+        sys.exit(1)
+    processes = []
+    for cameraNum, cameraSettings in enumerate(CAMERAS):
+        proc = multiprocessing.Process(
+            target=cameraProcess, args=(cameraNum, cameraSettings), name=names[cameraNum]
+        )
+        proc.start()
+        processes.append(proc)
+    logging.info("Started %i Camera Processes %s", len(processes), ", ".join(names))
+    for proc in processes:
+        proc.join()
+
+
 # ------------------------------------------------------------------------------
 if __name__ == "__main__":
     """
     Initialization prior to launching
     appropriate pi-timolo options
     """
-    logging.info("Testing if Pi Camera is in Use")
-    # Test if the pi camera is already in use
-    ts = PiVideoStream().start()
-    time.sleep(1)
-    ts.stop()
-    time.sleep(STREAM_STOP_SEC)
-    logging.info("Pi Camera is Available.")
+    if args.tune:
+        motionTune(args.tune, args.workers)
+        sys.exit(0)
+    if args.bench:
+        if not motionBench(args.bench):
+            sys.exit(1)
+        sys.exit(0)
+    if args.counts:
+        if not motionCountReport(args.counts):
+            sys.exit(1)
+        sys.exit(0)
+    if args.alloc_check:
+        if not motionAllocCheck():
+            sys.exit(1)
+        sys.exit(0)
+    if not CAMERAS:
+        checkStreamSource()  # Each camera process checks its own camera
     if PANTILT_ON:
         logging.info("Camera Pantilt Hardware is %s", pantilt_is)
     if PLUGIN_ON:
@@ -3055,7 +6841,9 @@ if __name__ == "__main__":
         print("NOTICE: Logging Disabled per variable VERBOSE_ON=False  ctrl-c Exits")
     try:
         pantiltGoHome()
-        if VIDEO_REPEAT_ON:
+        if CAMERAS:
+            runCameras()
+        elif VIDEO_REPEAT_ON:
             videoRepeat()
         else:
             timolo()